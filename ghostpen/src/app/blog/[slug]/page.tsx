@@ -79,8 +79,8 @@ export default function BlogDetailPage() {
     year: "numeric",
   });
 
-  const wordCount = post.content.split(/\s+/).length;
-  const readTime = `${Math.max(1, Math.ceil(wordCount / 200))} min read`;
+  const minutes = post.reading_time ?? Math.max(1, Math.ceil(post.content.split(/\s+/).length / 200));
+  const readTime = `${minutes} min read`;
   const heroImage = post.image_url ? (post.image_url.startsWith("/images/") ? getImageUrl(post.image_url) : post.image_url) : null;
 
   return (
@@ -164,7 +164,7 @@ export default function BlogDetailPage() {
           </div>
 
           <article className="prose-ghost text-foreground/90 leading-relaxed">
-            <BlogContent content={post.content} />
+            <BlogContent content={post.content} html={post.html} />
           </article>
         </div>
       </section>
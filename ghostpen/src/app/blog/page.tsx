@@ -6,7 +6,7 @@ import { PageHero } from "@/components/shared/PageHero";
 import Header from "@/components/layout/Header";
 import Link from "next/link";
 import { PenLine, Loader2 } from "lucide-react";
-import { getBlogPostsAPI, type BlogPostAPI } from "@/lib/api";
+import { getBlogPostsAPI, subscribeBlogEvents, type BlogPostAPI } from "@/lib/api";
 
 export default function BlogPage() {
   const [posts, setPosts] = useState<BlogPostAPI[]>([]);
@@ -25,8 +25,22 @@ export default function BlogPage() {
 
   useEffect(() => {
     fetchPosts();
+    // Apply changes as they happen instead of refetching the whole list
+    return subscribeBlogEvents((event) => {
+      if (event.type === "blog.published") {
+        setPosts((prev) => [event.post, ...prev.filter((p) => p.id !== event.post.id)]);
+      } else if (event.type === "blog.deleted") {
+        setPosts((prev) => prev.filter((p) => p.id !== event.id));
+      } else {
+        fetchPosts();
+      }
+    });
   }, []);
 
+  const handlePostDeleted = (id: string) => {
+    setPosts((prev) => prev.filter((p) => p.id !== id));
+  };
+
   return (
     <div className="min-h-screen flex flex-col bg-background">
       <Header />
@@ -56,7 +70,7 @@ export default function BlogPage() {
               <Loader2 className="w-6 h-6 animate-spin text-terracotta" />
             </div>
           ) : (
-            <BlogList posts={posts} onPostDeleted={fetchPosts} />
+            <BlogList posts={posts} onPostDeleted={handlePostDeleted} />
           )}
         </div>
       </section>
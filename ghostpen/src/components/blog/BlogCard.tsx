@@ -6,7 +6,7 @@ import { getImageUrl, deleteBlogPost, type BlogPostAPI } from "@/lib/api";
 
 interface BlogCardProps {
   post: BlogPostAPI;
-  onDeleted?: () => void;
+  onDeleted?: (id: string) => void;
 }
 
 export function BlogCard({ post, onDeleted }: BlogCardProps) {
@@ -16,8 +16,8 @@ export function BlogCard({ post, onDeleted }: BlogCardProps) {
     year: "numeric",
   });
 
-  const wordCount = post.content.split(/\s+/).length;
-  const readTime = `${Math.max(1, Math.ceil(wordCount / 200))} min read`;
+  const minutes = post.reading_time ?? Math.max(1, Math.ceil(post.content.split(/\s+/).length / 200));
+  const readTime = `${minutes} min read`;
   const heroImage = post.image_url ? (post.image_url.startsWith("/images/") ? getImageUrl(post.image_url) : post.image_url) : null;
 
   const handleDelete = async (e: React.MouseEvent) => {
@@ -26,7 +26,7 @@ export function BlogCard({ post, onDeleted }: BlogCardProps) {
     if (!confirm("Delete this post?")) return;
     try {
       await deleteBlogPost(post.id);
-      onDeleted?.();
+      onDeleted?.(post.id);
     } catch (err) {
       console.error("Delete failed:", err);
     }
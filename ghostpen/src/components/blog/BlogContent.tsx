@@ -4,9 +4,20 @@ import ReactMarkdown from "react-markdown";
 
 interface BlogContentProps {
   content: string;
+  // Pre-rendered (and escaped) by the backend at publish time
+  html?: string;
 }
 
-export function BlogContent({ content }: BlogContentProps) {
+export function BlogContent({ content, html }: BlogContentProps) {
+  if (html) {
+    return (
+      <div
+        className="prose-ghost max-w-none"
+        dangerouslySetInnerHTML={{ __html: html }}
+      />
+    );
+  }
+
   return (
     <div className="prose-ghost max-w-none">
       <ReactMarkdown
@@ -6,7 +6,7 @@ import type { BlogPostAPI } from "@/lib/api";
 
 interface BlogListProps {
   posts: BlogPostAPI[];
-  onPostDeleted?: () => void;
+  onPostDeleted?: (id: string) => void;
 }
 
 export function BlogList({ posts, onPostDeleted }: BlogListProps) {
@@ -114,6 +114,12 @@ export interface BlogPostAPI {
   published_at: string | null;
   created_at: string;
   updated_at: string;
+  // Rendered at publish time by the backend (absent on very old posts;
+  // html and toc are only included when fetching a single post)
+  html?: string;
+  toc?: { level: number; text: string; id: string }[];
+  word_count?: number;
+  reading_time?: number;
 }
 
 export async function getBlogPostsAPI(): Promise<BlogPostAPI[]> {
@@ -129,3 +135,25 @@ export async function deleteBlogPost(postId: string): Promise<{ success: boolean
     method: "DELETE",
   });
 }
+
+// === Change Feed (server-sent events) ===
+
+export type BlogEvent =
+  | { type: "blog.published"; post: BlogPostAPI }
+  | { type: "blog.deleted"; id: string }
+  | { type: "reset" };
+
+// Subscribe to blog changes. EventSource reconnects on its own and resumes
+// from the last event id; "reset" means the feed can't be replayed and the
+// caller should refetch. Returns an unsubscribe function.
+export function subscribeBlogEvents(onEvent: (event: BlogEvent) => void): () => void {
+  const source = new EventSource(`${API_BASE}/api/events`);
+  source.addEventListener("blog.published", (e) =>
+    onEvent({ type: "blog.published", post: JSON.parse((e as MessageEvent).data) })
+  );
+  source.addEventListener("blog.deleted", (e) =>
+    onEvent({ type: "blog.deleted", id: JSON.parse((e as MessageEvent).data).id })
+  );
+  source.addEventListener("reset", () => onEvent({ type: "reset" }));
+  return () => source.close();
+}
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Benchmark PlatformAdapter.post_many() against posting one item at a time.
+
+  python bench_post_many.py                 # local store + simulated network adapter
+  python bench_post_many.py -n 2000 --latency 0.1
+  python bench_post_many.py --supabase      # also BlogAdapter (creates drafts, then deletes them)
+
+Prints items/sec for each adapter, sequential post() vs post_many().
+"""
+
+import argparse
+import asyncio
+import tempfile
+import time
+
+from config import SUPABASE_URL, SUPABASE_KEY
+from platforms.base import PlatformAdapter, PostResult
+from platforms.blog import BlogAdapter, LocalBlogStore
+
+
+class SimulatedNetworkAdapter(PlatformAdapter):
+    """Adapter whose post() just waits `latency` seconds, like one API round trip."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    @property
+    def platform_name(self) -> str:
+        return "simulated"
+
+    @property
+    def max_content_length(self) -> int:
+        return 10000
+
+    async def post(self, content: str, **kwargs) -> PostResult:
+        await asyncio.sleep(self.latency)
+        return PostResult(success=True, platform="simulated", post_id=str(hash(content)))
+
+    async def validate_credentials(self) -> bool:
+        return True
+
+
+def make_items(n: int, tag: str) -> list:
+    return [
+        {"content": f"# Bench {tag} {i}\n\nSome *markdown* body for post {i}.\n\n## Section\n\nMore text.",
+         "tags": ["bench"]}
+        for i in range(n)
+    ]
+
+
+async def bench(name: str, adapter: PlatformAdapter, n: int) -> list:
+    start = time.perf_counter()
+    sequential = [await adapter.post(**item) for item in make_items(n, "seq")]
+    seq_rate = n / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    batched = await adapter.post_many(make_items(n, "batch"))
+    batch_rate = n / (time.perf_counter() - start)
+
+    ok = sum(r.success for r in sequential + batched)
+    print(f"{name:<28} post(): {seq_rate:>9,.0f} items/s   post_many(): {batch_rate:>9,.0f} items/s"
+          f"   ({batch_rate / seq_rate:.1f}x, {ok}/{2 * n} ok)")
+    return sequential + batched
+
+
+async def main(args):
+    print(f"{args.n} items per run\n")
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        await bench("LocalBlogStore", LocalBlogStore(data_dir), args.n)
+
+    await bench(f"default ({args.latency * 1000:.0f}ms/post)", SimulatedNetworkAdapter(args.latency), args.n)
+
+    if args.supabase:
+        if not (SUPABASE_URL and SUPABASE_KEY):
+            print("BlogAdapter: skipped (SUPABASE_URL/SUPABASE_KEY not set)")
+            return
+        adapter = BlogAdapter(SUPABASE_URL, SUPABASE_KEY)
+        results = await bench("BlogAdapter (Supabase)", adapter, args.n)
+        for r in results:
+            if r.success:
+                await adapter.delete_post(r.post_id)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", type=int, default=500, help="Items per run")
+    parser.add_argument("--latency", type=float, default=0.05,
+                        help="Per-post latency of the simulated network adapter (seconds)")
+    parser.add_argument("--supabase", action="store_true",
+                        help="Also benchmark BlogAdapter against the configured Supabase project")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,120 @@
+"""
+In-process read-through cache for blog reads.
+
+Posts only change when a blog write (post/delete) runs, so the server keeps
+the published list and individual posts in memory, already serialized to
+JSON bytes. Every write bumps a version counter, which drops the cached
+entries and changes the strong ETag handed to clients, so conditional GETs
+can be answered with 304 Not Modified without touching storage.
+
+Posts written before render-on-write are missing the precomputed fields
+(html, toc, word_count, reading_time); those are rendered once when the
+cache fills, never per request.
+"""
+
+import asyncio
+import json
+import uuid
+from typing import Dict, Optional, Tuple
+
+from platforms.render import render_post, RENDERED_FIELDS
+
+# Cached entry: (version it was loaded at, serialized JSON body or None for "not found")
+_Entry = Tuple[int, Optional[bytes]]
+
+# Upper bound on cached slugs so random 404 lookups can't grow memory forever
+MAX_CACHED_SLUGS = 1024
+
+# Heavy rendered fields only the single-post page needs; left out of the list
+LIST_OMIT_FIELDS = ("html", "toc")
+
+
+def _with_rendered(post: dict) -> dict:
+    """Fill in render-on-write fields for posts stored before they existed."""
+    if not post.get("content") or all(f in post for f in RENDERED_FIELDS):
+        return post
+    rendered = render_post(post["content"])
+    return {**post, **{f: rendered[f] for f in RENDERED_FIELDS if f not in post}}
+
+
+class BlogCache:
+    """Read-through cache in front of a BlogAdapter / LocalBlogStore."""
+
+    def __init__(self, store):
+        self.store = store
+        self.version = 0
+        # Random per-process prefix so ETags never collide across restarts
+        # (the version counter starts again at 0 every time).
+        self._epoch = uuid.uuid4().hex[:8]
+        self._list: Optional[_Entry] = None
+        self._slugs: Dict[str, _Entry] = {}
+        self._lock = asyncio.Lock()
+
+    def invalidate(self):
+        """Drop all cached reads. Call after every blog write."""
+        self.version += 1
+        self._list = None
+        self._slugs.clear()
+
+    def _etag(self, version: int, key: str = "") -> str:
+        """Strong ETag for a resource as of the given version."""
+        suffix = f"-{key}" if key else ""
+        return f'"{self._epoch}-{version}{suffix}"'
+
+    @staticmethod
+    def _serialize(data) -> bytes:
+        return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    async def get_posts(self) -> Tuple[str, bytes]:
+        """Published post list as (etag, JSON bytes)."""
+        entry = self._list
+        if entry and entry[0] == self.version:
+            return self._etag(entry[0]), entry[1]
+        async with self._lock:
+            entry = self._list
+            if entry and entry[0] == self.version:
+                return self._etag(entry[0]), entry[1]
+            version = self.version
+            posts = await self.store.get_posts()
+            body = self._serialize([
+                {k: v for k, v in _with_rendered(p).items() if k not in LIST_OMIT_FIELDS}
+                for p in posts
+            ])
+            # A write that lands while we were loading makes this result stale;
+            # hand it out under the old version's ETag but don't keep it.
+            if version == self.version:
+                self._list = (version, body)
+            return self._etag(version), body
+
+    async def get_post(self, slug: str) -> Tuple[str, Optional[bytes]]:
+        """Single published post as (etag, JSON bytes); body is None if not found."""
+        entry = self._slugs.get(slug)
+        if entry and entry[0] == self.version:
+            return self._etag(entry[0], slug), entry[1]
+        async with self._lock:
+            entry = self._slugs.get(slug)
+            if entry and entry[0] == self.version:
+                return self._etag(entry[0], slug), entry[1]
+            version = self.version
+            post = await self.store.get_post_by_slug(slug)
+            body = self._serialize(_with_rendered(post)) if post else None
+            if version == self.version:
+                if len(self._slugs) >= MAX_CACHED_SLUGS:
+                    self._slugs.clear()
+                self._slugs[slug] = (version, body)
+            return self._etag(version, slug), body
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Check an If-None-Match header value against a strong ETag."""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Stress check for LocalBlogStore's single-writer commits.
+
+  python check_blog_store.py                 # 500 concurrent posts, then deletes
+  python check_blog_store.py -n 2000 --titles 5
+
+Fires n post() calls at once (sharing a handful of titles, so slugs
+collide), then deletes every other post concurrently with a second wave
+of posts. Checks that every acknowledged write is in the file, every
+acknowledged delete is gone, and all slugs are unique. Exits non-zero on
+any lost update.
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import tempfile
+import time
+
+from platforms.blog import LocalBlogStore
+
+
+async def check(n: int, titles: int) -> list:
+    problems = []
+    with tempfile.TemporaryDirectory() as data_dir:
+        store = LocalBlogStore(data_dir)
+
+        start = time.perf_counter()
+        first = await asyncio.gather(*(
+            store.post(f"# Stress {i % titles}\n\nBody {i}.", publish=True) for i in range(n)
+        ))
+        elapsed = time.perf_counter() - start
+        print(f"  {n} concurrent posts: {n / elapsed:,.0f} posts/s")
+        problems += [f"post {i} failed: {r.error}" for i, r in enumerate(first) if not r.success]
+
+        doomed = [r.post_id for r in first[::2] if r.success]
+        results = await asyncio.gather(
+            *(store.delete_post(post_id) for post_id in doomed),
+            *(store.post(f"# Stress {i % titles}\n\nSecond wave {i}.") for i in range(n // 2)),
+        )
+        deleted, second = results[:len(doomed)], results[len(doomed):]
+        problems += [f"delete of {post_id} not acknowledged" for post_id, ok in zip(doomed, deleted) if not ok]
+        problems += [f"second-wave post {i} failed: {r.error}" for i, r in enumerate(second) if not r.success]
+
+        with open(store.file_path) as f:
+            stored = json.load(f)
+        ids = {p["id"] for p in stored}
+        expected = {r.post_id for r in first + second if r.success} - set(doomed)
+        problems += [f"acknowledged post {post_id} missing" for post_id in expected - ids]
+        problems += [f"deleted post {post_id} still stored" for post_id in set(doomed) & ids]
+        slugs = [p["slug"] for p in stored]
+        if len(slugs) != len(set(slugs)):
+            problems.append(f"{len(slugs) - len(set(slugs))} duplicate slugs")
+        print(f"  {len(doomed)} deletes + {len(second)} posts interleaved: {len(stored)} posts stored, "
+              f"{len(expected)} expected")
+    return problems
+
+
+def main(args):
+    problems = asyncio.run(check(args.n, args.titles))
+    for problem in problems[:20]:
+        print(f"  FAIL {problem}")
+    print("OK: no lost updates" if not problems else f"{len(problems)} problems")
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", type=int, default=500, help="Concurrent posts in the first wave")
+    parser.add_argument("--titles", type=int, default=10, help="Distinct titles (fewer means more slug collisions)")
+    main(parser.parse_args())
@@ -12,25 +12,43 @@ Usage:
   python cli.py post twitter --content "Just caught a beautiful trout!"
   python cli.py post instagram --content "Best day ever" --image photo.jpg
   python cli.py status
+  python cli.py blog export -o posts.ndjson
+  python cli.py blog import posts.ndjson --backend supabase --on-conflict rename
+  python cli.py outbox list --status dead
+  python cli.py outbox replay <id> --now
+  python cli.py schedule add "sunrise hike" --at 2026-06-01T08:00 -p twitter
+  python cli.py schedule list
 """
 
 import argparse
 import asyncio
+import os
 import sys
 import json
+import time
+from datetime import datetime
+
+import httpx
 
 from config import (
     SUPABASE_URL, SUPABASE_KEY,
     TWITTER_CONSUMER_KEY, TWITTER_CONSUMER_SECRET,
-    TWITTER_ACCESS_TOKEN, TWITTER_ACCESS_TOKEN_SECRET,
-    INSTAGRAM_USERNAME, INSTAGRAM_PASSWORD,
+    TWITTER_ACCESS_TOKEN, TWITTER_ACCESS_TOKEN_SECRET, TWITTER_API_URL,
+    INSTAGRAM_USERNAME, INSTAGRAM_PASSWORD, INSTAGRAM_IMAGE_CACHE_DIR,
+    OUTBOX_PATH, ENGINE_PORT,
 )
 from generator import ContentGenerator
-from platforms.blog import BlogAdapter
+from outbox import Outbox, OutboxDispatcher, STATUSES as OUTBOX_STATUSES
+from posting import PhotoPreupload, run_with_timeouts, drain
+from platforms.blog import BlogAdapter, LocalBlogStore, CONFLICT_MODES
 from platforms.twitter import TwitterAdapter
 from platforms.instagram import InstagramAdapter
 
 
+# Adapters handed out by get_platforms(), closed when the command finishes
+_opened = []
+
+
 def get_platforms():
     """Initialize available platform adapters."""
     adapters = {}
@@ -42,14 +60,41 @@ def get_platforms():
         adapters["twitter"] = TwitterAdapter(
             TWITTER_CONSUMER_KEY, TWITTER_CONSUMER_SECRET,
             TWITTER_ACCESS_TOKEN, TWITTER_ACCESS_TOKEN_SECRET,
+            api_url=TWITTER_API_URL,
         )
 
     if INSTAGRAM_USERNAME and INSTAGRAM_PASSWORD:
-        adapters["instagram"] = InstagramAdapter(INSTAGRAM_USERNAME, INSTAGRAM_PASSWORD)
+        adapters["instagram"] = InstagramAdapter(
+            INSTAGRAM_USERNAME, INSTAGRAM_PASSWORD, image_cache_dir=INSTAGRAM_IMAGE_CACHE_DIR,
+        )
 
+    _opened.extend(adapters.values())
     return adapters
 
 
+async def run_command(command, args):
+    """Run a command, then close any platform connections it opened."""
+    try:
+        await command(args)
+    finally:
+        while _opened:
+            adapter = _opened.pop()
+            try:
+                await adapter.aclose()
+            except Exception as e:
+                print(f"{adapter.platform_name}: error closing connections ({e})")
+
+
+def get_blog_store(backend: str = "auto"):
+    """Open a blog backend: Supabase if configured (or asked for), else local JSON."""
+    if backend == "supabase" or (backend == "auto" and SUPABASE_URL and SUPABASE_KEY):
+        if not (SUPABASE_URL and SUPABASE_KEY):
+            print("ERROR: Supabase not configured. Set SUPABASE_URL and SUPABASE_KEY.")
+            sys.exit(1)
+        return BlogAdapter(SUPABASE_URL, SUPABASE_KEY)
+    return LocalBlogStore(os.path.join(os.path.dirname(os.path.abspath(__file__)), "data"))
+
+
 async def cmd_generate(args):
     """Generate content for one or all platforms."""
     gen = ContentGenerator()
@@ -69,6 +114,12 @@ async def cmd_generate(args):
     print(f"Platforms: {', '.join(platforms_to_generate)}")
     print()
 
+    # With --post, log in and upload the Instagram photo while the captions generate
+    adapters = get_platforms() if args.post else {}
+    preupload = None
+    if "instagram" in platforms_to_generate and "instagram" in adapters and args.image:
+        preupload = PhotoPreupload(adapters["instagram"], args.image)
+
     results = {}
     for platform in platforms_to_generate:
         print(f"--- {platform.upper()} ---")
@@ -85,9 +136,10 @@ async def cmd_generate(args):
 
     # Post if requested
     if args.post:
-        adapters = get_platforms()
         print("=" * 40)
         print("POSTING...")
+        outbox = Outbox(OUTBOX_PATH)
+        sending = {}
         for platform, content in results.items():
             if platform not in adapters:
                 print(f"  {platform}: SKIPPED (not configured)")
@@ -101,16 +153,153 @@ async def cmd_generate(args):
                 continue
             if platform == "blog":
                 kwargs["publish"] = True
+            # Saved before posting, so a failed post can be retried without regenerating
+            item, created = outbox.enqueue(platform, content, kwargs, claim=True)
+            if not created:
+                print(f"  {platform}: SKIPPED (already in outbox as {item.id}, {item.status})")
+                continue
+            sending[platform] = item
 
-            result = await adapters[platform].post(content, **kwargs)
+        async def report(item, outcome, result):
             if result.success:
-                print(f"  {platform}: POSTED! {result.url or result.post_id}")
+                print(f"  {item.platform}: POSTED! {result.url or result.post_id} ({outcome.elapsed:.1f}s)")
+            elif item.status == "pending":
+                print(f"  {item.platform}: FAILED - {result.error}; kept in outbox {item.id} for retry")
             else:
-                print(f"  {platform}: FAILED - {result.error}")
+                print(f"  {item.platform}: FAILED - {result.error} (dead-lettered as {item.id})")
+
+        dispatcher = OutboxDispatcher(outbox, adapters, on_result=report)
+
+        async def send_after_upload(item, upload):
+            # Waits for the photo under Instagram's timeout, alongside the other platforms
+            upload_id, saved = await upload.result()
+            if upload_id:
+                item.kwargs = {**item.kwargs, "upload_id": upload_id}
+                print(f"  instagram: photo uploaded during generation, saved {saved:.1f}s")
+            return await dispatcher.send(item)
+
+        sends = {}
+        for platform, item in sending.items():
+            if platform == "instagram" and preupload:
+                sends[platform] = send_after_upload(item, preupload)
+                preupload = None
+            else:
+                sends[platform] = dispatcher.send(item)
+        outcomes = await run_with_timeouts(sends)
+        for platform, outcome in outcomes.items():
+            if outcome.status == "pending":
+                print(f"  {platform}: still posting...")
+        await drain()
+
+    if preupload:  # Instagram was skipped or already posted
+        preupload.cancel()
 
     return results
 
 
+def _print_outbox_item(item, verbose: bool = False):
+    when = time.strftime("%Y-%m-%d %H:%M", time.localtime(item.created_at))
+    print(f"{item.id}  {item.status:<8} {item.platform:<10} attempts={item.attempts}  {when}")
+    if item.last_error:
+        print(f"    error: {item.last_error}")
+    if verbose:
+        if item.status == "pending":
+            print(f"    next attempt: {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(item.next_attempt_at))}")
+        if item.result and item.result.get("url"):
+            print(f"    url: {item.result['url']}")
+        print(f"    kwargs: {json.dumps(item.kwargs)}")
+        print()
+        print(item.content)
+
+
+async def cmd_outbox(args):
+    """Inspect the posting outbox and replay dead-lettered items."""
+    outbox = Outbox(OUTBOX_PATH)
+    if args.outbox_command == "list":
+        items = outbox.list(args.status, args.limit)
+        for item in items:
+            _print_outbox_item(item)
+        if not items:
+            print("Outbox is empty" + (f" (status={args.status})" if args.status else ""))
+        return
+
+    item = outbox.get(args.id)
+    if not item:
+        print(f"ERROR: no outbox item {args.id}")
+        sys.exit(1)
+    if args.outbox_command == "show":
+        _print_outbox_item(item, verbose=True)
+        return
+
+    # replay
+    item = outbox.replay(args.id)
+    if not item:
+        print(f"ERROR: {args.id} is not dead-lettered")
+        sys.exit(1)
+    if not args.now:
+        print(f"Requeued {item.id}; the server's dispatcher will send it shortly")
+        return
+    item = outbox.claim(item.id)
+    if not item:
+        print("Already picked up by the server's dispatcher")
+        return
+    outcome = await OutboxDispatcher(outbox, get_platforms()).send(item)
+    item = outbox.get(item.id)
+    if outcome.success:
+        print(f"POSTED! {outcome.url or outcome.post_id}")
+    else:
+        print(f"FAILED - {outcome.error} (now {item.status})")
+
+
+def _print_schedule(schedule: dict):
+    when = datetime.fromtimestamp(schedule["publish_at"]).strftime("%Y-%m-%d %H:%M")
+    what = schedule["params"].get("topic") if schedule["kind"] == "generate" else (schedule["content"] or "")[:40]
+    print(f"{schedule['id']}  {when}  {schedule['status']:<10} {schedule['platform']:<10} "
+          f"{schedule['kind']}: {what}")
+    if schedule.get("error"):
+        print(f"    error: {schedule['error']}")
+
+
+async def cmd_schedule(args):
+    """Manage scheduled posts on the running server."""
+    async with httpx.AsyncClient(base_url=args.server, timeout=30) as client:
+        try:
+            if args.schedule_command == "add":
+                body = {
+                    "publish_at": datetime.fromisoformat(args.at).astimezone().isoformat(),
+                    "platform": args.platform,
+                    "tone": args.tone,
+                    "word_count": args.word_count,
+                    "image_description": args.image_desc,
+                    "image_path": os.path.abspath(args.image) if args.image else None,
+                    "title": args.title,
+                }
+                if args.content:
+                    body["content"] = args.content
+                else:
+                    body["topic"] = args.topic
+                if args.lead is not None:
+                    body["lead_seconds"] = args.lead * 60
+                r = await client.post("/schedules", json=body)
+            elif args.schedule_command == "list":
+                r = await client.get("/schedules", params={"status": args.status} if args.status else None)
+            else:
+                r = await client.delete(f"/schedules/{args.id}")
+        except httpx.ConnectError:
+            print(f"ERROR: content engine server not reachable at {args.server}")
+            sys.exit(1)
+
+    if r.status_code != 200:
+        print(f"ERROR: {r.json().get('detail', r.text)}")
+        sys.exit(1)
+    data = r.json()
+    schedules = data if isinstance(data, list) else [data]
+    for schedule in schedules:
+        _print_schedule(schedule)
+    if not schedules:
+        print("Nothing scheduled")
+
+
 async def cmd_post(args):
     """Post pre-written content to a platform."""
     adapters = get_platforms()
@@ -167,6 +356,108 @@ async def cmd_status(args):
         print(f"{name}: NOT CONFIGURED")
 
 
+async def cmd_blog_export(args):
+    """Stream every blog post to NDJSON (one post per line)."""
+    store = get_blog_store(args.backend)
+    out = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    count = 0
+    start = time.perf_counter()
+    try:
+        async for post in store.iter_posts(page_size=args.batch_size):
+            out.write(json.dumps(post, ensure_ascii=False) + "\n")
+            count += 1
+            if count % 1000 == 0:
+                rate = count / (time.perf_counter() - start)
+                print(f"  exported {count:,} posts ({rate:,.0f} posts/sec)", file=sys.stderr)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    elapsed = time.perf_counter() - start
+    print(f"Exported {count:,} posts in {elapsed:.1f}s "
+          f"({count / max(elapsed, 1e-9):,.0f} posts/sec)", file=sys.stderr)
+
+
+def _load_checkpoint(path: str, source_stat) -> dict:
+    """Read an import checkpoint, refusing one written for a different input file."""
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        state = json.load(f)
+    if state.get("size") != source_stat.st_size or state.get("mtime") != source_stat.st_mtime:
+        print(f"ERROR: checkpoint {path} was written for a different version of the input.")
+        print("  Re-run with --restart to import from the beginning.")
+        sys.exit(1)
+    return state
+
+
+def _save_checkpoint(path: str, state: dict):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)
+
+
+async def cmd_blog_import(args):
+    """Import NDJSON posts in batches, resuming from a checkpoint if one exists."""
+    store = get_blog_store(args.backend)
+    checkpoint = args.checkpoint or args.file + ".checkpoint"
+    source_stat = os.stat(args.file)
+
+    state = {} if args.restart else _load_checkpoint(checkpoint, source_stat)
+    state.setdefault("offset", 0)
+    for key in ("imported", "skipped", "failed"):
+        state.setdefault(key, 0)
+    state.update(size=source_stat.st_size, mtime=source_stat.st_mtime)
+    if state["offset"]:
+        print(f"Resuming from byte {state['offset']:,} "
+              f"({state['imported']:,} imported, {state['skipped']:,} skipped so far)")
+
+    start = time.perf_counter()
+    done_this_run = 0
+
+    async def flush(batch, end_offset):
+        nonlocal done_this_run
+        results = await store.import_posts(batch, on_conflict=args.on_conflict)
+        failed = [r for r in results if not r.success and r.error != "slug already exists"]
+        if failed and len(failed) == len(results):
+            # Whole batch rejected: stop here so the checkpoint still points at it
+            print(f"ERROR: batch at byte {state['offset']:,} failed: {failed[0].error}")
+            print(f"  Fix the problem and re-run to resume from {checkpoint}")
+            sys.exit(1)
+        state["imported"] += sum(1 for r in results if r.success)
+        state["skipped"] += sum(1 for r in results if r.error == "slug already exists")
+        state["failed"] += len(failed)
+        state["offset"] = end_offset
+        _save_checkpoint(checkpoint, state)
+        done_this_run += len(batch)
+        rate = done_this_run / (time.perf_counter() - start)
+        print(f"  {state['imported']:,} imported, {state['skipped']:,} skipped, "
+              f"{state['failed']:,} failed ({rate:,.0f} posts/sec)")
+
+    with open(args.file, "rb") as f:
+        f.seek(state["offset"])
+        batch = []
+        while True:
+            line = f.readline()
+            if not line:
+                break
+            if not line.strip():
+                continue
+            batch.append(json.loads(line))
+            if len(batch) >= args.batch_size:
+                await flush(batch, f.tell())
+                batch = []
+        if batch:
+            await flush(batch, f.tell())
+
+    if os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    elapsed = time.perf_counter() - start
+    print(f"Import complete: {state['imported']:,} imported, {state['skipped']:,} skipped, "
+          f"{state['failed']:,} failed in {elapsed:.1f}s "
+          f"({done_this_run / max(elapsed, 1e-9):,.0f} posts/sec)")
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="Alexandra Social Content Engine",
@@ -200,6 +491,62 @@ def main():
     # status
     subparsers.add_parser("status", help="Check model server and platform status")
 
+    # blog export / import
+    blog_p = subparsers.add_parser("blog", help="Bulk export/import blog posts (NDJSON)")
+    blog_sub = blog_p.add_subparsers(dest="blog_command", required=True)
+    export_p = blog_sub.add_parser("export", help="Stream all posts to NDJSON")
+    export_p.add_argument("-o", "--output", default="-", help="Output file (default: stdout)")
+    import_p = blog_sub.add_parser("import", help="Import posts from NDJSON")
+    import_p.add_argument("file", help="NDJSON file produced by 'blog export'")
+    import_p.add_argument("--on-conflict", default="skip", choices=CONFLICT_MODES,
+                          help="What to do when a slug already exists")
+    import_p.add_argument("--checkpoint", default=None,
+                          help="Checkpoint file (default: <file>.checkpoint)")
+    import_p.add_argument("--restart", action="store_true",
+                          help="Ignore any checkpoint and start from the beginning")
+    for p in (export_p, import_p):
+        p.add_argument("--backend", default="auto", choices=["auto", "local", "supabase"],
+                       help="Blog backend (auto = Supabase if configured, else local JSON)")
+        p.add_argument("--batch-size", type=int, default=500,
+                       help="Posts per page (export) or per insert (import)")
+
+    # outbox list / show / replay
+    outbox_p = subparsers.add_parser("outbox", help="Inspect and replay the posting outbox")
+    outbox_sub = outbox_p.add_subparsers(dest="outbox_command", required=True)
+    list_p = outbox_sub.add_parser("list", help="List outbox items, newest first")
+    list_p.add_argument("--status", default=None, choices=OUTBOX_STATUSES,
+                        help="Only items in this state (dead = dead-letter queue)")
+    list_p.add_argument("--limit", type=int, default=50)
+    show_p = outbox_sub.add_parser("show", help="Show one item with its content")
+    show_p.add_argument("id")
+    replay_p = outbox_sub.add_parser("replay", help="Requeue a dead-lettered item")
+    replay_p.add_argument("id")
+    replay_p.add_argument("--now", action="store_true",
+                          help="Send it from this process instead of leaving it to the server")
+
+    # schedule add / list / cancel (runs on the server)
+    sched_p = subparsers.add_parser("schedule", help="Manage scheduled posts on the running server")
+    sched_p.add_argument("--server", default=f"http://localhost:{ENGINE_PORT}",
+                         help="Content engine server URL")
+    sched_sub = sched_p.add_subparsers(dest="schedule_command", required=True)
+    add_p = sched_sub.add_parser("add", help="Schedule a topic to generate, or content to post")
+    add_p.add_argument("topic", nargs="?", default=None, help="What to write about")
+    add_p.add_argument("--at", required=True, help="Publish time, ISO 8601 (e.g. 2026-06-01T08:00)")
+    add_p.add_argument("-p", "--platform", default="all",
+                       choices=["blog", "twitter", "instagram", "all"])
+    add_p.add_argument("--content", default=None, help="Post this instead of generating")
+    add_p.add_argument("--tone", default="casual")
+    add_p.add_argument("--word-count", type=int, default=500)
+    add_p.add_argument("--image-desc", default=None)
+    add_p.add_argument("--image", default=None, help="Image path (for Instagram)")
+    add_p.add_argument("--title", default=None, help="Title (for blog posts)")
+    add_p.add_argument("--lead", type=float, default=None,
+                       help="Minutes before publish time to generate (default: server setting)")
+    sched_list_p = sched_sub.add_parser("list", help="List scheduled posts")
+    sched_list_p.add_argument("--status", default=None)
+    cancel_p = sched_sub.add_parser("cancel", help="Cancel a scheduled post")
+    cancel_p.add_argument("id")
+
     args = parser.parse_args()
 
     if not args.command:
@@ -207,11 +554,21 @@ def main():
         sys.exit(1)
 
     if args.command == "generate":
-        asyncio.run(cmd_generate(args))
+        asyncio.run(run_command(cmd_generate, args))
     elif args.command == "post":
-        asyncio.run(cmd_post(args))
+        asyncio.run(run_command(cmd_post, args))
     elif args.command == "status":
-        asyncio.run(cmd_status(args))
+        asyncio.run(run_command(cmd_status, args))
+    elif args.command == "blog" and args.blog_command == "export":
+        asyncio.run(run_command(cmd_blog_export, args))
+    elif args.command == "blog" and args.blog_command == "import":
+        asyncio.run(run_command(cmd_blog_import, args))
+    elif args.command == "outbox":
+        asyncio.run(run_command(cmd_outbox, args))
+    elif args.command == "schedule":
+        if args.schedule_command == "add" and not (args.topic or args.content):
+            parser.error("schedule add needs a topic or --content")
+        asyncio.run(run_command(cmd_schedule, args))
 
 
 if __name__ == "__main__":
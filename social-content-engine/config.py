@@ -13,22 +13,40 @@ MODEL_NAME = os.getenv("MODEL_NAME", "gpt-oss:120b")
 SUPABASE_URL = os.getenv("SUPABASE_URL", "")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY", "")
 
-# Twitter/X (Tweepy v2)
+# Twitter/X (API v2, OAuth 1.0a user context)
+TWITTER_API_URL = os.getenv("TWITTER_API_URL", "https://api.twitter.com")
 TWITTER_CONSUMER_KEY = os.getenv("TWITTER_CONSUMER_KEY", "")
 TWITTER_CONSUMER_SECRET = os.getenv("TWITTER_CONSUMER_SECRET", "")
 TWITTER_ACCESS_TOKEN = os.getenv("TWITTER_ACCESS_TOKEN", "")
 TWITTER_ACCESS_TOKEN_SECRET = os.getenv("TWITTER_ACCESS_TOKEN_SECRET", "")
+# Starting budget for the posting queue; replaced by x-rate-limit-* headers once seen
+TWITTER_POSTS_PER_DAY = int(os.getenv("TWITTER_POSTS_PER_DAY", "17"))
 
 # Instagram (Instagrapi)
 INSTAGRAM_USERNAME = os.getenv("INSTAGRAM_USERNAME", "")
 INSTAGRAM_PASSWORD = os.getenv("INSTAGRAM_PASSWORD", "")
 INSTAGRAM_SESSION_FILE = os.path.expanduser("~/.instagram_session.json")
+# Instagram sends no rate-limit headers, so the posting queue uses this budget
+INSTAGRAM_POSTS_PER_DAY = int(os.getenv("INSTAGRAM_POSTS_PER_DAY", "3"))
 
 # Gemini API (for image generation)
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "")
 
 # Generated images directory
 IMAGES_DIR = os.path.expanduser("~/generated_imgs")
+# Instagram-ready copies of images that needed resizing/re-encoding, keyed by content hash
+INSTAGRAM_IMAGE_CACHE_DIR = os.path.join(IMAGES_DIR, ".instagram")
+
+# Durable outbox of posts waiting to go out (SQLite)
+OUTBOX_PATH = os.getenv(
+    "OUTBOX_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "outbox.db")
+)
+
+# Scheduled posts (SQLite), and how far ahead of publish time to generate them
+SCHEDULE_PATH = os.getenv(
+    "SCHEDULE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "schedule.db")
+)
+SCHEDULE_GENERATION_LEAD = float(os.getenv("SCHEDULE_GENERATION_LEAD", "1800"))
 
 # Content engine API port
 ENGINE_PORT = int(os.getenv("ENGINE_PORT", "8001"))
@@ -0,0 +1,120 @@
+"""
+In-process change feed for server-sent events (SSE).
+
+The server publishes blog, generation-job and image events here; clients
+stream them from /api/events instead of polling. Every event gets an id
+"<epoch>-<n>": a random per-process epoch (as BlogCache does for ETags)
+and a counter that increases monotonically. The last `buffer_size` events
+are kept so a reconnecting client (EventSource sends Last-Event-ID
+automatically) resumes where it left off. If the client is too far behind
+for the buffer, or its id has another epoch (a previous server process,
+whatever its counter says), it gets a "reset" event telling it to refetch
+from the REST endpoints.
+"""
+
+import asyncio
+import json
+import uuid
+from collections import deque
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Deque, Optional, Set
+
+# Events a slow subscriber may have queued before it is dropped
+SUBSCRIBER_QUEUE_SIZE = 256
+
+
+@dataclass
+class Event:
+    """A single change-feed event."""
+    id: int  # position in this process's feed
+    type: str
+    data: dict = field(default_factory=dict)
+    epoch: str = ""
+
+    @property
+    def event_id(self) -> str:
+        """The id on the wire, which clients send back as Last-Event-ID."""
+        return f"{self.epoch}-{self.id}"
+
+    def encode(self) -> str:
+        """Wire format for text/event-stream."""
+        return (f"id: {self.event_id}\nevent: {self.type}\n"
+                f"data: {json.dumps(self.data, ensure_ascii=False)}\n\n")
+
+
+class EventBus:
+    """Fan-out of events to SSE subscribers with a bounded replay buffer."""
+
+    def __init__(self, buffer_size: int = 1000):
+        self.epoch = uuid.uuid4().hex[:8]
+        self._next_id = 1
+        self._buffer: Deque[Event] = deque(maxlen=buffer_size)
+        self._subscribers: Set[asyncio.Queue] = set()
+
+    @property
+    def last_id(self) -> int:
+        return self._next_id - 1
+
+    def publish(self, type: str, data: dict = None) -> Event:
+        """Record an event and hand it to every live subscriber."""
+        event = Event(id=self._next_id, type=type, data=data or {}, epoch=self.epoch)
+        self._next_id += 1
+        self._buffer.append(event)
+        for queue in list(self._subscribers):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Too slow to keep up: cut it off, it will reconnect and replay
+                self._subscribers.discard(queue)
+        return event
+
+    def _position(self, last_event_id: Optional[str]) -> Optional[int]:
+        """Counter part of a Last-Event-ID from this process, else None."""
+        epoch, _, n = (last_event_id or "").rpartition("-")
+        if epoch != self.epoch or not n.isdigit() or int(n) > self.last_id:
+            return None  # a previous server process (or not one of our ids)
+        return int(n)
+
+    def _replay(self, last_event_id: Optional[int]):
+        """Buffered events after position last_event_id, or None if they can't be replayed."""
+        if last_event_id is None:
+            return None
+        if last_event_id < self.last_id and (
+            not self._buffer or self._buffer[0].id > last_event_id + 1
+        ):
+            return None  # fell out of the buffer
+        return [e for e in self._buffer if e.id > last_event_id]
+
+    async def stream(self, last_event_id: Optional[str] = None,
+                     heartbeat: float = 15.0) -> AsyncIterator[str]:
+        """Yield encoded SSE chunks: replayed events, then live ones."""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        # Subscribe before replaying so nothing published meanwhile is missed
+        self._subscribers.add(queue)
+        try:
+            if last_event_id is None:
+                replay, sent = [], self.last_id  # a new client: live events only
+            else:
+                sent = self._position(last_event_id)
+                replay = self._replay(sent)
+            if replay is None:
+                yield Event(id=self.last_id, type="reset", epoch=self.epoch).encode()
+                replay = []
+                sent = self.last_id
+            for event in replay:
+                yield event.encode()
+                sent = event.id
+            while True:
+                if queue.empty() and queue not in self._subscribers:
+                    return  # dropped for overflowing; the client reconnects
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=heartbeat)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                if event.id <= sent:
+                    continue  # already replayed
+                yield event.encode()
+                sent = event.id
+        finally:
+            self._subscribers.discard(queue)
@@ -0,0 +1,395 @@
+"""
+Durable posting outbox.
+
+Generated content is written to a SQLite outbox before anything is posted,
+so a failed post or a crash never throws away a (slow, expensive)
+generation. OutboxDispatcher posts pending items, retrying transient
+failures with exponential backoff until they land or are dead-lettered.
+Failures the adapter marks permanent (a missing image, a 4xx the platform
+will give again) are dead-lettered on the first attempt.
+
+Double posts are guarded against twice over:
+  - Every item has an idempotency key (UNIQUE). Enqueueing the same key
+    again returns the existing item instead of creating a second post.
+  - An item is claimed (pending -> sending) in one atomic UPDATE before its
+    adapter is called. Only definite failures reported by the adapter go
+    back to pending. An item found still "sending" by a new process (the
+    old one died mid-post) may or may not have gone out, so it is
+    dead-lettered for a human to check and replay rather than retried.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass, asdict
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from platforms.base import PlatformAdapter, PostResult
+from posting import PostOutcome
+from posting_queue import TokenBucket
+
+STATUSES = ("pending", "sending", "sent", "dead")
+MAX_ATTEMPTS = 5
+BACKOFF_BASE = 30.0  # seconds before the first retry, doubled each attempt
+BACKOFF_MAX = 3600.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id TEXT PRIMARY KEY,
+    idempotency_key TEXT NOT NULL UNIQUE,
+    platform TEXT NOT NULL,
+    content TEXT NOT NULL,
+    kwargs TEXT NOT NULL DEFAULT '{}',
+    job_id TEXT,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    last_error TEXT,
+    result TEXT,
+    claimed_by INTEGER,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_attempt_at);
+"""
+
+
+def idempotency_key(platform: str, content: str, kwargs: dict) -> str:
+    """Default key: the same content for the same platform is the same post."""
+    payload = json.dumps([platform, content, kwargs], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def backoff(attempts: int) -> float:
+    """Delay before retry number `attempts` (1-based), with +/-10% jitter."""
+    delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempts - 1))
+    return delay * random.uniform(0.9, 1.1)
+
+
+def _pid_alive(pid: Optional[int]) -> bool:
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+@dataclass
+class OutboxItem:
+    """One post waiting in (or finished with) the outbox."""
+    id: str
+    idempotency_key: str
+    platform: str
+    content: str
+    kwargs: dict
+    job_id: Optional[str]
+    status: str
+    attempts: int
+    next_attempt_at: float
+    last_error: Optional[str]
+    result: Optional[dict]
+    claimed_by: Optional[int]
+    created_at: float
+    updated_at: float
+
+    @classmethod
+    def from_row(cls, row: sqlite3.Row) -> "OutboxItem":
+        data = dict(row)
+        data["kwargs"] = json.loads(data["kwargs"])
+        data["result"] = json.loads(data["result"]) if data["result"] else None
+        return cls(**data)
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+class Outbox:
+    """SQLite-backed outbox table. Methods are blocking; call via to_thread."""
+
+    def __init__(self, path: str, max_attempts: int = MAX_ATTEMPTS):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=FULL")
+        self._db.executescript(_SCHEMA)
+
+    def _one(self, sql: str, params=()) -> Optional[OutboxItem]:
+        row = self._db.execute(sql, params).fetchone()
+        return OutboxItem.from_row(row) if row else None
+
+    def get(self, item_id: str) -> Optional[OutboxItem]:
+        with self._lock:
+            return self._one("SELECT * FROM outbox WHERE id = ?", (item_id,))
+
+    def enqueue(self, platform: str, content: str, kwargs: Optional[dict] = None,
+                key: Optional[str] = None, job_id: Optional[str] = None,
+                claim: bool = False) -> Tuple[OutboxItem, bool]:
+        """Add a post; returns (item, created).
+
+        If the idempotency key is already in the outbox, the existing item
+        is returned with created=False and nothing is added. With claim=True
+        a new item is inserted already claimed by this process, for callers
+        that post it straight away (only do so when created is True).
+        """
+        kwargs = kwargs or {}
+        key = key or idempotency_key(platform, content, kwargs)
+        now = time.time()
+        with self._lock:
+            cursor = self._db.execute(
+                "INSERT OR IGNORE INTO outbox (id, idempotency_key, platform, content, kwargs, job_id,"
+                " status, attempts, next_attempt_at, claimed_by, created_at, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (uuid.uuid4().hex, key, platform, content, json.dumps(kwargs), job_id,
+                 "sending" if claim else "pending", 1 if claim else 0, now,
+                 os.getpid() if claim else None, now, now),
+            )
+            item = self._one("SELECT * FROM outbox WHERE idempotency_key = ?", (key,))
+            return item, bool(cursor.rowcount)
+
+    def claim(self, item_id: str) -> Optional[OutboxItem]:
+        """Atomically move a pending item to sending; None if someone else has it."""
+        now = time.time()
+        with self._lock:
+            cursor = self._db.execute(
+                "UPDATE outbox SET status = 'sending', attempts = attempts + 1, claimed_by = ?,"
+                " updated_at = ? WHERE id = ? AND status = 'pending'",
+                (os.getpid(), now, item_id),
+            )
+            if not cursor.rowcount:
+                return None
+            return self._one("SELECT * FROM outbox WHERE id = ?", (item_id,))
+
+    def complete(self, item_id: str, result: PostResult) -> OutboxItem:
+        """Record a post attempt: sent, back to pending with backoff, or dead.
+
+        Permanent failures go straight to dead; retrying them only spends
+        the platform's rate limit.
+        """
+        now = time.time()
+        with self._lock:
+            item = self._one("SELECT * FROM outbox WHERE id = ?", (item_id,))
+            outcome = {"success": result.success, "post_id": result.post_id,
+                       "url": result.url, "error": result.error}
+            if result.success:
+                status, next_at = "sent", item.next_attempt_at
+            elif not result.permanent and item.attempts < self.max_attempts:
+                # A throttled post waits at least as long as the platform asked
+                status, next_at = "pending", now + max(result.retry_after or 0, backoff(item.attempts))
+            else:
+                status, next_at = "dead", item.next_attempt_at
+            self._db.execute(
+                "UPDATE outbox SET status = ?, next_attempt_at = ?, last_error = ?, result = ?,"
+                " claimed_by = NULL, updated_at = ? WHERE id = ?",
+                (status, next_at, result.error, json.dumps(outcome), now, item_id),
+            )
+            return self._one("SELECT * FROM outbox WHERE id = ?", (item_id,))
+
+    def defer(self, item_id: str, until: float):
+        """Push a pending item back without spending an attempt (e.g. rate limited)."""
+        with self._lock:
+            self._db.execute(
+                "UPDATE outbox SET next_attempt_at = ?, updated_at = ? WHERE id = ? AND status = 'pending'",
+                (until, time.time(), item_id),
+            )
+
+    def release(self, item_id: str, until: float):
+        """Hand a claimed item back unsent: pending again at `until`, the attempt not counted."""
+        with self._lock:
+            self._db.execute(
+                "UPDATE outbox SET status = 'pending', attempts = MAX(attempts - 1, 0), claimed_by = NULL,"
+                " next_attempt_at = ?, updated_at = ? WHERE id = ? AND status = 'sending'",
+                (until, time.time(), item_id),
+            )
+
+    def due(self, now: Optional[float] = None, limit: int = 100) -> List[OutboxItem]:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT * FROM outbox WHERE status = 'pending' AND next_attempt_at <= ?"
+                " ORDER BY next_attempt_at LIMIT ?",
+                (now if now is not None else time.time(), limit),
+            ).fetchall()
+        return [OutboxItem.from_row(r) for r in rows]
+
+    def next_due_at(self) -> Optional[float]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT MIN(next_attempt_at) FROM outbox WHERE status = 'pending'"
+            ).fetchone()
+        return row[0]
+
+    def recover(self) -> int:
+        """Dead-letter items left "sending" by a process that is no longer running."""
+        now = time.time()
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id, claimed_by FROM outbox WHERE status = 'sending'"
+            ).fetchall()
+            orphaned = [r["id"] for r in rows if not _pid_alive(r["claimed_by"])]
+            for item_id in orphaned:
+                self._db.execute(
+                    "UPDATE outbox SET status = 'dead', claimed_by = NULL, updated_at = ?,"
+                    " last_error = ? WHERE id = ?",
+                    (now, "interrupted mid-post; check the platform before replaying", item_id),
+                )
+        return len(orphaned)
+
+    def list(self, status: Optional[str] = None, limit: int = 100) -> List[OutboxItem]:
+        with self._lock:
+            if status:
+                rows = self._db.execute(
+                    "SELECT * FROM outbox WHERE status = ? ORDER BY created_at DESC LIMIT ?",
+                    (status, limit),
+                ).fetchall()
+            else:
+                rows = self._db.execute(
+                    "SELECT * FROM outbox ORDER BY created_at DESC LIMIT ?", (limit,)
+                ).fetchall()
+        return [OutboxItem.from_row(r) for r in rows]
+
+    def replay(self, item_id: str) -> Optional[OutboxItem]:
+        """Put a dead item back in the queue with a fresh set of attempts."""
+        now = time.time()
+        with self._lock:
+            cursor = self._db.execute(
+                "UPDATE outbox SET status = 'pending', attempts = 0, next_attempt_at = ?,"
+                " updated_at = ? WHERE id = ? AND status = 'dead'",
+                (now, now, item_id),
+            )
+            if not cursor.rowcount:
+                return None
+            return self._one("SELECT * FROM outbox WHERE id = ?", (item_id,))
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+OnSent = Callable[[OutboxItem, PostOutcome, PostResult], Awaitable[None]]
+
+
+class OutboxDispatcher:
+    """Posts due outbox items in the background, honouring rate-limit buckets."""
+
+    def __init__(self, outbox: Outbox, adapters: Dict[str, PlatformAdapter],
+                 buckets: Optional[Dict[str, TokenBucket]] = None,
+                 on_result: Optional[OnSent] = None, poll_interval: float = 30.0):
+        self.outbox = outbox
+        self.adapters = adapters
+        self.buckets = buckets or {}
+        self.on_result = on_result
+        self.poll_interval = poll_interval
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._sending: Dict[str, asyncio.Task] = {}
+
+    def start(self):
+        recovered = self.outbox.recover()
+        if recovered:
+            print(f"Outbox: dead-lettered {recovered} post(s) interrupted mid-send")
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def wake(self):
+        """Re-check for due items now (after an enqueue or replay)."""
+        self._wake.set()
+
+    async def _run(self):
+        while True:
+            # Cleared first, so a wake() during the pass below isn't lost
+            self._wake.clear()
+            try:
+                timeout = await self._dispatch_due()
+            except Exception as e:
+                # A bad row or a locked database mustn't stop posting for good
+                print(f"Outbox: dispatch failed ({e}); trying again in {self.poll_interval:g}s")
+                timeout = self.poll_interval
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _dispatch_due(self) -> float:
+        """Start every due item the buckets allow; seconds until the next check."""
+        for item in await asyncio.to_thread(self.outbox.due):
+            if item.id in self._sending:
+                continue
+            bucket = self.buckets.get(item.platform)
+            wait = bucket.delay() if bucket else 0.0
+            if wait > 0:
+                await asyncio.to_thread(self.outbox.defer, item.id, time.time() + wait)
+                continue
+            claimed = await asyncio.to_thread(self.outbox.claim, item.id)
+            if claimed:
+                if bucket:
+                    bucket.take()  # now, so the next due item sees the spent token
+                task = asyncio.create_task(self._post(claimed))
+                self._sending[item.id] = task
+                task.add_done_callback(lambda _, i=item.id: self._sending.pop(i, None))
+
+        next_due = await asyncio.to_thread(self.outbox.next_due_at)
+        timeout = self.poll_interval
+        if next_due is not None:
+            timeout = min(timeout, max(next_due - time.time(), 0.05))
+        return timeout
+
+    async def send(self, item: OutboxItem) -> PostOutcome:
+        """Post an item this process has claimed (enqueue(claim=True)) right away.
+
+        If the platform's bucket is empty or throttled, the item goes back to
+        pending for when it allows and the outcome is "pending"; the
+        background loop posts it then.
+        """
+        bucket = self.buckets.get(item.platform)
+        if bucket:
+            wait = bucket.delay()
+            if wait > 0:
+                await asyncio.to_thread(self.outbox.release, item.id, time.time() + wait)
+                self.wake()
+                return PostOutcome(platform=item.platform, status="pending",
+                                   error=f"rate limited; queued to post in {wait:.1f}s")
+            bucket.take()
+        return await self._post(item)
+
+    async def _post(self, item: OutboxItem) -> PostOutcome:
+        adapter = self.adapters.get(item.platform)
+        bucket = self.buckets.get(item.platform)
+        started = time.perf_counter()
+        if adapter is None:
+            result = PostResult(success=False, platform=item.platform, error="not configured")
+        else:
+            try:
+                result = await adapter.post(item.content, **item.kwargs)
+            except Exception as e:
+                result = PostResult(success=False, platform=item.platform, error=str(e))
+            if bucket:
+                bucket.observe(result)
+        outcome = PostOutcome.from_result(result, time.perf_counter() - started)
+        outcome.platform = item.platform
+        item = await asyncio.to_thread(self.outbox.complete, item.id, result)
+        if item.status == "pending":
+            outcome.status = "retrying"
+            self.wake()
+        if self.on_result:
+            try:
+                await self.on_result(item, outcome, result)
+            except Exception as e:
+                print(f"Outbox: result handler for {item.platform} failed: {e}")
+        return outcome
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
@@ -3,10 +3,14 @@ Abstract base class for platform adapters.
 Implement this to add a new social media platform.
 """
 
+import asyncio
 from abc import ABC, abstractmethod
 from dataclasses import dataclass, field
 from typing import Optional, List
 
+# post() calls the default post_many() keeps in flight at once
+BATCH_CONCURRENCY = 8
+
 
 @dataclass
 class PostResult:
@@ -16,6 +20,17 @@ class PostResult:
     post_id: Optional[str] = None
     url: Optional[str] = None
     error: Optional[str] = None
+    # Rate-limit feedback for the posting queue (when the platform reports it)
+    retry_after: Optional[float] = None  # seconds to wait before retrying a throttled post
+    rate_limit_remaining: Optional[int] = None
+    rate_limit_reset: Optional[float] = None  # unix time the current window resets
+    # Retrying can't help (bad input, rejected credentials): the outbox dead-letters it at once
+    permanent: bool = False
+
+
+def permanent_status(status_code: int) -> bool:
+    """True for HTTP errors that will fail the same way if retried (4xx other than 408/429)."""
+    return 400 <= status_code < 500 and status_code not in (408, 429)
 
 
 class PlatformAdapter(ABC):
@@ -33,6 +48,27 @@ class PlatformAdapter(ABC):
         """Post content to the platform."""
         pass
 
+    async def post_many(self, items: List[dict], concurrency: int = BATCH_CONCURRENCY) -> List[PostResult]:
+        """Post several items; one PostResult per item, in input order.
+
+        Each item holds post()'s arguments ({"content": ..., **kwargs}). This
+        default runs up to `concurrency` post() calls at once; adapters that
+        can write a batch natively override it.
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def post_one(item: dict) -> PostResult:
+            async with semaphore:
+                try:
+                    return await self.post(**item)
+                except Exception as e:
+                    return PostResult(success=False, platform=self.platform_name, error=str(e))
+
+        return list(await asyncio.gather(*(post_one(item) for item in items)))
+
+    async def aclose(self):
+        """Close pooled connections (adapters that hold a client override this)."""
+
     @abstractmethod
     async def validate_credentials(self) -> bool:
         """Check if API credentials are valid and working."""
@@ -6,14 +6,148 @@ When not configured, falls back to a local JSON file so the
 blog works out-of-the-box without any external services.
 """
 
+import asyncio
 import json
 import re
 import os
+import tempfile
 import uuid
 from datetime import datetime, timezone
-from typing import Optional, List
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, Optional, List, Tuple
 
 from .base import PlatformAdapter, PostResult
+from .render import render_post, RENDERED_FIELDS
+
+# Columns of the Supabase blog_posts table (see PROJECT_PLAN.md)
+BLOG_COLUMNS = (
+    "id", "title", "slug", "content", "excerpt", "tags", "image_url",
+    "status", "published_at", "created_at", "updated_at",
+) + tuple(f for f in RENDERED_FIELDS if f != "excerpt")
+
+# How bulk imports treat a post whose slug already exists in the target
+CONFLICT_MODES = ("skip", "rename", "overwrite")
+
+
+def _slugify(title: str) -> str:
+    slug = title.lower().strip()
+    slug = re.sub(r"[^a-z0-9\s-]", "", slug)
+    slug = re.sub(r"[\s-]+", "-", slug).strip("-")
+    return slug
+
+
+def _unique_slug(slug: str, taken: set) -> str:
+    """Append -1, -2, ... to slug until it is not in taken."""
+    base_slug = slug
+    counter = 1
+    while slug in taken:
+        slug = f"{base_slug}-{counter}"
+        counter += 1
+    return slug
+
+
+def _rendered(content: str, title: str = "") -> dict:
+    """Render a post at write time: title, HTML, TOC, counts and excerpt."""
+    rendered = render_post(content)
+    rendered["title"] = title or rendered["title"] or "Untitled Post"
+    return rendered
+
+
+def _new_post_row(content: str, title: str = "", tags: List[str] = None, publish: bool = False,
+                  image_url: str = "", **kwargs) -> dict:
+    """blog_posts row for post() arguments; the slug may still need de-duplicating."""
+    rendered = _rendered(content, title)
+    return {
+        **rendered, "slug": _slugify(rendered["title"]), "content": content,
+        "tags": tags or [], "image_url": image_url or None,
+        "status": "published" if publish else "draft",
+        "published_at": datetime.now(timezone.utc).isoformat() if publish else None,
+    }
+
+
+def _import_row(post: dict) -> dict:
+    """Normalize an exported post to the blog_posts columns, dropping empty values.
+
+    The stored HTML is served unescaped, so it is always re-rendered from
+    the content rather than taken from the file.
+    """
+    row = {k: post[k] for k in BLOG_COLUMNS if post.get(k) is not None}
+    row.pop("html", None)
+    if row.get("content"):
+        # Other precomputed fields are kept if present (exports from before
+        # render-on-write have none)
+        rendered = _rendered(row["content"], row.get("title", ""))
+        row = {**rendered, **row, "html": rendered["html"]}
+    if not row.get("slug"):
+        row["slug"] = _slugify(row.get("title") or "untitled-post")
+    return row
+
+
+def _plan_import(rows: List[dict], taken: set, on_conflict: str) -> Tuple[List[dict], List[PostResult]]:
+    """Decide what to write for a batch of import rows given the slugs already taken.
+
+    Returns the rows to write and one PostResult per input row (in order).
+    Slugs are claimed as they are planned, so duplicates inside the batch are
+    handled the same way as duplicates already in the store.
+    """
+    if on_conflict not in CONFLICT_MODES:
+        raise ValueError(f"on_conflict must be one of {CONFLICT_MODES}")
+    to_write = []
+    results = []
+    for row in rows:
+        if row["slug"] in taken:
+            if on_conflict == "skip":
+                results.append(PostResult(success=False, platform="blog",
+                                          post_id=row.get("id"), error="slug already exists"))
+                continue
+            if on_conflict == "rename":
+                row["slug"] = _unique_slug(row["slug"], taken)
+        taken.add(row["slug"])
+        to_write.append(row)
+        results.append(PostResult(success=True, platform="blog",
+                                  post_id=row.get("id"), url=f"/blog/{row['slug']}"))
+    return to_write, results
+
+
+def _iter_json_array(path: str, chunk_size: int = 1 << 16) -> Iterator[Any]:
+    """Yield the elements of a top-level JSON array without loading the whole file."""
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as f:
+        buf = ""
+        idx = 0
+        started = False
+        while True:
+            while idx < len(buf) and (buf[idx].isspace() or (started and buf[idx] == ",")):
+                idx += 1
+            if idx >= len(buf):
+                buf = f.read(chunk_size)
+                idx = 0
+                if not buf:
+                    if started:
+                        raise ValueError(f"{path}: unterminated JSON array")
+                    return
+                continue
+            if not started:
+                if buf[idx] != "[":
+                    raise ValueError(f"{path}: expected a JSON array")
+                started = True
+                idx += 1
+                continue
+            if buf[idx] == "]":
+                return
+            try:
+                item, end = decoder.raw_decode(buf, idx)
+            except json.JSONDecodeError:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    raise
+                buf = buf[idx:] + chunk
+                idx = 0
+                continue
+            yield item
+            idx = end
+            if idx > chunk_size:
+                buf = buf[idx:]
+                idx = 0
 
 
 class BlogAdapter(PlatformAdapter):
@@ -32,37 +166,14 @@ class BlogAdapter(PlatformAdapter):
         return 50000
 
     def _slugify(self, title: str) -> str:
-        slug = title.lower().strip()
-        slug = re.sub(r"[^a-z0-9\s-]", "", slug)
-        slug = re.sub(r"[\s-]+", "-", slug).strip("-")
-        return slug
-
-    def _extract_title(self, content: str) -> str:
-        for line in content.split("\n"):
-            line = line.strip()
-            if line.startswith("#"):
-                return line.lstrip("#").strip()
-        return "Untitled Post"
-
-    def _make_excerpt(self, content: str, max_len: int = 200) -> str:
-        lines = content.split("\n")
-        text_lines = [l for l in lines if l.strip() and not l.strip().startswith("#")]
-        text = " ".join(text_lines)
-        text = re.sub(r"\*\*(.+?)\*\*", r"\1", text)
-        text = re.sub(r"\*(.+?)\*", r"\1", text)
-        text = re.sub(r"\[(.+?)\]\(.+?\)", r"\1", text)
-        if len(text) > max_len:
-            text = text[:max_len].rsplit(" ", 1)[0] + "..."
-        return text
+        return _slugify(title)
 
     async def post(self, content: str, title: str = "", tags: List[str] = None,
                    publish: bool = False, image_url: str = "", **kwargs) -> PostResult:
-        if not title:
-            title = self._extract_title(content)
-        slug = self._slugify(title)
-        excerpt = self._make_excerpt(content)
+        rendered = _rendered(content, title)
+        slug = self._slugify(rendered["title"])
         data = {
-            "title": title, "slug": slug, "content": content, "excerpt": excerpt,
+            **rendered, "slug": slug, "content": content,
             "tags": tags or [], "status": "published" if publish else "draft",
         }
         if image_url:
@@ -78,6 +189,44 @@ class BlogAdapter(PlatformAdapter):
         except Exception as e:
             return PostResult(success=False, platform="blog", error=str(e))
 
+    async def post_many(self, items: List[dict], concurrency: int = 8,
+                        chunk_size: int = 500) -> List[PostResult]:
+        """Create many posts with one slug lookup and one bulk insert per chunk."""
+        rows = await asyncio.to_thread(lambda: [_new_post_row(**item) for item in items])
+        try:
+            taken = await asyncio.to_thread(self._existing_slugs, sorted({r["slug"] for r in rows}))
+        except Exception as e:
+            return [PostResult(success=False, platform="blog", error=str(e)) for _ in items]
+        for row in rows:
+            row["slug"] = _unique_slug(row["slug"], taken)
+            taken.add(row["slug"])
+
+        def insert(chunk: List[dict]) -> List[PostResult]:
+            result = self.client.table("blog_posts").insert(chunk).execute()
+            ids = {r["slug"]: r["id"] for r in result.data or []}
+            return [
+                PostResult(success=True, platform="blog", post_id=ids[r["slug"]], url=f"/blog/{r['slug']}")
+                if r["slug"] in ids else
+                PostResult(success=False, platform="blog", error="Insert returned no data")
+                for r in chunk
+            ]
+
+        def insert_one(row: dict) -> PostResult:
+            try:
+                return insert([row])[0]
+            except Exception as e:
+                return PostResult(success=False, platform="blog", error=str(e))
+
+        results: List[PostResult] = []
+        for start in range(0, len(rows), chunk_size):
+            chunk = rows[start:start + chunk_size]
+            try:
+                results += await asyncio.to_thread(insert, chunk)
+            except Exception:
+                # One bad row fails the whole insert; go row by row to find it
+                results += [await asyncio.to_thread(insert_one, row) for row in chunk]
+        return results
+
     async def get_posts(self) -> list:
         try:
             result = self.client.table("blog_posts").select("*").eq("status", "published").order("published_at", desc=True).execute()
@@ -99,6 +248,66 @@ class BlogAdapter(PlatformAdapter):
         except Exception:
             return False
 
+    async def iter_posts(self, page_size: int = 500) -> AsyncIterator[dict]:
+        """Stream every post (any status), oldest first, one page at a time."""
+        start = 0
+        while True:
+            result = (
+                self.client.table("blog_posts").select("*")
+                .order("created_at").order("id")
+                .range(start, start + page_size - 1).execute()
+            )
+            rows = result.data or []
+            for row in rows:
+                yield row
+            if len(rows) < page_size:
+                return
+            start += page_size
+
+    def _existing_slugs(self, slugs: List[str]) -> set:
+        if not slugs:
+            return set()
+        result = self.client.table("blog_posts").select("slug").in_("slug", slugs).execute()
+        return {r["slug"] for r in result.data or []}
+
+    async def import_posts(self, posts: List[dict], on_conflict: str = "skip") -> List[PostResult]:
+        """Insert a batch of exported posts with one bulk insert (or upsert)."""
+        rows = [_import_row(p) for p in posts]
+        try:
+            taken = self._existing_slugs([r["slug"] for r in rows])
+            if on_conflict == "rename":
+                # Renamed slugs could collide with rows outside this batch too,
+                # so keep re-planning until the candidates are all free.
+                originals = [dict(r) for r in rows]
+                while True:
+                    rows = [dict(r) for r in originals]
+                    to_write, results = _plan_import(rows, set(taken), on_conflict)
+                    renamed = [r["slug"] for r, o in zip(to_write, originals) if r["slug"] != o["slug"]]
+                    clashes = self._existing_slugs(renamed) - taken
+                    if not clashes:
+                        break
+                    taken |= clashes
+            else:
+                to_write, results = _plan_import(rows, taken, on_conflict)
+
+            if to_write:
+                table = self.client.table("blog_posts")
+                if on_conflict == "overwrite":
+                    # Existing rows keep their id; everything else is replaced
+                    for row in to_write:
+                        row.pop("id", None)
+                    result = table.upsert(to_write, on_conflict="slug").execute()
+                else:
+                    result = table.insert(to_write).execute()
+                ids = {r["slug"]: r["id"] for r in result.data or []}
+                for r in results:
+                    if r.success and r.url:
+                        r.post_id = ids.get(r.url.rsplit("/", 1)[-1], r.post_id)
+            return results
+        except Exception as e:
+            return [PostResult(success=False, platform="blog", post_id=p.get("id"), error=str(e))
+                    for p in posts]
+
     async def validate_credentials(self) -> bool:
         try:
             self.client.table("blog_posts").select("id").limit(1).execute()
@@ -108,11 +317,20 @@ class BlogAdapter(PlatformAdapter):
 
 
 class LocalBlogStore(PlatformAdapter):
-    """Local JSON file blog store — works without Supabase."""
+    """Local JSON file blog store — works without Supabase.
+
+    Writes go through a single-writer queue: mutations that arrive within
+    `commit_window` seconds of each other are applied to one loaded copy of
+    the file and committed together with a single atomic write. Callers are
+    only acknowledged once that commit is on disk.
+    """
 
-    def __init__(self, data_dir: str):
+    def __init__(self, data_dir: str, commit_window: float = 0.005):
         self.data_dir = data_dir
         self.file_path = os.path.join(data_dir, "blog_posts.json")
+        self.commit_window = commit_window
+        self._pending: List[Tuple[Callable[[list], Any], asyncio.Future]] = []
+        self._writer: Optional[asyncio.Task] = None
         os.makedirs(data_dir, exist_ok=True)
         if not os.path.exists(self.file_path):
             self._save([])
@@ -133,65 +351,117 @@ class LocalBlogStore(PlatformAdapter):
             return []
 
     def _save(self, posts: list):
-        with open(self.file_path, "w") as f:
-            json.dump(posts, f, indent=2)
+        """Atomically replace the posts file (write temp, fsync, rename)."""
+        fd, tmp_path = tempfile.mkstemp(dir=self.data_dir, prefix=".blog_posts.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(posts, f, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.file_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    async def _submit(self, mutation: Callable[[list], Any]) -> Any:
+        """Queue a mutation of the post list and wait for it to be committed."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((mutation, future))
+        if self._writer is None or self._writer.done():
+            self._writer = loop.create_task(self._write_loop())
+        return await future
+
+    async def _write_loop(self):
+        """Single writer: drain queued mutations in batches, one commit per batch."""
+        while self._pending:
+            # Give writes arriving close together a chance to share the commit
+            await asyncio.sleep(self.commit_window)
+            batch, self._pending = self._pending, []
+            try:
+                posts = await asyncio.to_thread(self._load)
+                results = []
+                for mutation, _ in batch:
+                    try:
+                        results.append((True, mutation(posts)))
+                    except Exception as e:
+                        results.append((False, e))
+                await asyncio.to_thread(self._save, posts)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, future), (ok, value) in zip(batch, results):
+                if future.done():
+                    continue
+                if ok:
+                    future.set_result(value)
+                else:
+                    future.set_exception(value)
 
     def _slugify(self, title: str) -> str:
-        slug = title.lower().strip()
-        slug = re.sub(r"[^a-z0-9\s-]", "", slug)
-        slug = re.sub(r"[\s-]+", "-", slug).strip("-")
-        return slug
-
-    def _extract_title(self, content: str) -> str:
-        for line in content.split("\n"):
-            line = line.strip()
-            if line.startswith("#"):
-                return line.lstrip("#").strip()
-        return "Untitled Post"
-
-    def _make_excerpt(self, content: str, max_len: int = 200) -> str:
-        lines = content.split("\n")
-        text_lines = [l for l in lines if l.strip() and not l.strip().startswith("#")]
-        text = " ".join(text_lines)
-        text = re.sub(r"\*\*(.+?)\*\*", r"\1", text)
-        text = re.sub(r"\*(.+?)\*", r"\1", text)
-        text = re.sub(r"\[(.+?)\]\(.+?\)", r"\1", text)
-        if len(text) > max_len:
-            text = text[:max_len].rsplit(" ", 1)[0] + "..."
-        return text
-
-    async def post(self, content: str, title: str = "", tags: List[str] = None,
-                   publish: bool = False, image_url: str = "", **kwargs) -> PostResult:
-        if not title:
-            title = self._extract_title(content)
-        slug = self._slugify(title)
-        # Ensure unique slug
-        posts = self._load()
-        existing_slugs = {p["slug"] for p in posts}
-        base_slug = slug
-        counter = 1
-        while slug in existing_slugs:
-            slug = f"{base_slug}-{counter}"
-            counter += 1
+        return _slugify(title)
 
+    @staticmethod
+    def _stored_post(row: dict, taken: set) -> dict:
+        """Full stored post for a _new_post_row(), claiming a unique slug from taken."""
+        slug = _unique_slug(row["slug"], taken)
+        taken.add(slug)
         now = datetime.now(timezone.utc).isoformat()
-        post = {
+        published = row["status"] == "published"
+        return {
             "id": str(uuid.uuid4()),
-            "title": title,
+            "title": row["title"],
             "slug": slug,
-            "content": content,
-            "excerpt": self._make_excerpt(content),
-            "tags": tags or [],
-            "image_url": image_url or None,
-            "status": "published" if publish else "draft",
-            "published_at": now if publish else None,
+            "content": row["content"],
+            "excerpt": row["excerpt"],
+            "html": row["html"],
+            "toc": row["toc"],
+            "word_count": row["word_count"],
+            "reading_time": row["reading_time"],
+            "tags": row["tags"],
+            "image_url": row["image_url"],
+            "status": row["status"],
+            "published_at": now if published else None,
             "created_at": now,
             "updated_at": now,
         }
-        posts.append(post)
-        self._save(posts)
+
+    async def post(self, content: str, title: str = "", tags: List[str] = None,
+                   publish: bool = False, image_url: str = "", **kwargs) -> PostResult:
+        row = _new_post_row(content, title, tags, publish, image_url)
+
+        def add_post(posts: list) -> dict:
+            # Ensure unique slug against the list as of this commit
+            post = self._stored_post(row, {p["slug"] for p in posts})
+            posts.append(post)
+            return post
+
+        try:
+            post = await self._submit(add_post)
+        except Exception as e:
+            return PostResult(success=False, platform="blog", error=str(e))
         return PostResult(success=True, platform="blog", post_id=post["id"], url=f"/blog/{post['slug']}")
 
+    async def post_many(self, items: List[dict], concurrency: int = 8) -> List[PostResult]:
+        """Create many posts in a single commit."""
+        rows = await asyncio.to_thread(lambda: [_new_post_row(**item) for item in items])
+
+        def add_posts(posts: list) -> List[dict]:
+            taken = {p["slug"] for p in posts}
+            added = [self._stored_post(row, taken) for row in rows]
+            posts.extend(added)
+            return added
+
+        try:
+            added = await self._submit(add_posts)
+        except Exception as e:
+            return [PostResult(success=False, platform="blog", error=str(e)) for _ in items]
+        return [PostResult(success=True, platform="blog", post_id=p["id"], url=f"/blog/{p['slug']}")
+                for p in added]
+
     async def get_posts(self) -> list:
         posts = self._load()
         published = [p for p in posts if p.get("status") == "published"]
@@ -206,13 +476,59 @@ class LocalBlogStore(PlatformAdapter):
         return None
 
     async def delete_post(self, post_id: str) -> bool:
-        posts = self._load()
-        original_len = len(posts)
-        posts = [p for p in posts if p["id"] != post_id]
-        if len(posts) < original_len:
-            self._save(posts)
-            return True
-        return False
+        def remove_post(posts: list) -> bool:
+            original_len = len(posts)
+            posts[:] = [p for p in posts if p["id"] != post_id]
+            return len(posts) < original_len
+
+        try:
+            return await self._submit(remove_post)
+        except Exception:
+            return False
+
+    async def iter_posts(self, page_size: int = 500) -> AsyncIterator[dict]:
+        """Stream every post (any status) from the file without loading it all."""
+        for post in _iter_json_array(self.file_path):
+            yield post
+
+    async def import_posts(self, posts: List[dict], on_conflict: str = "skip") -> List[PostResult]:
+        """Insert a batch of exported posts in a single commit."""
+        rows = [_import_row(p) for p in posts]
+
+        def add_posts(existing: list) -> List[PostResult]:
+            by_slug = {p["slug"]: i for i, p in enumerate(existing)}
+            used_ids = {p["id"] for p in existing}
+            to_write, results = _plan_import(rows, set(by_slug), on_conflict)
+            now = datetime.now(timezone.utc).isoformat()
+            for row in to_write:
+                post = {
+                    "id": str(uuid.uuid4()), "excerpt": "", "tags": [], "image_url": None,
+                    "status": "draft", "published_at": None,
+                    "created_at": now, "updated_at": now,
+                    **row,
+                }
+                if row["slug"] in by_slug:
+                    # overwrite: replace in place, keeping the existing id
+                    i = by_slug[row["slug"]]
+                    post["id"] = existing[i]["id"]
+                    existing[i] = post
+                else:
+                    if post["id"] in used_ids:
+                        post["id"] = str(uuid.uuid4())
+                    by_slug[row["slug"]] = len(existing)
+                    existing.append(post)
+                used_ids.add(post["id"])
+            ids = {p["slug"]: p["id"] for p in existing}
+            for r in results:
+                if r.success:
+                    r.post_id = ids[r.url.rsplit("/", 1)[-1]]
+            return results
+
+        try:
+            return await self._submit(add_posts)
+        except Exception as e:
+            return [PostResult(success=False, platform="blog", post_id=p.get("id"), error=str(e))
+                    for p in posts]
 
     async def validate_credentials(self) -> bool:
         return True
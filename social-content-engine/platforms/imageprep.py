@@ -0,0 +1,228 @@
+"""
+Image preflight for Instagram uploads.
+
+probe_image() reads only the header bytes it needs (PNG IHDR, JPEG marker
+segments up to the SOF frame, WebP/GIF headers) to get the format,
+dimensions and EXIF orientation. ImagePreflight.prepare() uses that to
+decide whether an image can be uploaded as-is. Anything Instagram won't
+take cleanly (non-JPEG, rotated via EXIF, aspect ratio outside 4:5..1.91:1,
+too large or too small) is re-encoded in a worker thread. The result is
+cached by content hash, so re-posts and retries reuse it.
+
+Normalizing needs Pillow; probing does not.
+"""
+
+import asyncio
+import hashlib
+import os
+import struct
+import tempfile
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+# Instagram feed photo limits
+MIN_ASPECT = 4 / 5
+MAX_ASPECT = 1.91
+MIN_WIDTH = 320
+MAX_WIDTH = 1440
+TARGET_WIDTH = 1080
+MAX_BYTES = 8 * 1024 * 1024
+JPEG_QUALITY = 90
+
+# Bump when the normalization rules change so old cached artifacts are ignored
+NORMALIZE_VERSION = 1
+
+# JPEG start-of-frame markers (every SOFn except DHT, JPG and DAC)
+_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+# Markers with no length field
+_STANDALONE_MARKERS = {0x01, 0xD0, 0xD1, 0xD2, 0xD3, 0xD4, 0xD5, 0xD6, 0xD7, 0xD8}
+
+
+@dataclass
+class ImageInfo:
+    """What the preflight needs to know about an image."""
+    format: str  # jpeg, png, webp, gif
+    width: int
+    height: int
+    orientation: int = 1  # EXIF orientation; 5-8 swap width and height
+
+    @property
+    def display_size(self) -> Tuple[int, int]:
+        """Width and height after applying the EXIF orientation."""
+        if self.orientation in (5, 6, 7, 8):
+            return self.height, self.width
+        return self.width, self.height
+
+
+def _exif_orientation(exif: bytes) -> int:
+    """Orientation tag (0x0112) from an APP1 Exif payload, 1 if absent."""
+    if not exif.startswith(b"Exif\x00\x00") or len(exif) < 14:
+        return 1
+    tiff = exif[6:]
+    endian = {b"II": "<", b"MM": ">"}.get(tiff[:2])
+    if not endian:
+        return 1
+    try:
+        ifd = struct.unpack(endian + "I", tiff[4:8])[0]
+        count = struct.unpack(endian + "H", tiff[ifd:ifd + 2])[0]
+        for i in range(count):
+            entry = ifd + 2 + i * 12
+            tag, _, _ = struct.unpack(endian + "HHI", tiff[entry:entry + 8])
+            if tag == 0x0112:
+                value = struct.unpack(endian + "H", tiff[entry + 8:entry + 10])[0]
+                return value if 1 <= value <= 8 else 1
+    except struct.error:
+        pass
+    return 1
+
+
+def _probe_jpeg(f) -> Optional[ImageInfo]:
+    """Walk JPEG marker segments, seeking past their payloads."""
+    orientation = 1
+    f.seek(2)
+    while True:
+        byte = f.read(1)
+        if not byte:
+            return None
+        if byte != b"\xff":
+            continue
+        marker = f.read(1)
+        while marker == b"\xff":  # fill bytes
+            marker = f.read(1)
+        if not marker:
+            return None
+        marker = marker[0]
+        if marker in _STANDALONE_MARKERS:
+            continue
+        if marker == 0xD9 or marker == 0xDA:  # end of image / start of scan
+            return None
+        length_bytes = f.read(2)
+        if len(length_bytes) < 2:
+            return None
+        length = struct.unpack(">H", length_bytes)[0]
+        if marker in _SOF_MARKERS:
+            frame = f.read(5)
+            if len(frame) < 5:
+                return None
+            h, w = struct.unpack(">HH", frame[1:5])
+            return ImageInfo("jpeg", w, h, orientation)
+        if marker == 0xE1 and orientation == 1:
+            orientation = _exif_orientation(f.read(length - 2))
+            continue
+        f.seek(length - 2, os.SEEK_CUR)
+
+
+def probe_image(path: str) -> Optional[ImageInfo]:
+    """Format, size and orientation from the file header, or None if unknown."""
+    try:
+        with open(path, "rb") as f:
+            head = f.read(30)
+            if head[:8] == b"\x89PNG\r\n\x1a\n" and len(head) >= 24:
+                w, h = struct.unpack(">II", head[16:24])
+                return ImageInfo("png", w, h)
+            if head[:2] == b"\xff\xd8":
+                return _probe_jpeg(f)
+            if head[:6] in (b"GIF87a", b"GIF89a"):
+                w, h = struct.unpack("<HH", head[6:10])
+                return ImageInfo("gif", w, h)
+            if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+                chunk = head[12:16]
+                if chunk == b"VP8 ":
+                    w, h = struct.unpack("<HH", head[26:30])
+                    return ImageInfo("webp", w & 0x3FFF, h & 0x3FFF)
+                if chunk == b"VP8L":
+                    bits = struct.unpack("<I", head[21:25])[0]
+                    return ImageInfo("webp", (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1)
+                if chunk == b"VP8X":
+                    w = int.from_bytes(head[24:27], "little") + 1
+                    h = int.from_bytes(head[27:30], "little") + 1
+                    return ImageInfo("webp", w, h)
+    except (OSError, struct.error):
+        pass
+    return None
+
+
+def needs_normalizing(info: Optional[ImageInfo], size: int) -> bool:
+    """True if Instagram wouldn't accept the file exactly as it is."""
+    if info is None or info.format != "jpeg" or info.orientation != 1:
+        return True
+    w, h = info.display_size
+    if not h or not MIN_ASPECT <= w / h <= MAX_ASPECT:
+        return True
+    return not MIN_WIDTH <= w <= MAX_WIDTH or size > MAX_BYTES
+
+
+def _hash_file(path: str) -> str:
+    digest = hashlib.sha256(f"v{NORMALIZE_VERSION}:".encode())
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _normalize(src: str, dest: str):
+    """Re-encode src as an upright JPEG inside Instagram's aspect and size limits."""
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:
+        raise RuntimeError("Pillow is required to normalize images: pip install Pillow")
+
+    with Image.open(src) as img:
+        img = ImageOps.exif_transpose(img)
+        if img.mode != "RGB":
+            background = Image.new("RGB", img.size, (255, 255, 255))
+            rgba = img.convert("RGBA")
+            background.paste(rgba, mask=rgba.getchannel("A"))
+            img = background
+
+        # Center-crop to the nearest allowed aspect ratio
+        w, h = img.size
+        if w / h > MAX_ASPECT:
+            new_w = int(h * MAX_ASPECT)
+            left = (w - new_w) // 2
+            img = img.crop((left, 0, left + new_w, h))
+        elif w / h < MIN_ASPECT:
+            new_h = int(w / MIN_ASPECT)
+            top = (h - new_h) // 2
+            img = img.crop((0, top, w, top + new_h))
+
+        w, h = img.size
+        if w > TARGET_WIDTH or w < MIN_WIDTH:
+            img = img.resize((TARGET_WIDTH, round(h * TARGET_WIDTH / w)), Image.LANCZOS)
+
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(dest), suffix=".tmp")
+        os.close(fd)
+        try:
+            img.save(tmp_path, "JPEG", quality=JPEG_QUALITY, optimize=True)
+            os.replace(tmp_path, dest)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+
+class ImagePreflight:
+    """Probe-then-normalize stage with a content-addressed artifact cache."""
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+        # (path, size, mtime) -> content hash, so retries don't re-read the file
+        self._hashes: Dict[Tuple[str, int, float], str] = {}
+
+    async def prepare(self, image_path: str) -> Tuple[str, ImageInfo]:
+        """Path of an upload-ready JPEG for image_path, plus its info."""
+        stat = os.stat(image_path)
+        info = await asyncio.to_thread(probe_image, image_path)
+        if not needs_normalizing(info, stat.st_size):
+            return image_path, info
+
+        key = (os.path.abspath(image_path), stat.st_size, stat.st_mtime)
+        digest = self._hashes.get(key)
+        if digest is None:
+            digest = await asyncio.to_thread(_hash_file, image_path)
+            self._hashes[key] = digest
+        dest = os.path.join(self.cache_dir, f"{digest}.jpg")
+        if not os.path.exists(dest):
+            os.makedirs(self.cache_dir, exist_ok=True)
+            await asyncio.to_thread(_normalize, image_path, dest)
+        normalized = await asyncio.to_thread(probe_image, dest)
+        return dest, normalized
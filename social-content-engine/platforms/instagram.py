@@ -1,9 +1,18 @@
 """
 Instagram platform adapter using web API with session-based auth.
 
+Fully async: requests go through an httpx.AsyncClient, the human-looking
+pauses are asyncio.sleep jitter, and the photo is streamed to rupload_igphoto
+in chunks read off-thread, so a post never stalls the server's event loop.
+Images go through the preflight in imageprep first: dimensions come from the
+header alone, and anything Instagram wouldn't accept as-is is normalized to
+a cached JPEG.
+
 Setup:
   Set INSTAGRAM_USERNAME and INSTAGRAM_PASSWORD in .env
-  The adapter will authenticate via Instagram's web login API.
+  The adapter will authenticate via Instagram's web login API. The session
+  is validated and kept fresh by instagram_session.SessionManager, shared by
+  every adapter (and, through the session file, every worker) for the account.
 
 Notes:
   - Instagram requires an image for every post
@@ -14,40 +23,72 @@ import os
 import json
 import time
 import random
-import uuid
-import struct
-from pathlib import Path
-from urllib.parse import unquote
+import asyncio
+from dataclasses import dataclass
+from typing import AsyncIterator, Optional, Tuple
+
+import httpx
+
+from .base import PlatformAdapter, PostResult, permanent_status
+from .imageprep import ImagePreflight
+from .instagram_session import (
+    BROWSER_HEADERS, SESSION_FILE, InstagramSession, SessionManager, cookie_domain,
+)
+
+WEB_URL = 'https://www.instagram.com'
+UPLOAD_URL = 'https://i.instagram.com'
+
+# Where normalized uploads are cached when the caller doesn't say
+IMAGE_CACHE_DIR = os.path.expanduser('~/.cache/ghostpen/instagram')
+
+# Bytes per read when streaming the photo upload
+UPLOAD_CHUNK_SIZE = 256 * 1024
+
+
+async def _jitter(low: float, high: float):
+    """Human-looking pause that doesn't block the event loop."""
+    await asyncio.sleep(random.uniform(low, high))
 
-import requests
 
-from .base import PlatformAdapter, PostResult
+async def _iter_file(path: str, chunk_size: int = UPLOAD_CHUNK_SIZE) -> AsyncIterator[bytes]:
+    """Stream a file in chunks, reading each one in a worker thread."""
+    f = await asyncio.to_thread(open, path, 'rb')
+    try:
+        while True:
+            chunk = await asyncio.to_thread(f.read, chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        await asyncio.to_thread(f.close)
+
+
+@dataclass
+class PhotoUpload:
+    """Outcome of upload_photo(): an upload_id to configure, or an error."""
+    upload_id: Optional[str]
+    elapsed: float  # seconds spent on preflight, login and upload
+    error: Optional[str] = None
+    retry_after: Optional[float] = None
+    permanent: bool = False  # uploading again won't help (missing or unusable image)
 
 
 class InstagramAdapter(PlatformAdapter):
     """Instagram posting via web API."""
 
-    def __init__(self, username: str, password: str):
+    def __init__(self, username: str, password: str,
+                 web_url: str = WEB_URL, upload_url: str = UPLOAD_URL,
+                 image_cache_dir: str = IMAGE_CACHE_DIR, session_file: str = SESSION_FILE):
         self.username = username
         self.password = password
-        self.session = requests.Session()
-        self._logged_in = False
+        self.web_url = web_url.rstrip('/')
+        self.upload_url = upload_url.rstrip('/')
         self._user_id = None
-        self.session_file = os.path.expanduser("~/.instagram_web_session.json")
-
-        self.session.headers.update({
-            'User-Agent': (
-                'Mozilla/5.0 (Windows NT 10.0; Win64; x64) '
-                'AppleWebKit/537.36 (KHTML, like Gecko) '
-                'Chrome/120.0.0.0 Safari/537.36'
-            ),
-            'Accept': '*/*',
-            'Accept-Language': 'en-US,en;q=0.9',
-            'X-Requested-With': 'XMLHttpRequest',
-            'X-IG-App-ID': '936619743392459',
-            'Referer': 'https://www.instagram.com/',
-            'Origin': 'https://www.instagram.com',
-        })
+        self.preflight = ImagePreflight(image_cache_dir)
+        self.sessions = SessionManager.shared(username, password, session_file, self.web_url)
+        self._session: Optional[InstagramSession] = None
+
+        self.client = httpx.AsyncClient(headers=BROWSER_HEADERS, follow_redirects=True)
 
     @property
     def platform_name(self) -> str:
@@ -57,153 +98,82 @@ class InstagramAdapter(PlatformAdapter):
     def max_content_length(self) -> int:
         return 2200
 
-    def _save_session(self):
-        """Save session cookies to file."""
-        data = {
-            'cookies': dict(self.session.cookies),
-            'user_id': self._user_id,
-        }
-        with open(self.session_file, 'w') as f:
-            json.dump(data, f)
-
-    def _load_session(self) -> bool:
-        """Try to load a saved session."""
-        if not os.path.exists(self.session_file):
-            return False
-        try:
-            with open(self.session_file) as f:
-                data = json.load(f)
-            for name, value in data.get('cookies', {}).items():
-                self.session.cookies.set(name, value, domain='.instagram.com')
-            self._user_id = data.get('user_id')
-
-            # Verify session is still valid
-            self.session.headers['X-CSRFToken'] = self.session.cookies.get('csrftoken', '')
-            r = self.session.get('https://www.instagram.com/api/v1/web/accounts/current_user/', timeout=10)
-            if r.status_code == 200 and r.json().get('user', {}).get('username') == self.username:
-                print(f"Instagram: restored saved session for {self.username}")
-                return True
-            return False
-        except Exception as e:
-            print(f"Instagram: saved session invalid ({e})")
-            return False
+    def _cookie(self, name: str) -> str:
+        """Cookie value by name, whatever domain it was set on."""
+        for cookie in self.client.cookies.jar:
+            if cookie.name == name:
+                return cookie.value
+        return ''
 
-    def _login(self):
-        """Login via Instagram web API."""
-        if self._logged_in:
-            return
+    def _refresh_csrf(self):
+        csrf = self._cookie('csrftoken')
+        if csrf:
+            self.client.headers['X-CSRFToken'] = csrf
 
-        # Try saved session first
-        if self._load_session():
-            self._logged_in = True
+    async def _login(self):
+        """Apply the account's validated session to this adapter's client.
+
+        The shared SessionManager usually answers from memory; only the first
+        post of a process (or one after an expired/rejected session) waits
+        on validation or a fresh login.
+        """
+        session = await self.sessions.get()
+        if session is self._session:
             return
+        domain = cookie_domain(self.web_url)
+        for name, value in session.cookies.items():
+            self.client.cookies.set(name, value, domain=domain)
+        self._user_id = session.user_id
+        self._session = session
+        self._refresh_csrf()
+
+    def _session_rejected(self, response) -> bool:
+        """True (and the shared session is marked for re-check) on an auth failure."""
+        if response.status_code in (401, 403) or 'login_required' in response.text[:500]:
+            self.sessions.invalidate(self._session)
+            self._session = None
+            return True
+        return False
 
-        # Fresh web login
-        r = self.session.get('https://www.instagram.com/accounts/login/', timeout=10)
-        csrf = self.session.cookies.get('csrftoken', '')
-        if not csrf:
-            raise RuntimeError("Instagram: could not get CSRF token")
-
-        self.session.headers['X-CSRFToken'] = csrf
-
-        login_data = {
-            'enc_password': f'#PWD_INSTAGRAM_BROWSER:0:0:{self.password}',
-            'username': self.username,
-            'queryParams': '{}',
-            'optIntoOneTap': 'false',
-        }
-
-        time.sleep(random.uniform(1, 3))
-
-        r2 = self.session.post(
-            'https://www.instagram.com/accounts/login/ajax/',
-            data=login_data,
-            timeout=15,
-        )
-
-        resp = r2.json()
-        if not resp.get('authenticated'):
-            error = resp.get('message', 'Login failed')
-            if resp.get('two_factor_required'):
-                error = 'Two-factor authentication is enabled. Disable it temporarily or use an app password.'
-            raise RuntimeError(f"Instagram login failed: {error}")
-
-        self._user_id = resp.get('userId')
-        self._logged_in = True
-
-        # Update CSRF after login
-        csrf = self.session.cookies.get('csrftoken', '')
-        if csrf:
-            self.session.headers['X-CSRFToken'] = csrf
+    @staticmethod
+    def _retry_after(response, default: float = 600.0) -> float:
+        """Seconds to back off after a 429 (Instagram rarely says, so be generous)."""
+        value = response.headers.get('Retry-After', '')
+        return float(value) if value.isdigit() else default
 
-        self._save_session()
-        print(f"Instagram: logged in as {self.username} (ID: {self._user_id})")
+    async def upload_photo(self, image_path: str) -> PhotoUpload:
+        """Step 1: preflight, log in and upload the photo (no caption needed yet).
 
-    def _get_image_dimensions(self, image_path: str):
-        """Get image width and height from PNG file header."""
-        try:
-            with open(image_path, 'rb') as f:
-                header = f.read(32)
-                if header[:8] == b'\x89PNG\r\n\x1a\n':
-                    w, h = struct.unpack('>II', header[16:24])
-                    return w, h
-                # JPEG
-                f.seek(0)
-                data = f.read()
-                i = 2
-                while i < len(data) - 1:
-                    if data[i] != 0xFF:
-                        break
-                    marker = data[i + 1]
-                    if marker in (0xC0, 0xC1, 0xC2):
-                        h = (data[i + 5] << 8) + data[i + 6]
-                        w = (data[i + 7] << 8) + data[i + 8]
-                        return w, h
-                    size = (data[i + 2] << 8) + data[i + 3]
-                    i += 2 + size
-        except Exception:
-            pass
-        return 1080, 1080  # Default square
+        Callers that know the image before the caption (auto-post) start this
+        early and hand the upload_id to post() once the caption is ready.
+        """
+        started = time.perf_counter()
 
-    async def post(
-        self,
-        content: str,
-        image_path: str = None,
-        **kwargs,
-    ) -> PostResult:
-        """Post a photo with caption to Instagram via web API."""
-        if not image_path:
-            return PostResult(
-                success=False,
-                platform="instagram",
-                error="Instagram requires an image.",
-            )
+        def failed(error: str, retry_after: Optional[float] = None, permanent: bool = False) -> PhotoUpload:
+            return PhotoUpload(None, time.perf_counter() - started, error, retry_after, permanent)
 
+        if not image_path:
+            return failed("Instagram requires an image.", permanent=True)
         if not os.path.exists(image_path):
-            return PostResult(
-                success=False,
-                platform="instagram",
-                error=f"Image not found: {image_path}",
-            )
+            return failed(f"Image not found: {image_path}", permanent=True)
 
         try:
-            self._login()
+            image_path, info = await self.preflight.prepare(image_path)
         except Exception as e:
-            return PostResult(success=False, platform="instagram", error=str(e))
-
-        caption = content[:2200]
-        time.sleep(random.uniform(1, 3))
+            return failed(f"Image preflight failed: {e}", permanent=True)
 
         try:
-            # Step 1: Upload the image
-            upload_id = str(int(time.time() * 1000))
-            w, h = self._get_image_dimensions(image_path)
+            await self._login()
+        except Exception as e:
+            return failed(str(e))
 
-            with open(image_path, 'rb') as f:
-                image_data = f.read()
+        await _jitter(1, 3)
 
-            # Determine content type
-            ct = 'image/png' if image_path.lower().endswith('.png') else 'image/jpeg'
+        try:
+            upload_id = str(int(time.time() * 1000))
+            w, h = info.width, info.height
+            size = os.path.getsize(image_path)
+            ct = 'image/jpeg'  # preflight only lets upright JPEGs through
 
             rupload_params = json.dumps({
                 "media_type": 1,
@@ -219,45 +189,50 @@ class InstagramAdapter(PlatformAdapter):
             })
 
             upload_name = f"{upload_id}_0_{random.randint(1000000000, 9999999999)}"
-            upload_url = f"https://i.instagram.com/rupload_igphoto/{upload_name}"
+            upload_url = f"{self.upload_url}/rupload_igphoto/{upload_name}"
 
             upload_headers = {
                 'X-Entity-Name': upload_name,
-                'X-Entity-Length': str(len(image_data)),
+                'X-Entity-Length': str(size),
                 'X-Entity-Type': ct,
                 'X-Instagram-Rupload-Params': rupload_params,
                 'Content-Type': 'application/octet-stream',
+                # Explicit length so the streamed body isn't sent chunked
+                'Content-Length': str(size),
                 'Offset': '0',
             }
 
-            r_upload = self.session.post(
+            r_upload = await self.client.post(
                 upload_url,
-                data=image_data,
+                content=_iter_file(image_path),
                 headers=upload_headers,
                 timeout=60,
             )
 
+            if r_upload.status_code == 429:
+                return failed("Image upload throttled: HTTP 429", self._retry_after(r_upload))
             if r_upload.status_code != 200:
-                return PostResult(
-                    success=False,
-                    platform="instagram",
-                    error=f"Image upload failed: HTTP {r_upload.status_code}",
-                )
+                if self._session_rejected(r_upload):
+                    return failed("Image upload rejected: session expired, will re-validate")
+                return failed(f"Image upload failed: HTTP {r_upload.status_code}",
+                              permanent=permanent_status(r_upload.status_code))
 
             upload_resp = r_upload.json()
             if upload_resp.get('status') != 'ok':
-                return PostResult(
-                    success=False,
-                    platform="instagram",
-                    error=f"Image upload rejected: {upload_resp}",
-                )
+                return failed(f"Image upload rejected: {upload_resp}")
+        except Exception as e:
+            return failed(str(e))
 
-            time.sleep(random.uniform(2, 4))
+        return PhotoUpload(upload_id, time.perf_counter() - started)
 
-            # Step 2: Configure/publish the post
-            csrf = self.session.cookies.get('csrftoken', '')
-            if csrf:
-                self.session.headers['X-CSRFToken'] = csrf
+    async def _configure(self, upload_id: str, caption: str) -> Tuple[PostResult, bool]:
+        """Step 2: publish an uploaded photo with its caption.
+
+        Also returns whether Instagram definitely refused it (so nothing was
+        published and uploading again is safe).
+        """
+        try:
+            self._refresh_csrf()
 
             configure_data = {
                 'upload_id': upload_id,
@@ -268,18 +243,29 @@ class InstagramAdapter(PlatformAdapter):
                 'source_type': 'library',
             }
 
-            r_configure = self.session.post(
-                'https://www.instagram.com/api/v1/media/configure/',
+            r_configure = await self.client.post(
+                f'{self.web_url}/api/v1/media/configure/',
                 data=configure_data,
                 timeout=30,
             )
 
+            if r_configure.status_code == 429:
+                return PostResult(
+                    success=False,
+                    platform="instagram",
+                    error="Post configure throttled: HTTP 429",
+                    retry_after=self._retry_after(r_configure),
+                ), False
             if r_configure.status_code != 200:
+                if self._session_rejected(r_configure):
+                    return PostResult(success=False, platform="instagram",
+                                      error="Post configure rejected: session expired, will re-validate"), False
                 return PostResult(
                     success=False,
                     platform="instagram",
                     error=f"Post configure failed: HTTP {r_configure.status_code}",
-                )
+                    permanent=permanent_status(r_configure.status_code),
+                ), 400 <= r_configure.status_code < 500
 
             conf_resp = r_configure.json()
             if conf_resp.get('status') == 'ok':
@@ -291,21 +277,53 @@ class InstagramAdapter(PlatformAdapter):
                     platform="instagram",
                     post_id=str(pk),
                     url=f"https://www.instagram.com/p/{code}/" if code else None,
-                )
+                ), False
             else:
                 return PostResult(
                     success=False,
                     platform="instagram",
                     error=f"Post failed: {conf_resp.get('message', conf_resp)}",
-                )
+                ), True
 
         except Exception as e:
-            return PostResult(success=False, platform="instagram", error=str(e))
+            return PostResult(success=False, platform="instagram", error=str(e)), False
+
+    async def post(
+        self,
+        content: str,
+        image_path: str = None,
+        upload_id: str = None,
+        **kwargs,
+    ) -> PostResult:
+        """Post a photo with caption to Instagram via web API.
+
+        With upload_id (from an earlier upload_photo()) only the configure
+        call is made. If Instagram refuses that upload (e.g. it expired),
+        image_path is uploaded again.
+        """
+        caption = content[:2200]
+        if upload_id:
+            result, refused = await self._configure(upload_id, caption)
+            if not refused or not image_path:
+                return result
+
+        upload = await self.upload_photo(image_path)
+        if not upload.upload_id:
+            return PostResult(success=False, platform="instagram", error=upload.error,
+                              retry_after=upload.retry_after, permanent=upload.permanent)
+
+        await _jitter(2, 4)
+        result, _ = await self._configure(upload.upload_id, caption)
+        return result
 
     async def validate_credentials(self) -> bool:
         """Check Instagram login."""
         try:
-            self._login()
+            await self._login()
             return True
         except Exception:
             return False
+
+    async def aclose(self):
+        """Close pooled connections."""
+        await self.client.aclose()
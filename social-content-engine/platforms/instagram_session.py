@@ -0,0 +1,296 @@
+"""
+Validated Instagram web sessions, shared across adapters and server workers.
+
+SessionManager.shared() hands every InstagramAdapter for the same account
+the same manager. The manager keeps the session in memory and only checks
+it against accounts/current_user once per `ttl`; a background task does that
+check `refresh_margin` before the TTL runs out, so posts never wait on
+validation or a fresh login.
+
+Across processes the session file is the source of truth. It records when
+the session was last validated, is written atomically, and is only
+validated or re-created while holding an fcntl lock on a sidecar file, so
+N uvicorn workers share one login instead of N.
+"""
+
+import asyncio
+import ipaddress
+import json
+import os
+import random
+import tempfile
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field, replace
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process locking, in-process sharing still works
+    fcntl = None
+
+WEB_URL = 'https://www.instagram.com'
+SESSION_FILE = os.path.expanduser('~/.instagram_web_session.json')
+
+# How long a validated session is trusted, and how early it is re-checked
+VALIDATION_TTL = 6 * 3600
+REFRESH_MARGIN = 15 * 60
+# Pause before retrying a failed background refresh
+REFRESH_RETRY = 60
+
+BROWSER_HEADERS = {
+    'User-Agent': (
+        'Mozilla/5.0 (Windows NT 10.0; Win64; x64) '
+        'AppleWebKit/537.36 (KHTML, like Gecko) '
+        'Chrome/120.0.0.0 Safari/537.36'
+    ),
+    'Accept': '*/*',
+    'Accept-Language': 'en-US,en;q=0.9',
+    'X-Requested-With': 'XMLHttpRequest',
+    'X-IG-App-ID': '936619743392459',
+    'Referer': 'https://www.instagram.com/',
+    'Origin': 'https://www.instagram.com',
+}
+
+
+def cookie_domain(url: str) -> str:
+    """Domain to scope session cookies to so every Instagram host gets them."""
+    host = urlsplit(url).hostname or ''
+    try:
+        ipaddress.ip_address(host)
+        return host
+    except ValueError:
+        pass
+    parts = host.split('.')
+    return '.' + '.'.join(parts[-2:]) if len(parts) > 1 else host
+
+
+@dataclass
+class InstagramSession:
+    """Cookies for a logged-in account and when they were last known good.
+
+    Never mutated: a re-check or invalidation swaps in a new object, so
+    holders can tell a new session apart from the one they already applied
+    and a stale holder's invalidate() can't touch the current one.
+    """
+    cookies: Dict[str, str] = field(default_factory=dict)
+    user_id: Optional[str] = None
+    validated_at: float = 0.0
+
+    def fresh(self, ttl: float, now: float, margin: float = 0.0) -> bool:
+        return now < self.validated_at + ttl - margin
+
+
+class SessionManager:
+    """Keeps one validated session per account in memory and on disk."""
+
+    _shared: Dict[Tuple[str, str], 'SessionManager'] = {}
+
+    @classmethod
+    def shared(cls, username: str, password: str, session_file: str = SESSION_FILE,
+               web_url: str = WEB_URL, **kwargs) -> 'SessionManager':
+        """The process-wide manager for this account and session file."""
+        key = (username, os.path.abspath(session_file))
+        manager = cls._shared.get(key)
+        if manager is None or manager.web_url != web_url.rstrip('/'):
+            manager = cls._shared[key] = cls(username, password, session_file, web_url, **kwargs)
+        return manager
+
+    def __init__(self, username: str, password: str, session_file: str = SESSION_FILE,
+                 web_url: str = WEB_URL, ttl: float = VALIDATION_TTL,
+                 refresh_margin: float = REFRESH_MARGIN):
+        self.username = username
+        self.password = password
+        self.session_file = session_file
+        self.web_url = web_url.rstrip('/')
+        self.ttl = ttl
+        self.refresh_margin = refresh_margin
+        self.session: Optional[InstagramSession] = None
+        self._rejected: Optional[Dict[str, str]] = None  # cookies Instagram refused
+        self._file_mtime: Optional[float] = None
+        self._loop = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._refresher: Optional[asyncio.Task] = None
+
+    def _bind_loop(self):
+        # The CLI runs one event loop per command; asyncio primitives can't cross loops
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._lock = asyncio.Lock()
+            self._refresher = None
+
+    async def get(self) -> InstagramSession:
+        """A validated session, from memory whenever possible."""
+        self._bind_loop()
+        if not (self.session and self.session.fresh(self.ttl, time.time())):
+            async with self._lock:
+                if not (self.session and self.session.fresh(self.ttl, time.time())):
+                    await self._refresh()
+        self._start_refresher()
+        return self.session
+
+    def invalidate(self, session: Optional[InstagramSession] = None):
+        """Mark the session as needing a re-check (e.g. after a 401/403)."""
+        if self.session and (session is None or session is self.session):
+            self._rejected = dict(self.session.cookies)
+            self.session = replace(self.session, validated_at=0.0)
+
+    def _start_refresher(self):
+        if self._refresher is None or self._refresher.done():
+            self._refresher = asyncio.get_running_loop().create_task(self._refresh_loop())
+
+    async def _refresh_loop(self):
+        while self.session:
+            due = self.session.validated_at + self.ttl - self.refresh_margin
+            await asyncio.sleep(max(due - time.time(), 1.0))
+            if self.session.fresh(self.ttl, time.time(), self.refresh_margin):
+                continue  # refreshed by a post or another worker meanwhile
+            try:
+                async with self._lock:
+                    await self._refresh()
+            except Exception as e:
+                print(f"Instagram: background session refresh failed ({e})")
+                await asyncio.sleep(REFRESH_RETRY)
+
+    # -- cross-process coordination --------------------------------------
+
+    @asynccontextmanager
+    async def _file_lock(self):
+        """Hold the cross-process lock; released even if cancelled while waiting."""
+        if fcntl is None:
+            yield
+            return
+        lock = open(self.session_file + '.lock', 'a')
+        acquire = asyncio.ensure_future(asyncio.to_thread(fcntl.flock, lock, fcntl.LOCK_EX))
+        try:
+            await asyncio.shield(acquire)
+        except BaseException:
+            # The thread still takes the lock; closing the file once it has releases it
+            acquire.add_done_callback(lambda _: lock.close())
+            raise
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+            lock.close()
+
+    def _read_file(self) -> Optional[InstagramSession]:
+        """Session from disk if the file changed since we last looked."""
+        try:
+            mtime = os.stat(self.session_file).st_mtime
+        except FileNotFoundError:
+            return None
+        if mtime == self._file_mtime:
+            return None
+        try:
+            with open(self.session_file) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        self._file_mtime = mtime
+        if data.get('username', self.username) != self.username:
+            return None
+        return InstagramSession(
+            cookies=data.get('cookies', {}),
+            user_id=data.get('user_id'),
+            validated_at=float(data.get('validated_at', 0.0)),
+        )
+
+    def _write_file(self, session: InstagramSession):
+        """Atomically replace the session file (readers never see half a file)."""
+        data = {
+            'username': self.username,
+            'cookies': session.cookies,
+            'user_id': session.user_id,
+            'validated_at': session.validated_at,
+        }
+        directory = os.path.dirname(os.path.abspath(self.session_file))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.instagram_session.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(data, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.session_file)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        self._file_mtime = os.stat(self.session_file).st_mtime
+
+    async def _refresh(self):
+        """Re-check (or re-create) the session. Caller holds self._lock."""
+        async with self._file_lock():
+            on_disk = await asyncio.to_thread(self._read_file)
+            if on_disk and (self.session is None or on_disk.validated_at > self.session.validated_at):
+                self.session = on_disk
+            trusted = self.session and self.session.cookies != self._rejected
+            if trusted and self.session.fresh(self.ttl, time.time(), self.refresh_margin):
+                return  # another worker validated it recently
+
+            if self.session and await self._validate(self.session):
+                self.session = replace(self.session, validated_at=time.time())
+            else:
+                self.session = await self._login()
+            self._rejected = None
+            await asyncio.to_thread(self._write_file, self.session)
+
+    # -- network ---------------------------------------------------------
+
+    def _client(self, session: Optional[InstagramSession] = None) -> httpx.AsyncClient:
+        client = httpx.AsyncClient(headers=BROWSER_HEADERS, follow_redirects=True)
+        if session:
+            domain = cookie_domain(self.web_url)
+            for name, value in session.cookies.items():
+                client.cookies.set(name, value, domain=domain)
+            if session.cookies.get('csrftoken'):
+                client.headers['X-CSRFToken'] = session.cookies['csrftoken']
+        return client
+
+    async def _validate(self, session: InstagramSession) -> bool:
+        try:
+            async with self._client(session) as client:
+                r = await client.get(f'{self.web_url}/api/v1/web/accounts/current_user/', timeout=10)
+            if r.status_code == 200 and r.json().get('user', {}).get('username') == self.username:
+                print(f"Instagram: session for {self.username} is valid")
+                return True
+        except Exception as e:
+            print(f"Instagram: saved session invalid ({e})")
+        return False
+
+    async def _login(self) -> InstagramSession:
+        """Fresh login via Instagram's web API."""
+        async with self._client() as client:
+            await client.get(f'{self.web_url}/accounts/login/', timeout=10)
+            csrf = next((c.value for c in client.cookies.jar if c.name == 'csrftoken'), '')
+            if not csrf:
+                raise RuntimeError("Instagram: could not get CSRF token")
+            client.headers['X-CSRFToken'] = csrf
+
+            login_data = {
+                'enc_password': f'#PWD_INSTAGRAM_BROWSER:0:0:{self.password}',
+                'username': self.username,
+                'queryParams': '{}',
+                'optIntoOneTap': 'false',
+            }
+
+            await asyncio.sleep(random.uniform(1, 3))
+
+            r = await client.post(f'{self.web_url}/accounts/login/ajax/', data=login_data, timeout=15)
+            resp = r.json()
+            if not resp.get('authenticated'):
+                error = resp.get('message', 'Login failed')
+                if resp.get('two_factor_required'):
+                    error = 'Two-factor authentication is enabled. Disable it temporarily or use an app password.'
+                raise RuntimeError(f"Instagram login failed: {error}")
+
+            session = InstagramSession(
+                cookies={c.name: c.value for c in client.cookies.jar},
+                user_id=resp.get('userId'),
+                validated_at=time.time(),
+            )
+        print(f"Instagram: logged in as {self.username} (ID: {session.user_id})")
+        return session
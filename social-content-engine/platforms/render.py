@@ -0,0 +1,226 @@
+"""
+Render-on-write for blog posts.
+
+Blog writes call render_post() once at publish time to produce everything
+readers need (HTML, table of contents, word count, reading time, title and
+excerpt) in a single pass over the markdown, so read endpoints can serve the
+stored fields instead of re-parsing content on every page view.
+
+Covers the markdown the model actually writes: ATX headings, paragraphs,
+bullet/numbered lists, blockquotes, fenced code, horizontal rules, and
+inline bold/italic/code/links/images. Raw HTML is escaped and link/image
+URLs are limited to http(s), mailto and relative ones, matching what
+react-markdown does on the frontend; the HTML is injected into the page as
+is, so this is the only sanitizing it gets.
+"""
+
+import html
+import re
+from typing import List, Optional
+
+WORDS_PER_MINUTE = 200  # Same rate the frontend used for "N min read"
+EXCERPT_LENGTH = 200
+
+# Fields render_post() adds to a stored post
+RENDERED_FIELDS = ("html", "toc", "word_count", "reading_time", "excerpt")
+
+_HEADING = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+_BULLET = re.compile(r"^\s*[-*+]\s+(.*)$")
+_NUMBERED = re.compile(r"^\s*\d+[.)]\s+(.*)$")
+_HRULE = re.compile(r"^\s*([-*_])(\s*\1){2,}\s*$")
+_FENCE = re.compile(r"^\s*(```|~~~)")
+
+_INLINE = re.compile(
+    r"`([^`]+)`"                          # 1: code
+    r"|!\[([^\]]*)\]\(([^)\s]+)\)"        # 2,3: image
+    r"|\[([^\]]+)\]\(([^)\s]+)\)"         # 4,5: link
+    r"|\*\*(.+?)\*\*|__(.+?)__"           # 6,7: bold
+    r"|\*(.+?)\*|(?<!\w)_(.+?)_(?!\w)"    # 8,9: italic
+)
+
+# Browsers drop ASCII control characters and whitespace from URLs
+# ("java\tscript:" runs as "javascript:"), so they go before the scheme check
+_URL_IGNORED = re.compile(r"[\x00-\x20\x7f]+")
+_URL_SCHEME = re.compile(r"^([a-zA-Z][a-zA-Z0-9+.-]*):")
+SAFE_SCHEMES = ("http", "https", "mailto")
+
+# Excerpt cleanup, same rules the adapters have always used
+_EXCERPT_BOLD = re.compile(r"\*\*(.+?)\*\*")
+_EXCERPT_ITALIC = re.compile(r"\*(.+?)\*")
+_EXCERPT_LINK = re.compile(r"\[(.+?)\]\(.+?\)")
+
+
+def _safe_url(url: str) -> str:
+    """The URL escaped for an attribute if it's http(s), mailto or relative; else "#"."""
+    url = _URL_IGNORED.sub("", url)
+    scheme = _URL_SCHEME.match(url)
+    if scheme and scheme.group(1).lower() not in SAFE_SCHEMES:
+        return "#"
+    return html.escape(url, quote=True)
+
+
+def _inline(text: str) -> str:
+    """Render inline markdown in one left-to-right scan."""
+    out = []
+    pos = 0
+    for m in _INLINE.finditer(text):
+        out.append(html.escape(text[pos:m.start()], quote=False))
+        if m.group(1) is not None:
+            out.append(f"<code>{html.escape(m.group(1), quote=False)}</code>")
+        elif m.group(3) is not None:
+            out.append(f'<img src="{_safe_url(m.group(3))}" alt="{html.escape(m.group(2))}">')
+        elif m.group(5) is not None:
+            out.append(f'<a href="{_safe_url(m.group(5))}" target="_blank" '
+                       f'rel="noopener noreferrer">{_inline(m.group(4))}</a>')
+        elif m.group(6) is not None or m.group(7) is not None:
+            out.append(f"<strong>{_inline(m.group(6) or m.group(7))}</strong>")
+        else:
+            out.append(f"<em>{_inline(m.group(8) or m.group(9))}</em>")
+        pos = m.end()
+    out.append(html.escape(text[pos:], quote=False))
+    return "".join(out)
+
+
+def _plain(text: str) -> str:
+    """Heading text without inline markup, for the TOC and anchors."""
+    def strip(m):
+        for group in (1, 2, 4, 6, 7, 8, 9):
+            if m.group(group) is not None:
+                return m.group(group) if group in (1, 2) else _plain(m.group(group))
+        return ""
+    return _INLINE.sub(strip, text)
+
+
+def _anchor(text: str, used: set) -> str:
+    base = re.sub(r"[\s-]+", "-", re.sub(r"[^a-z0-9\s-]", "", text.lower())).strip("-") or "section"
+    anchor = base
+    counter = 1
+    while anchor in used:
+        anchor = f"{base}-{counter}"
+        counter += 1
+    used.add(anchor)
+    return anchor
+
+
+def render_post(content: str, excerpt_length: int = EXCERPT_LENGTH) -> dict:
+    """Render markdown and compute post metadata in one pass over the lines.
+
+    Returns a dict with title (None if there is no heading), html, toc
+    (list of {"level", "text", "id"} for h2/h3), word_count, reading_time
+    (minutes) and excerpt.
+    """
+    title: Optional[str] = None
+    body: List[str] = []
+    toc: List[dict] = []
+    excerpt_lines: List[str] = []
+    anchors: set = set()
+    word_count = 0
+
+    paragraph: List[str] = []
+    list_tag: Optional[str] = None
+    list_items: List[str] = []
+    quote: List[str] = []
+    code: Optional[List[str]] = None
+
+    def flush():
+        nonlocal list_tag
+        if paragraph:
+            body.append(f"<p>{_inline(' '.join(paragraph))}</p>")
+            paragraph.clear()
+        if list_tag:
+            items = "".join(f"<li>{_inline(item)}</li>" for item in list_items)
+            body.append(f"<{list_tag}>{items}</{list_tag}>")
+            list_items.clear()
+            list_tag = None
+        if quote:
+            body.append(f"<blockquote><p>{_inline(' '.join(quote))}</p></blockquote>")
+            quote.clear()
+
+    for line in content.split("\n"):
+        stripped = line.strip()
+        if stripped and not stripped.startswith("#"):
+            excerpt_lines.append(line)
+
+        if code is not None:
+            if _FENCE.match(line):
+                body.append(f"<pre><code>{html.escape(chr(10).join(code), quote=False)}</code></pre>")
+                code = None
+            else:
+                code.append(line)
+                word_count += len(line.split())
+            continue
+
+        if not stripped:
+            flush()
+            continue
+        word_count += len(stripped.split())
+
+        if _FENCE.match(line):
+            flush()
+            code = []
+            continue
+
+        if stripped.startswith("#"):
+            if title is None:
+                title = stripped.lstrip("#").strip()
+            heading = _HEADING.match(stripped)
+            if heading:
+                flush()
+                level = len(heading.group(1))
+                text = heading.group(2)
+                anchor = _anchor(_plain(text), anchors)
+                body.append(f'<h{level} id="{anchor}">{_inline(text)}</h{level}>')
+                if level in (2, 3):
+                    toc.append({"level": level, "text": _plain(text), "id": anchor})
+                continue
+
+        if _HRULE.match(stripped):
+            flush()
+            body.append("<hr>")
+            continue
+
+        item = _BULLET.match(line)
+        tag = "ul"
+        if not item:
+            item = _NUMBERED.match(line)
+            tag = "ol"
+        if item:
+            if list_tag != tag:
+                flush()
+                list_tag = tag
+            list_items.append(item.group(1))
+            continue
+
+        if stripped.startswith(">"):
+            if list_tag or paragraph:
+                flush()
+            quote.append(stripped.lstrip(">").strip())
+            continue
+
+        if list_tag and line[:1].isspace():
+            # Indented continuation of the previous list item
+            list_items[-1] += " " + stripped
+            continue
+        if list_tag or quote:
+            flush()
+        paragraph.append(stripped)
+
+    if code is not None:
+        body.append(f"<pre><code>{html.escape(chr(10).join(code), quote=False)}</code></pre>")
+    flush()
+
+    excerpt = " ".join(excerpt_lines)
+    excerpt = _EXCERPT_BOLD.sub(r"\1", excerpt)
+    excerpt = _EXCERPT_ITALIC.sub(r"\1", excerpt)
+    excerpt = _EXCERPT_LINK.sub(r"\1", excerpt)
+    if len(excerpt) > excerpt_length:
+        excerpt = excerpt[:excerpt_length].rsplit(" ", 1)[0] + "..."
+
+    return {
+        "title": title,
+        "html": "\n".join(body),
+        "toc": toc,
+        "word_count": word_count,
+        "reading_time": max(1, -(-word_count // WORDS_PER_MINUTE)),
+        "excerpt": excerpt,
+    }
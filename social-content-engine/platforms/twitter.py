@@ -1,8 +1,9 @@
 """
-Twitter/X platform adapter using Tweepy v2 API.
+Twitter/X platform adapter using the v2 API over async httpx.
 
-Requirements:
-  pip install tweepy
+Requests are signed with OAuth 1.0a (user context) and sent through one
+shared httpx.AsyncClient, so posting never blocks the event loop and
+connections are reused between tweets.
 
 Setup:
   1. Create a Twitter Developer account at developer.twitter.com
@@ -13,13 +14,55 @@ Setup:
      TWITTER_ACCESS_TOKEN, TWITTER_ACCESS_TOKEN_SECRET
 """
 
-import tweepy
+import base64
+import hashlib
+import hmac
+import secrets
+import time
+from typing import Optional
+from urllib.parse import quote, urlsplit, parse_qsl
 
-from .base import PlatformAdapter, PostResult
+import httpx
+
+from .base import PlatformAdapter, PostResult, permanent_status
+
+API_URL = "https://api.twitter.com"
+
+
+def _pct(value) -> str:
+    """RFC 3986 percent-encoding as OAuth 1.0a requires."""
+    return quote(str(value), safe="~-._")
+
+
+def oauth1_header(method: str, url: str, consumer_key: str, consumer_secret: str,
+                  token: str, token_secret: str, params: Optional[dict] = None) -> str:
+    """Build an OAuth 1.0a HMAC-SHA1 Authorization header.
+
+    Only query/form parameters are signed; JSON bodies (as used by the v2
+    endpoints) are not part of the signature base string.
+    """
+    oauth = {
+        "oauth_consumer_key": consumer_key,
+        "oauth_nonce": secrets.token_hex(16),
+        "oauth_signature_method": "HMAC-SHA1",
+        "oauth_timestamp": str(int(time.time())),
+        "oauth_token": token,
+        "oauth_version": "1.0",
+    }
+    parts = urlsplit(url)
+    signed = list(oauth.items()) + parse_qsl(parts.query) + list((params or {}).items())
+    param_str = "&".join(f"{k}={v}" for k, v in sorted((_pct(k), _pct(v)) for k, v in signed))
+    base_url = f"{parts.scheme}://{parts.netloc}{parts.path}"
+    base = "&".join((method.upper(), _pct(base_url), _pct(param_str)))
+    key = f"{_pct(consumer_secret)}&{_pct(token_secret)}"
+    oauth["oauth_signature"] = base64.b64encode(
+        hmac.new(key.encode(), base.encode(), hashlib.sha1).digest()
+    ).decode()
+    return "OAuth " + ", ".join(f'{_pct(k)}="{_pct(v)}"' for k, v in sorted(oauth.items()))
 
 
 class TwitterAdapter(PlatformAdapter):
-    """Twitter/X posting via Tweepy v2 API."""
+    """Twitter/X posting via the v2 API."""
 
     def __init__(
         self,
@@ -27,13 +70,14 @@ class TwitterAdapter(PlatformAdapter):
         consumer_secret: str,
         access_token: str,
         access_token_secret: str,
+        api_url: str = API_URL,
     ):
-        self.client = tweepy.Client(
-            consumer_key=consumer_key,
-            consumer_secret=consumer_secret,
-            access_token=access_token,
-            access_token_secret=access_token_secret,
-        )
+        self.consumer_key = consumer_key
+        self.consumer_secret = consumer_secret
+        self.access_token = access_token
+        self.access_token_secret = access_token_secret
+        self.api_url = api_url.rstrip("/")
+        self.client = httpx.AsyncClient(timeout=30)
 
     @property
     def platform_name(self) -> str:
@@ -43,6 +87,37 @@ class TwitterAdapter(PlatformAdapter):
     def max_content_length(self) -> int:
         return 280
 
+    async def _request(self, method: str, path: str, **kwargs) -> httpx.Response:
+        url = f"{self.api_url}{path}"
+        headers = {"Authorization": oauth1_header(
+            method, url, self.consumer_key, self.consumer_secret,
+            self.access_token, self.access_token_secret,
+        )}
+        return await self.client.request(method, url, headers=headers, **kwargs)
+
+    @staticmethod
+    def _rate_limit(response: httpx.Response) -> dict:
+        """Budget info from the x-rate-limit-* headers, as PostResult fields."""
+        info = {}
+        remaining = response.headers.get("x-rate-limit-remaining")
+        reset = response.headers.get("x-rate-limit-reset")
+        if remaining is not None and remaining.isdigit():
+            info["rate_limit_remaining"] = int(remaining)
+        if reset is not None and reset.isdigit():
+            info["rate_limit_reset"] = float(reset)
+        if response.status_code == 429:
+            info["retry_after"] = max(1.0, info.get("rate_limit_reset", time.time() + 60) - time.time())
+        return info
+
+    @staticmethod
+    def _error(response: httpx.Response) -> str:
+        try:
+            body = response.json()
+            detail = body.get("detail") or body.get("title") or body.get("errors") or body
+        except ValueError:
+            detail = response.text[:200]
+        return f"HTTP {response.status_code}: {detail}"
+
     async def post(self, content: str, **kwargs) -> PostResult:
         """Post a tweet."""
         # Truncate if over limit
@@ -50,13 +125,18 @@ class TwitterAdapter(PlatformAdapter):
             content = content[:277] + "..."
 
         try:
-            response = self.client.create_tweet(text=content)
-            tweet_id = response.data["id"]
+            response = await self._request("POST", "/2/tweets", json={"text": content})
+            rate_limit = self._rate_limit(response)
+            if response.status_code not in (200, 201):
+                return PostResult(success=False, platform="twitter", error=self._error(response),
+                                  permanent=permanent_status(response.status_code), **rate_limit)
+            tweet_id = response.json()["data"]["id"]
             return PostResult(
                 success=True,
                 platform="twitter",
                 post_id=str(tweet_id),
                 url=f"https://x.com/i/status/{tweet_id}",
+                **rate_limit,
             )
         except Exception as e:
             return PostResult(success=False, platform="twitter", error=str(e))
@@ -64,7 +144,11 @@ class TwitterAdapter(PlatformAdapter):
     async def validate_credentials(self) -> bool:
         """Verify Twitter API credentials."""
         try:
-            self.client.get_me()
-            return True
+            response = await self._request("GET", "/2/users/me")
+            return response.status_code == 200
         except Exception:
             return False
+
+    async def aclose(self):
+        """Close pooled connections."""
+        await self.client.aclose()
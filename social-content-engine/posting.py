@@ -0,0 +1,124 @@
+"""
+Concurrent fan-out of one piece of content to several platforms.
+
+run_with_timeouts() runs every platform's send at once (the outbox
+dispatcher's send() in /generate and the CLI) and waits for each only up
+to that platform's timeout. A platform that overruns isn't cancelled (an
+Instagram configure call cut off halfway may still publish); it is
+reported as "pending" and finishes in the background, where the outbox
+records its outcome like any other. So one slow platform neither delays
+the others nor holds up the caller.
+
+PhotoPreupload starts Instagram's login and photo upload while the caption
+is still being generated, so only the configure call is left once it's done.
+"""
+
+import asyncio
+import time
+from dataclasses import dataclass, asdict
+from typing import Awaitable, Dict, Optional, Set, Tuple
+
+from platforms.base import PlatformAdapter, PostResult
+
+# Seconds to wait for each platform before reporting it as pending
+POST_TIMEOUTS = {"blog": 15.0, "twitter": 20.0, "instagram": 45.0}
+DEFAULT_TIMEOUT = 30.0
+
+# Posts that outlived their timeout; referenced so they aren't garbage collected
+_background: Set[asyncio.Task] = set()
+
+
+@dataclass
+class PostOutcome:
+    """What happened to one platform's post."""
+    platform: str
+    status: str  # posted, failed, skipped, pending, retrying (outbox will try again)
+    post_id: Optional[str] = None
+    url: Optional[str] = None
+    error: Optional[str] = None
+    elapsed: Optional[float] = None  # seconds, None while pending
+
+    @property
+    def success(self) -> Optional[bool]:
+        """True/False once known, None while the post is still running."""
+        return None if self.status == "pending" else self.status == "posted"
+
+    @classmethod
+    def skipped(cls, platform: str, reason: str) -> "PostOutcome":
+        return cls(platform=platform, status="skipped", error=reason)
+
+    @classmethod
+    def from_result(cls, result: PostResult, elapsed: float) -> "PostOutcome":
+        return cls(
+            platform=result.platform,
+            status="posted" if result.success else "failed",
+            post_id=result.post_id,
+            url=result.url,
+            error=result.error,
+            elapsed=round(elapsed, 3),
+        )
+
+    def to_dict(self) -> dict:
+        data = asdict(self)
+        data["success"] = self.success
+        return data
+
+
+async def run_with_timeouts(posts: Dict[str, Awaitable[PostOutcome]],
+                            timeouts: Optional[Dict[str, float]] = None) -> Dict[str, PostOutcome]:
+    """Run per-platform post coroutines concurrently, each up to its timeout.
+
+    Ones that overrun are reported "pending" and left running in the background.
+    """
+    timeouts = {**POST_TIMEOUTS, **(timeouts or {})}
+    outcomes: Dict[str, PostOutcome] = {}
+
+    async def wait(platform: str, task: asyncio.Task):
+        try:
+            outcomes[platform] = await asyncio.wait_for(
+                asyncio.shield(task), timeouts.get(platform, DEFAULT_TIMEOUT)
+            )
+        except asyncio.TimeoutError:
+            outcomes[platform] = PostOutcome(platform=platform, status="pending")
+            _background.add(task)
+            task.add_done_callback(_background.discard)
+
+    tasks = {platform: asyncio.ensure_future(coro) for platform, coro in posts.items()}
+    await asyncio.gather(*(wait(p, t) for p, t in tasks.items()))
+    return outcomes
+
+
+async def drain():
+    """Wait for posts that outlived their timeout (for short-lived processes like the CLI)."""
+    while _background:
+        await asyncio.gather(*list(_background), return_exceptions=True)
+
+
+class PhotoPreupload:
+    """An Instagram photo upload started before its caption exists.
+
+    The upload runs alongside caption generation; result() hands over the
+    upload_id for post(upload_id=...) and how many seconds the overlap
+    saved (upload time minus however long we still had to wait for it).
+    """
+
+    def __init__(self, adapter: PlatformAdapter, image_path: str):
+        self.task = asyncio.ensure_future(adapter.upload_photo(image_path))
+
+    async def result(self) -> Tuple[Optional[str], float]:
+        """(upload_id or None if the upload failed, seconds saved)."""
+        waiting_since = time.perf_counter()
+        try:
+            upload = await self.task
+        except Exception as e:
+            print(f"Instagram pre-upload failed: {e}")
+            return None, 0.0
+        if not upload.upload_id:
+            print(f"Instagram pre-upload failed: {upload.error}; uploading again when posting")
+            return None, 0.0
+        waited = time.perf_counter() - waiting_since
+        return upload.upload_id, round(max(0.0, upload.elapsed - waited), 3)
+
+    def cancel(self):
+        """Drop an upload that won't be posted (Instagram discards unconfigured uploads)."""
+        self.task.cancel()
@@ -0,0 +1,73 @@
+"""
+Per-platform posting budgets.
+
+Each platform gets a token bucket. Twitter's bucket learns its real budget
+from the x-rate-limit-* headers the adapter reports back on PostResult;
+Instagram has no such headers, so its bucket runs on a conservative static
+budget. The outbox dispatcher asks a platform's bucket before every post:
+posts over the budget wait in the outbox until it refills, and a throttled
+platform (429 / Retry-After) blocks its bucket until the window resets.
+delay(n) predicts when the n-th queued post can go, for /queue's etas.
+"""
+
+import time
+from typing import Callable
+
+from platforms.base import PostResult
+
+
+class TokenBucket:
+    """Token bucket whose budget can be corrected from rate-limit headers.
+
+    `budget` posts are allowed per `window` seconds, refilled evenly, with at
+    most `burst` posts going out back to back. observe() replaces the
+    estimate with what the platform reports: the remaining posts are spread
+    evenly until the reported reset time.
+    """
+
+    def __init__(self, budget: float, window: float, burst: float = 1.0,
+                 clock: Callable[[], float] = time.time):
+        self.burst = burst
+        self.rate = budget / window
+        self.tokens = burst
+        self.clock = clock
+        self.updated = clock()
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, n: int = 1) -> float:
+        """Seconds until n tokens are available (n > 1 predicts queue positions)."""
+        now = self.clock()
+        self._refill(now)
+        start = max(now, self.blocked_until)
+        tokens = min(self.burst, self.tokens + (start - now) * self.rate)
+        missing = n - tokens
+        wait = start - now
+        if missing > 0:
+            wait += missing / self.rate
+        return max(0.0, wait)
+
+    def take(self):
+        self._refill(self.clock())
+        self.tokens -= 1
+
+    def observe(self, result: PostResult):
+        """Learn the real budget from a post result's rate-limit fields."""
+        now = self.clock()
+        self._refill(now)
+        reset = result.rate_limit_reset
+        if result.rate_limit_remaining is not None:
+            # Never more than the platform says is left
+            self.tokens = min(self.tokens, float(result.rate_limit_remaining))
+            if reset and reset > now:
+                # Spread what's left evenly over the rest of the window
+                self.rate = max(result.rate_limit_remaining, 1) / (reset - now)
+        if result.retry_after:
+            self.tokens = 0.0
+            self.blocked_until = max(self.blocked_until, now + result.retry_after)
+        elif result.rate_limit_remaining == 0 and reset and reset > now:
+            self.blocked_until = max(self.blocked_until, reset)
+
@@ -0,0 +1,304 @@
+"""
+Scheduled publishing.
+
+Schedules are rows in SQLite (data/schedule.db), so they survive restarts.
+There are two kinds:
+  - "generate": generate content for a topic, then post it.
+  - "post":     post content that was written ahead of time.
+
+The Scheduler keeps a heap of (wake time, schedule id) and sleeps until the
+earliest one, or until a schedule is added or cancelled. A "generate"
+schedule wakes `lead` seconds before its publish time to run the model,
+so a slow generation still lands on time. At publish time the content goes
+into the outbox under the key "schedule:<id>", which handles rate limits
+and retries and guarantees it is posted at most once.
+
+Statuses: scheduled -> generating -> ready -> queued, or failed/cancelled.
+"""
+
+import asyncio
+import heapq
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass, asdict
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+from outbox import Outbox, OutboxDispatcher
+
+STATUSES = ("scheduled", "generating", "ready", "queued", "failed", "cancelled")
+# Retry a failed generation after this long, as long as it can still be on time
+GENERATE_RETRY = 60.0
+# Pause before acting on a schedule again after an error (e.g. the database was locked)
+RUN_RETRY = 30.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS schedules (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    platform TEXT NOT NULL,
+    publish_at REAL NOT NULL,
+    lead REAL NOT NULL DEFAULT 0,
+    params TEXT NOT NULL DEFAULT '{}',
+    kwargs TEXT NOT NULL DEFAULT '{}',
+    content TEXT,
+    status TEXT NOT NULL,
+    outbox_id TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS schedules_status ON schedules (status, publish_at);
+"""
+
+
+@dataclass
+class Schedule:
+    """A post to publish at `publish_at` (unix time)."""
+    id: str
+    kind: str  # generate, post
+    platform: str
+    publish_at: float
+    lead: float  # seconds before publish_at to start generating
+    params: dict  # generator.generate() arguments for kind=generate
+    kwargs: dict  # adapter.post() arguments
+    content: Optional[str]
+    status: str
+    outbox_id: Optional[str]
+    error: Optional[str]
+    created_at: float
+    updated_at: float
+
+    @classmethod
+    def from_row(cls, row: sqlite3.Row) -> "Schedule":
+        data = dict(row)
+        data["params"] = json.loads(data["params"])
+        data["kwargs"] = json.loads(data["kwargs"])
+        return cls(**data)
+
+    @property
+    def wake_at(self) -> Optional[float]:
+        """When the scheduler next has to act on this item, if ever."""
+        if self.status == "scheduled" and self.kind == "generate":
+            return self.publish_at - self.lead
+        if self.status in ("scheduled", "ready"):
+            return self.publish_at
+        return None
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+class ScheduleStore:
+    """SQLite-backed schedule table. Methods are blocking; call via to_thread."""
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(_SCHEMA)
+
+    def _one(self, schedule_id: str) -> Optional[Schedule]:
+        row = self._db.execute("SELECT * FROM schedules WHERE id = ?", (schedule_id,)).fetchone()
+        return Schedule.from_row(row) if row else None
+
+    def get(self, schedule_id: str) -> Optional[Schedule]:
+        with self._lock:
+            return self._one(schedule_id)
+
+    def add(self, kind: str, platform: str, publish_at: float, lead: float = 0.0,
+            params: Optional[dict] = None, kwargs: Optional[dict] = None,
+            content: Optional[str] = None) -> Schedule:
+        now = time.time()
+        schedule_id = uuid.uuid4().hex
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO schedules (id, kind, platform, publish_at, lead, params, kwargs, content,"
+                " status, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, 'scheduled', ?, ?)",
+                (schedule_id, kind, platform, publish_at, lead, json.dumps(params or {}),
+                 json.dumps(kwargs or {}), content, now, now),
+            )
+            return self._one(schedule_id)
+
+    def update(self, schedule_id: str, expect: Tuple[str, ...] = (), **fields) -> Optional[Schedule]:
+        """Set fields; with `expect`, only if the status is one of those. None if it wasn't."""
+        fields["updated_at"] = time.time()
+        sets = ", ".join(f"{k} = ?" for k in fields)
+        sql = f"UPDATE schedules SET {sets} WHERE id = ?"
+        params = list(fields.values()) + [schedule_id]
+        if expect:
+            sql += f" AND status IN ({', '.join('?' * len(expect))})"
+            params += list(expect)
+        with self._lock:
+            if not self._db.execute(sql, params).rowcount:
+                return None
+            return self._one(schedule_id)
+
+    def list(self, status: Optional[str] = None, limit: int = 200) -> List[Schedule]:
+        with self._lock:
+            if status:
+                rows = self._db.execute(
+                    "SELECT * FROM schedules WHERE status = ? ORDER BY publish_at LIMIT ?", (status, limit)
+                ).fetchall()
+            else:
+                rows = self._db.execute(
+                    "SELECT * FROM schedules ORDER BY publish_at LIMIT ?", (limit,)
+                ).fetchall()
+        return [Schedule.from_row(r) for r in rows]
+
+    def active(self) -> List[Schedule]:
+        """Everything the scheduler still has to act on."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT * FROM schedules WHERE status IN ('scheduled', 'generating', 'ready')"
+            ).fetchall()
+        return [Schedule.from_row(r) for r in rows]
+
+
+Generate = Callable[..., Awaitable[str]]
+OnChange = Callable[[Schedule], None]
+
+
+class Scheduler:
+    """Timer heap over the schedule store; hands due posts to the outbox."""
+
+    def __init__(self, store: ScheduleStore, generate: Generate, outbox: Outbox,
+                 dispatcher: OutboxDispatcher, on_change: Optional[OnChange] = None):
+        self.store = store
+        self.generate = generate
+        self.outbox = outbox
+        self.dispatcher = dispatcher
+        self.on_change = on_change
+        self._heap: List[Tuple[float, str]] = []
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._generating: set = set()
+        self._tasks: set = set()  # running generations; referenced so they aren't garbage collected
+        # One generation at a time: the model server is a single GPU
+        self._model = asyncio.Semaphore(1)
+
+    def start(self):
+        for schedule in self.store.active():
+            if schedule.status == "generating":  # interrupted by a restart; just generate again
+                schedule = self.store.update(schedule.id, status="scheduled")
+            self.push(schedule)
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def push(self, schedule: Schedule):
+        """(Re)arm the timer for a schedule; stale heap entries are skipped when popped."""
+        if schedule.wake_at is not None:
+            heapq.heappush(self._heap, (schedule.wake_at, schedule.id))
+            self._wake.set()
+
+    def _changed(self, schedule: Optional[Schedule]):
+        if schedule and self.on_change:
+            self.on_change(schedule)
+
+    async def _run(self):
+        while True:
+            self._wake.clear()
+            now = time.time()
+            while self._heap and self._heap[0][0] <= now:
+                wake_at, schedule_id = heapq.heappop(self._heap)
+                try:
+                    await self._due(schedule_id, now)
+                except Exception as e:
+                    # Keep the timer: one bad pass mustn't stop every later schedule
+                    print(f"Scheduler: schedule {schedule_id} failed ({e}); trying again in {RUN_RETRY:g}s")
+                    heapq.heappush(self._heap, (time.time() + RUN_RETRY, schedule_id))
+
+            timeout = self._heap[0][0] - time.time() if self._heap else None
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _due(self, schedule_id: str, now: float):
+        schedule = await asyncio.to_thread(self.store.get, schedule_id)
+        if not schedule or schedule.wake_at is None or schedule.wake_at > now:
+            return  # cancelled, already handled, or re-armed later
+        if schedule.status == "scheduled" and schedule.kind == "generate":
+            if schedule.id not in self._generating:
+                self._generating.add(schedule.id)
+                task = asyncio.create_task(self._generate(schedule))
+                self._tasks.add(task)
+                task.add_done_callback(self._generation_done)
+        else:
+            await self._publish(schedule)
+
+    def _generation_done(self, task: asyncio.Task):
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception():
+            print(f"Scheduler: generation failed ({task.exception()})")
+
+    async def _generate(self, schedule: Schedule):
+        try:
+            async with self._model:
+                started = await asyncio.to_thread(
+                    self.store.update, schedule.id, ("scheduled",), status="generating"
+                )
+                if not started:
+                    return  # cancelled while waiting for the model
+                self._changed(started)
+                try:
+                    content = await self.generate(platform=schedule.platform, **schedule.params)
+                    if content.startswith("[ERROR:"):
+                        raise RuntimeError(content)
+                except Exception as e:
+                    retry_at = time.time() + GENERATE_RETRY
+                    if retry_at < schedule.publish_at:
+                        updated = await asyncio.to_thread(
+                            self.store.update, schedule.id, ("generating",),
+                            status="scheduled", lead=schedule.publish_at - retry_at, error=str(e),
+                        )
+                    else:
+                        updated = await asyncio.to_thread(
+                            self.store.update, schedule.id, ("generating",), status="failed", error=str(e),
+                        )
+                else:
+                    updated = await asyncio.to_thread(
+                        self.store.update, schedule.id, ("generating",),
+                        status="ready", content=content, error=None,
+                    )
+            self._changed(updated)
+            if updated:
+                self.push(updated)
+        finally:
+            self._generating.discard(schedule.id)
+
+    async def _publish(self, schedule: Schedule):
+        item, _ = await asyncio.to_thread(
+            self.outbox.enqueue, schedule.platform, schedule.content, schedule.kwargs,
+            key=f"schedule:{schedule.id}",
+        )
+        updated = await asyncio.to_thread(
+            self.store.update, schedule.id, ("scheduled", "ready"), status="queued", outbox_id=item.id,
+        )
+        self.dispatcher.wake()
+        self._changed(updated)
+
+    async def add(self, kind: str, platform: str, publish_at: float, **fields) -> Schedule:
+        schedule = await asyncio.to_thread(self.store.add, kind, platform, publish_at, **fields)
+        self.push(schedule)
+        self._changed(schedule)
+        return schedule
+
+    async def cancel(self, schedule_id: str) -> Optional[Schedule]:
+        """Cancel anything not yet handed to the outbox."""
+        schedule = await asyncio.to_thread(
+            self.store.update, schedule_id, ("scheduled", "generating", "ready"), status="cancelled",
+        )
+        self._changed(schedule)
+        return schedule
+
+    async def stop(self):
+        """Stop the timer and any running generation (it restarts with the server)."""
+        tasks = [t for t in [self._task, *self._tasks] if t]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
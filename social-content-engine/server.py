@@ -9,31 +9,41 @@ Start: python server.py
   or:  uvicorn server:app --host 0.0.0.0 --port 8001
 """
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, Response, StreamingResponse
 from pydantic import BaseModel
 from typing import Optional, List, Dict
 import uvicorn
+import asyncio
 import httpx
 import os
 import base64
 import uuid
+import time
 from datetime import datetime
 
 from config import (
     SUPABASE_URL, SUPABASE_KEY,
     TWITTER_CONSUMER_KEY, TWITTER_CONSUMER_SECRET,
-    TWITTER_ACCESS_TOKEN, TWITTER_ACCESS_TOKEN_SECRET,
-    INSTAGRAM_USERNAME, INSTAGRAM_PASSWORD,
-    GEMINI_API_KEY, IMAGES_DIR,
+    TWITTER_ACCESS_TOKEN, TWITTER_ACCESS_TOKEN_SECRET, TWITTER_API_URL,
+    INSTAGRAM_USERNAME, INSTAGRAM_PASSWORD, INSTAGRAM_IMAGE_CACHE_DIR,
+    TWITTER_POSTS_PER_DAY, INSTAGRAM_POSTS_PER_DAY,
+    GEMINI_API_KEY, IMAGES_DIR, OUTBOX_PATH,
+    SCHEDULE_PATH, SCHEDULE_GENERATION_LEAD,
     ENGINE_PORT,
 )
+from blog_cache import BlogCache, etag_matches, LIST_OMIT_FIELDS
+from events import EventBus
 from generator import ContentGenerator
 from platforms.blog import BlogAdapter, LocalBlogStore
 from platforms.twitter import TwitterAdapter
 from platforms.instagram import InstagramAdapter
-from platforms.base import PlatformAdapter
+from platforms.base import PlatformAdapter, PostResult
+from outbox import Outbox, OutboxDispatcher, OutboxItem, STATUSES as OUTBOX_STATUSES
+from posting import PhotoPreupload, PostOutcome, run_with_timeouts
+from scheduler import Scheduler, ScheduleStore, STATUSES as SCHEDULE_STATUSES
+from posting_queue import TokenBucket
 
 app = FastAPI(title="Alexandra Content Engine", version="1.0.0")
 
@@ -48,11 +58,16 @@ app.add_middleware(
 generator = ContentGenerator()
 adapters: Dict[str, PlatformAdapter] = {}
 blog_store = None  # Will be BlogAdapter or LocalBlogStore
+blog_cache: Optional[BlogCache] = None
+events = EventBus()
+outbox: Optional[Outbox] = None
+dispatcher: Optional[OutboxDispatcher] = None
+scheduler: Optional[Scheduler] = None
 
 
 @app.on_event("startup")
 async def startup():
-    global blog_store
+    global blog_store, blog_cache, outbox, dispatcher, scheduler
     """Initialize platform adapters on startup."""
     if SUPABASE_URL and SUPABASE_KEY:
         blog_adapter = BlogAdapter(SUPABASE_URL, SUPABASE_KEY)
@@ -65,18 +80,52 @@ async def startup():
         adapters["blog"] = local_store
         blog_store = local_store
         print("Blog: Using local JSON storage (Supabase not configured)")
+    blog_cache = BlogCache(blog_store)
 
     if TWITTER_CONSUMER_KEY and TWITTER_ACCESS_TOKEN:
         adapters["twitter"] = TwitterAdapter(
             TWITTER_CONSUMER_KEY, TWITTER_CONSUMER_SECRET,
             TWITTER_ACCESS_TOKEN, TWITTER_ACCESS_TOKEN_SECRET,
+            api_url=TWITTER_API_URL,
         )
     if INSTAGRAM_USERNAME and INSTAGRAM_PASSWORD:
-        adapters["instagram"] = InstagramAdapter(INSTAGRAM_USERNAME, INSTAGRAM_PASSWORD)
+        adapters["instagram"] = InstagramAdapter(
+            INSTAGRAM_USERNAME, INSTAGRAM_PASSWORD, image_cache_dir=INSTAGRAM_IMAGE_CACHE_DIR,
+        )
+
+    day = 24 * 3600
+    buckets = {
+        "twitter": TokenBucket(TWITTER_POSTS_PER_DAY, day, burst=3),
+        "instagram": TokenBucket(INSTAGRAM_POSTS_PER_DAY, day, burst=1),
+    }
+    # /queue, /outbox and /generate all post through the outbox: one budget per platform
+    outbox = Outbox(OUTBOX_PATH)
+    dispatcher = OutboxDispatcher(outbox, adapters, buckets, on_result=_outbox_done)
+    dispatcher.start()
+
+    scheduler = Scheduler(
+        ScheduleStore(SCHEDULE_PATH), generator.generate, outbox, dispatcher,
+        on_change=lambda schedule: events.publish("schedule.updated", schedule.to_dict()),
+    )
+    scheduler.start()
 
     print(f"Configured platforms: {list(adapters.keys()) or 'none'}")
 
 
+@app.on_event("shutdown")
+async def shutdown():
+    """Stop the background loops and close the platforms' HTTP clients."""
+    if scheduler:
+        await scheduler.stop()
+    if dispatcher:
+        await dispatcher.stop()
+    for name, adapter in adapters.items():
+        try:
+            await adapter.aclose()
+        except Exception as e:
+            print(f"{name}: error closing connections ({e})")
+
+
 # === Request/Response Models ===
 
 class GenerateRequest(BaseModel):
@@ -87,11 +136,13 @@ class GenerateRequest(BaseModel):
     image_description: Optional[str] = None
     auto_post: bool = False
     image_path: Optional[str] = None  # For Instagram posting
+    idempotency_key: Optional[str] = None  # Reusing a key never posts twice
     is_wanderlink: bool = False  # Force WanderLink context injection
 
 class GenerateResponse(BaseModel):
     content: Dict[str, str] = {}
-    posted: Dict[str, dict] = {}
+    posted: Dict[str, dict] = {}  # platform -> PostOutcome.to_dict()
+    job_id: Optional[str] = None  # Matches job.progress events on /api/events
 
 class PostRequest(BaseModel):
     content: str
@@ -99,6 +150,22 @@ class PostRequest(BaseModel):
     image_path: Optional[str] = None
     image_url: Optional[str] = None
     tags: Optional[List[str]] = None
+    idempotency_key: Optional[str] = None  # For /outbox; defaults to a hash of the post
+
+class ScheduleRequest(BaseModel):
+    publish_at: datetime  # ISO 8601; without an offset it's server local time
+    platform: str = "all"  # blog, twitter, instagram, all (one schedule per platform)
+    topic: Optional[str] = None  # generate at publish_at - lead_seconds...
+    content: Optional[str] = None  # ...or post this pre-written content
+    tone: str = "casual"
+    word_count: int = 500
+    image_description: Optional[str] = None
+    is_wanderlink: bool = False
+    image_path: Optional[str] = None
+    image_url: Optional[str] = None
+    title: Optional[str] = None
+    tags: Optional[List[str]] = None
+    lead_seconds: Optional[float] = None  # default SCHEDULE_GENERATION_LEAD
 
 
 # === Endpoints ===
@@ -110,9 +177,16 @@ async def generate_content(req: GenerateRequest):
         ["blog", "twitter", "instagram"] if req.platform == "all"
         else [req.platform]
     )
+    job_id = uuid.uuid4().hex
+
+    # Log in and upload the photo while the caption is being written
+    preupload = None
+    if req.auto_post and "instagram" in platforms and "instagram" in adapters and req.image_path:
+        preupload = PhotoPreupload(adapters["instagram"], req.image_path)
 
     content = {}
     for platform in platforms:
+        events.publish("job.progress", {"job_id": job_id, "platform": platform, "stage": "generating"})
         try:
             content[platform] = await generator.generate(
                 topic=req.topic,
@@ -122,39 +196,75 @@ async def generate_content(req: GenerateRequest):
                 image_description=req.image_description,
                 is_wanderlink=req.is_wanderlink,
             )
+            events.publish("job.progress", {"job_id": job_id, "platform": platform, "stage": "generated"})
         except Exception as e:
             content[platform] = f"[ERROR: {e}]"
+            events.publish("job.progress", {"job_id": job_id, "platform": platform,
+                                            "stage": "failed", "error": str(e)})
 
     posted = {}
     if req.auto_post:
+        # Into the outbox first: whatever happens to the post, the content is kept
+        sending = {}
+        saved = {}
+
+        async def send_after_upload(item: OutboxItem, upload: PhotoPreupload) -> PostOutcome:
+            # Waits for the photo under Instagram's timeout, alongside the other platforms
+            upload_id, saved[item.platform] = await upload.result()
+            if upload_id:
+                item.kwargs = {**item.kwargs, "upload_id": upload_id}
+            return await dispatcher.send(item)
+
         for platform, text in content.items():
+            if text.startswith("[ERROR:"):
+                posted[platform] = PostOutcome.skipped(platform, "generation failed").to_dict()
+                continue
             if platform not in adapters:
-                posted[platform] = {"success": False, "error": "not configured"}
+                posted[platform] = PostOutcome.skipped(platform, "not configured").to_dict()
                 continue
-
             kwargs = {}
             if platform == "instagram":
                 if not req.image_path:
-                    posted[platform] = {"success": False, "error": "no image provided"}
+                    posted[platform] = PostOutcome.skipped(platform, "no image provided").to_dict()
                     continue
                 kwargs["image_path"] = req.image_path
             if platform == "blog":
                 kwargs["publish"] = True
 
-            result = await adapters[platform].post(text, **kwargs)
-            posted[platform] = {
-                "success": result.success,
-                "post_id": result.post_id,
-                "url": result.url,
-                "error": result.error,
-            }
-
-    return GenerateResponse(content=content, posted=posted)
-
-
-@app.post("/post/{platform}")
-async def post_content(platform: str, req: PostRequest):
-    """Post pre-written content to a specific platform."""
+            key = f"{req.idempotency_key}:{platform}" if req.idempotency_key else None
+            item, created = await asyncio.to_thread(
+                outbox.enqueue, platform, text, kwargs, key=key, job_id=job_id, claim=True,
+            )
+            if created and platform == "instagram" and preupload:
+                sending[platform] = (item, send_after_upload(item, preupload))
+                preupload = None
+            elif created:
+                sending[platform] = (item, dispatcher.send(item))
+            else:
+                posted[platform] = {**_outbox_outcome(item).to_dict(), "outbox_id": item.id}
+
+        outcomes = await run_with_timeouts({p: send for p, (_, send) in sending.items()})
+        for platform, outcome in outcomes.items():
+            posted[platform] = {**outcome.to_dict(), "outbox_id": sending[platform][0].id}
+        for platform, seconds in saved.items():
+            print(f"[{job_id[:8]}] {platform}: upload overlapped with generation, saved {seconds:.1f}s")
+            events.publish("job.progress", {"job_id": job_id, "platform": platform,
+                                            "stage": "upload_overlap", "saved": seconds})
+            if platform in posted:
+                posted[platform]["upload_overlap_saved"] = seconds
+
+    if preupload:  # Instagram's caption failed, or it was skipped
+        preupload.cancel()
+
+    # Platforms still posting (or retrying) report on the feed later
+    pending = [platform for platform, outcome in posted.items()
+               if outcome["status"] in ("pending", "retrying")]
+    events.publish("job.progress", {"job_id": job_id, "stage": "done", "pending": pending})
+    return GenerateResponse(content=content, posted=posted, job_id=job_id)
+
+
+def _post_kwargs(platform: str, req: PostRequest) -> dict:
+    """Validate a PostRequest for a platform and build the adapter kwargs."""
     if platform not in adapters:
         raise HTTPException(404, f"Platform '{platform}' not configured")
 
@@ -169,8 +279,16 @@ async def post_content(platform: str, req: PostRequest):
         kwargs["publish"] = True
         if req.image_url:
             kwargs["image_url"] = req.image_url
+    return kwargs
+
 
+@app.post("/post/{platform}")
+async def post_content(platform: str, req: PostRequest):
+    """Post pre-written content to a specific platform."""
+    kwargs = _post_kwargs(platform, req)
     result = await adapters[platform].post(req.content, **kwargs)
+    if platform == "blog" and result.success:
+        await _blog_published(result)
     return {
         "success": result.success,
         "platform": platform,
@@ -180,26 +298,244 @@ async def post_content(platform: str, req: PostRequest):
     }
 
 
+@app.post("/post/{platform}/batch")
+async def post_batch(platform: str, reqs: List[PostRequest]):
+    """Post many items in one call (one bulk write where the platform supports it)."""
+    if platform not in adapters:
+        raise HTTPException(404, f"Platform '{platform}' not configured")
+    items = [{"content": req.content, **_post_kwargs(platform, req)} for req in reqs]
+    results = await adapters[platform].post_many(items)
+    if platform == "blog" and any(r.success for r in results):
+        blog_cache.invalidate()
+        # One read for the whole batch rather than one per post
+        published = {post["slug"]: post for post in await blog_store.get_posts()}
+        for r in results:
+            post = published.get((r.url or "").rsplit("/", 1)[-1]) if r.success else None
+            if post:
+                events.publish("blog.published", {
+                    k: v for k, v in post.items() if k not in LIST_OMIT_FIELDS
+                })
+    return [
+        {"success": r.success, "platform": platform, "post_id": r.post_id, "url": r.url, "error": r.error}
+        for r in results
+    ]
+
+
+# === Rate-Limited Posting Queue ===
+
+def _queue_view(items: List[OutboxItem]) -> List[dict]:
+    """Outbox items with a predicted posting time (eta, unix time) for pending ones."""
+    now = time.time()
+    positions: Dict[str, int] = {}
+    view = []
+    for item in sorted(items, key=lambda i: i.next_attempt_at):
+        eta = None
+        if item.status == "sending":
+            eta = now
+        elif item.status == "pending":
+            positions[item.platform] = positions.get(item.platform, 0) + 1
+            bucket = dispatcher.buckets.get(item.platform)
+            delay = bucket.delay(positions[item.platform]) if bucket else 0.0
+            eta = max(item.next_attempt_at, now + delay)
+        view.append({**item.to_dict(), "eta": eta})
+    return view
+
+
+@app.post("/queue/{platform}")
+async def queue_post(platform: str, req: PostRequest):
+    """Queue a post to go out when the platform's rate limit allows.
+
+    Use this for batch posting: nothing fails for being over the limit,
+    and the response includes the predicted posting time (eta, unix time).
+    Queued posts live in the durable outbox, so they survive a restart.
+    """
+    kwargs = _post_kwargs(platform, req)
+    item, created = await asyncio.to_thread(
+        outbox.enqueue, platform, req.content, kwargs, key=req.idempotency_key,
+    )
+    if created:
+        dispatcher.wake()
+    queued = {i.id: i for i in await asyncio.to_thread(outbox.list, "pending", 1000)}
+    queued[item.id] = item
+    view = {entry["id"]: entry for entry in _queue_view(list(queued.values()))}
+    return {**view[item.id], "created": created}
+
+
+@app.get("/queue")
+async def list_queue():
+    """Queued outbox posts with predicted posting times, then recently finished ones."""
+    queued = []
+    for status in ("sending", "pending"):
+        queued += await asyncio.to_thread(outbox.list, status, 1000)
+    finished = [item for item in await asyncio.to_thread(outbox.list, None, 100)
+                if item.status in ("sent", "dead")]
+    return _queue_view(queued) + [{**item.to_dict(), "eta": None} for item in finished]
+
+
+# === Durable Outbox ===
+
+def _outbox_outcome(item: OutboxItem) -> PostOutcome:
+    """Outcome for an item that was already in the outbox (idempotent replay)."""
+    status = {"sent": "posted", "dead": "failed", "pending": "retrying"}.get(item.status, "pending")
+    result = item.result or {}
+    return PostOutcome(platform=item.platform, status=status, post_id=result.get("post_id"),
+                       url=result.get("url"), error=item.last_error)
+
+
+async def _outbox_done(item: OutboxItem, outcome: PostOutcome, result: PostResult):
+    if item.platform == "blog" and result.success:
+        await _blog_published(result)
+    stage = "posted" if result.success else "retrying" if item.status == "pending" else "post_failed"
+    events.publish("outbox.updated", {"id": item.id, "platform": item.platform, "status": item.status,
+                                      "attempts": item.attempts, "error": item.last_error})
+    if item.job_id:
+        events.publish("job.progress", {"job_id": item.job_id, "platform": item.platform,
+                                        "stage": stage, "url": result.url, "error": result.error,
+                                        "elapsed": outcome.elapsed, "outbox_id": item.id})
+
+
+@app.post("/outbox/{platform}")
+async def outbox_post(platform: str, req: PostRequest):
+    """Durably queue a post; retried with backoff until it lands or is dead-lettered."""
+    kwargs = _post_kwargs(platform, req)
+    item, created = await asyncio.to_thread(
+        outbox.enqueue, platform, req.content, kwargs, key=req.idempotency_key,
+    )
+    if created:
+        dispatcher.wake()
+    return {**item.to_dict(), "created": created}
+
+
+@app.get("/outbox")
+async def list_outbox(status: Optional[str] = None, limit: int = 100):
+    """Outbox items, newest first. status=dead lists the dead-letter queue."""
+    if status and status not in OUTBOX_STATUSES:
+        raise HTTPException(400, f"status must be one of {', '.join(OUTBOX_STATUSES)}")
+    items = await asyncio.to_thread(outbox.list, status, limit)
+    return [item.to_dict() for item in items]
+
+
+@app.get("/outbox/{item_id}")
+async def get_outbox_item(item_id: str):
+    item = await asyncio.to_thread(outbox.get, item_id)
+    if not item:
+        raise HTTPException(404, "Outbox item not found")
+    return item.to_dict()
+
+
+@app.post("/outbox/{item_id}/replay")
+async def replay_outbox_item(item_id: str):
+    """Send a dead-lettered item again (check the platform first if it was interrupted)."""
+    item = await asyncio.to_thread(outbox.replay, item_id)
+    if not item:
+        raise HTTPException(404, "No dead-lettered outbox item with that id")
+    dispatcher.wake()
+    return item.to_dict()
+
+
+# === Scheduled Publishing ===
+
+@app.post("/schedules")
+async def create_schedule(req: ScheduleRequest):
+    """Schedule a post (or one per platform for "all")."""
+    if bool(req.topic) == bool(req.content):
+        raise HTTPException(400, "Give exactly one of topic (generate) or content (pre-written)")
+    publish_at = req.publish_at.timestamp()
+    if publish_at < time.time() - 60:
+        raise HTTPException(400, "publish_at is in the past")
+
+    post_req = PostRequest(content=req.content or "", title=req.title, image_path=req.image_path,
+                           image_url=req.image_url, tags=req.tags)
+    if req.platform == "all":
+        # As in /generate: skip what can't take this post rather than refusing it
+        platforms = [platform for platform in ("blog", "twitter", "instagram")
+                     if platform in adapters and (platform != "instagram" or req.image_path)]
+        if not platforms:
+            raise HTTPException(400, "No configured platform can take this post")
+    else:
+        platforms = [req.platform]
+    kwargs = {platform: _post_kwargs(platform, post_req) for platform in platforms}
+
+    created = []
+    for platform in platforms:
+        if req.topic:
+            params = {"topic": req.topic, "tone": req.tone, "word_count": req.word_count,
+                      "image_description": req.image_description, "is_wanderlink": req.is_wanderlink}
+            lead = SCHEDULE_GENERATION_LEAD if req.lead_seconds is None else req.lead_seconds
+            schedule = await scheduler.add("generate", platform, publish_at, lead=lead,
+                                           params=params, kwargs=kwargs[platform])
+        else:
+            schedule = await scheduler.add("post", platform, publish_at,
+                                           kwargs=kwargs[platform], content=req.content)
+        created.append(schedule.to_dict())
+    return created
+
+
+@app.get("/schedules")
+async def list_schedules(status: Optional[str] = None, limit: int = 200):
+    """Scheduled posts in publish order."""
+    if status and status not in SCHEDULE_STATUSES:
+        raise HTTPException(400, f"status must be one of {', '.join(SCHEDULE_STATUSES)}")
+    schedules = await asyncio.to_thread(scheduler.store.list, status, limit)
+    return [schedule.to_dict() for schedule in schedules]
+
+
+@app.get("/schedules/{schedule_id}")
+async def get_schedule(schedule_id: str):
+    schedule = await asyncio.to_thread(scheduler.store.get, schedule_id)
+    if not schedule:
+        raise HTTPException(404, "Schedule not found")
+    return schedule.to_dict()
+
+
+@app.delete("/schedules/{schedule_id}")
+async def cancel_schedule(schedule_id: str):
+    """Cancel a schedule that hasn't been handed to the outbox yet."""
+    schedule = await scheduler.cancel(schedule_id)
+    if not schedule:
+        raise HTTPException(404, "No cancellable schedule with that id")
+    return schedule.to_dict()
+
+
 # === Blog Read/Delete Endpoints ===
 
+async def _blog_published(result):
+    """Invalidate cached reads and announce a new post on the change feed."""
+    blog_cache.invalidate()
+    slug = (result.url or "").rsplit("/", 1)[-1]
+    post = await blog_store.get_post_by_slug(slug) if slug else None
+    if post:  # drafts aren't visible to readers, so there is nothing to announce
+        events.publish("blog.published", {
+            k: v for k, v in post.items() if k not in LIST_OMIT_FIELDS
+        })
+
+
+def _cached_json(request: Request, body: bytes, etag: str) -> Response:
+    """Serve pre-serialized JSON with a strong ETag, or 304 if the client has it."""
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
 @app.get("/api/blog/posts")
-async def get_blog_posts():
+async def get_blog_posts(request: Request):
     """Get all published blog posts."""
     if not blog_store:
         return []
-    posts = await blog_store.get_posts()
-    return posts
+    etag, body = await blog_cache.get_posts()
+    return _cached_json(request, body, etag)
 
 
 @app.get("/api/blog/posts/{slug}")
-async def get_blog_post(slug: str):
+async def get_blog_post(slug: str, request: Request):
     """Get a single blog post by slug."""
     if not blog_store:
         raise HTTPException(404, "Blog not configured")
-    post = await blog_store.get_post_by_slug(slug)
-    if not post:
+    etag, body = await blog_cache.get_post(slug)
+    if body is None:
         raise HTTPException(404, "Post not found")
-    return post
+    return _cached_json(request, body, etag)
 
 
 @app.delete("/api/blog/posts/{post_id}")
@@ -208,11 +544,33 @@ async def delete_blog_post(post_id: str):
     if not blog_store:
         raise HTTPException(404, "Blog not configured")
     success = await blog_store.delete_post(post_id)
+    if success:
+        blog_cache.invalidate()
+        events.publish("blog.deleted", {"id": post_id})
     if not success:
         raise HTTPException(404, "Post not found")
     return {"success": True, "deleted": post_id}
 
 
+# === Change Feed ===
+
+@app.get("/api/events")
+async def event_stream(request: Request, last_event_id: Optional[str] = None):
+    """Server-sent events: blog.published, blog.deleted, job.progress, image.ready.
+
+    Reconnecting clients resume via the Last-Event-ID header (sent by
+    EventSource automatically) or the last_event_id query parameter.
+    """
+    header = request.headers.get("last-event-id")
+    if header:
+        last_event_id = header
+    return StreamingResponse(
+        events.stream(last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @app.get("/platforms")
 async def list_platforms():
     """List configured platforms and their status."""
@@ -378,11 +736,13 @@ async def generate_image(req: ImageGenerateRequest):
                     img_data = base64.b64decode(part["inlineData"]["data"])
                     with open(filepath, "wb") as f:
                         f.write(img_data)
-                    return {
+                    image = {
                         "image_path": filepath,
                         "image_url": f"/images/{filename}",
                         "filename": filename,
                     }
+                    events.publish("image.ready", image)
+                    return image
 
         raise HTTPException(500, "No image returned from Gemini")
     except httpx.TimeoutException:
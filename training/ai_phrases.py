@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+Detector for AI-sounding phrases, shared by data prep and content scoring.
+
+Checking every text against each of the AI_PHRASES regexes in turn is
+slow, and folding them into one alternation regex is slower still: Python's
+re loses its per-pattern prefix scan. Instead each pattern gets a literal
+prefilter worked out from its parse tree: a set of lowercase strings of
+which at least one has to appear in any text the pattern matches. A text
+is lowercased once, and only patterns whose prefilter hits are run as
+regexes, in list order, so the decisions are exactly those of the plain
+loop, ^ anchors included. Texts with non-ASCII characters skip the
+prefilter (case-insensitive matching has non-ASCII equivalents like
+'ſ' ~ 's' that str.lower() doesn't apply), as do patterns with no usable
+literal.
+
+    detector = AIPhraseDetector()
+    detector.search(text)    # first matching phrase in list order, or None
+    detector.matches(text)   # every matching phrase (filter analytics, scoring)
+
+Run: python ai_phrases.py check [-n 200000]   # randomized equivalence test
+     python ai_phrases.py bench [-n 50000]    # prefilter vs pattern loop
+     python ai_phrases.py score < post.txt    # phrases found in generated text
+"""
+
+import argparse
+import json
+import random
+import re
+import sys
+import time
+
+try:  # the parser moved in Python 3.11
+    from re import _parser as sre_parse, _constants as sre_constants
+except ImportError:
+    import sre_parse
+    import sre_constants
+
+# Phrases that make text sound AI-generated
+AI_PHRASES = [
+    r"(?i)as an ai\b",
+    r"(?i)as a language model\b",
+    r"(?i)i don'?t have (personal )?(feelings|emotions|experiences)\b",
+    r"(?i)i'?m (just )?an? (ai|artificial|language model|chatbot)\b",
+    r"(?i)certainly!",
+    r"(?i)^of course!",
+    r"(?i)^great question!",
+    r"(?i)^that'?s a great question",
+    r"(?i)^absolutely!",
+    r"(?i)^i'?d be happy to help",
+    r"(?i)in today'?s (fast[- ]paced|digital|modern) world",
+    r"(?i)let'?s dive (in|into)",
+    r"(?i)(?:it'?s )?important to note that",
+    r"(?i)it'?s worth (noting|mentioning)",
+    r"(?i)I hope (this|that) helps",
+    r"(?i)feel free to ask",
+    r"(?i)don'?t hesitate to",
+    r"(?i)I cannot and will not",
+    r"(?i)as a helpful assistant",
+]
+
+# Cap on alternatives a prefilter may expand to, e.g. "in (a|b) (c|d)" is 4
+MAX_ALTERNATIVES = 32
+
+
+def _literal_alternatives(items):
+    """Finite set of strings `items` can match, or None if it isn't that simple."""
+    strings = {""}
+    for op, av in items:
+        if op is sre_constants.LITERAL:
+            strings = {s + chr(av) for s in strings}
+        elif op is sre_constants.SUBPATTERN:
+            if av[1] or av[2]:  # scoped flags like (?i:...) change how literals compare
+                return None
+            inner = _literal_alternatives(av[-1])
+            if inner is None:
+                return None
+            strings = {s + t for s in strings for t in inner}
+        elif op is sre_constants.BRANCH:
+            options = set()
+            for branch in av[1]:
+                inner = _literal_alternatives(branch)
+                if inner is None:
+                    return None
+                options |= inner
+            strings = {s + t for s in strings for t in options}
+        elif op is sre_constants.IN and all(o is sre_constants.LITERAL for o, _ in av):
+            strings = {s + chr(c) for s in strings for _, c in av}  # e.g. [- ]
+        else:
+            return None
+        if len(strings) > MAX_ALTERNATIVES:
+            return None
+    return strings
+
+
+def required_literals(pattern):
+    """Strings of which one must occur in any match of `pattern`, or None.
+
+    Walks the top-level sequence, growing runs of literals (expanding small
+    fixed alternations) and cutting them at anything optional or variable.
+    The run whose shortest alternative is longest wins. Lowercased for
+    case-insensitive patterns; None when the best run is empty or (for
+    case-insensitive patterns) not plain ASCII.
+    """
+    parsed = sre_parse.parse(pattern)
+    ignorecase = bool(parsed.state.flags & re.IGNORECASE)
+    best, run = None, {""}
+
+    def close(run):
+        nonlocal best
+        if min(map(len, run)) > (min(map(len, best)) if best else 0):
+            best = run
+
+    for item in parsed:
+        fixed = _literal_alternatives([item])
+        if fixed is not None and len(run) * len(fixed) <= MAX_ALTERNATIVES:
+            run = {s + t for s in run for t in fixed}
+            continue
+        close(run)
+        run = fixed if fixed is not None else {""}
+    close(run)
+
+    if not best:
+        return None
+    if ignorecase:
+        if not all(s.isascii() for s in best):
+            return None
+        best = {s.lower() for s in best}
+    return frozenset(best), ignorecase
+
+
+class AIPhraseDetector:
+    """All of AI_PHRASES (or any regex list) behind one literal prefilter."""
+
+    def __init__(self, phrases=AI_PHRASES):
+        self.phrases = list(phrases)
+        self.patterns = [re.compile(p) for p in self.phrases]
+        self.prefilters = [required_literals(p) for p in self.phrases]
+
+    def _candidates(self, text):
+        """Indexes of patterns that could match `text`, in list order."""
+        lowered = text.lower() if text.isascii() else None
+        for i, prefilter in enumerate(self.prefilters):
+            if prefilter is None:
+                yield i
+                continue
+            literals, ignorecase = prefilter
+            if ignorecase:
+                if lowered is None:
+                    yield i
+                    continue
+                haystack = lowered
+            else:
+                haystack = text
+            if any(literal in haystack for literal in literals):
+                yield i
+
+    def search(self, text):
+        """The first phrase (in list order) that matches `text`, or None."""
+        for i in self._candidates(text):
+            if self.patterns[i].search(text):
+                return self.phrases[i]
+        return None
+
+    def matches(self, text):
+        """Every phrase that matches `text`."""
+        return [self.phrases[i] for i in self._candidates(text) if self.patterns[i].search(text)]
+
+    def __call__(self, text):
+        return self.search(text) is not None
+
+
+def _reference(patterns, text):
+    """The plain loop the detector must agree with."""
+    for i, pattern in enumerate(patterns):
+        if pattern.search(text):
+            return i
+    return None
+
+
+# -- self-check and benchmark -------------------------------------------------
+
+_FILLER = (
+    "hey there I think that is really a good point folks coffee ridgway army truck "
+    "dog honestly fun the and it you was for as an a said again maybe"
+).split()
+
+# Characters that case-fold onto ASCII in re (or lowercase oddly) plus some noise
+_TRICKY = ["ſ", "ı", "İ", "K", "ﬅ", "é", "\n", "  ", "’", "'", "!", "-", "😀"]
+
+
+def _fragments(phrases):
+    """Strings that sit near the phrases: whole matches and broken-up ones."""
+    samples = [
+        "as an ai", "as an aid", "as a language model", "i dont have feelings",
+        "I don't have personal emotions", "im an ai", "I'm just a chatbot", "i'm an artificial",
+        "certainly!", "certainly", "of course!", "great question!", "thats a great question",
+        "that's a great questions", "absolutely!", "id be happy to help", "i'd be happy to",
+        "in todays fast-paced world", "in today's fast paced world", "in today's digital world",
+        "lets dive in", "let's dive into", "let's dive", "its important to note that",
+        "important to note", "it's worth noting", "its worth mentioning", "i hope this helps",
+        "I hope that helps", "feel free to ask", "dont hesitate to", "don't hesitate",
+        "I cannot and will not", "as a helpful assistant", "as a helpful",
+    ]
+    return samples + [p.replace("(?i)", "").replace("^", "") for p in phrases]
+
+
+def random_text(rng, fragments):
+    parts = []
+    for _ in range(rng.randint(0, 12)):
+        roll = rng.random()
+        if roll < 0.55:
+            parts.append(rng.choice(_FILLER))
+        elif roll < 0.85:
+            frag = rng.choice(fragments)
+            if rng.random() < 0.3 and frag:  # cut it short
+                frag = frag[: rng.randint(1, len(frag))]
+            parts.append(frag)
+        else:
+            parts.append(rng.choice(_TRICKY))
+    text = " ".join(parts)
+    if rng.random() < 0.5:
+        text = "".join(c.upper() if rng.random() < 0.3 else c for c in text)
+    if rng.random() < 0.2:
+        text = "".join(rng.choice(_TRICKY) if rng.random() < 0.05 else c for c in text)
+    return text
+
+
+def check(n, seed=0):
+    """Randomized equivalence test against the per-pattern loop. Returns failures."""
+    detector = AIPhraseDetector()
+    rng = random.Random(seed)
+    fragments = _fragments(AI_PHRASES)
+    failures = 0
+    hits = 0
+    for _ in range(n):
+        text = random_text(rng, fragments)
+        expected = _reference(detector.patterns, text)
+        got = detector.search(text)
+        want = None if expected is None else AI_PHRASES[expected]
+        all_want = [p for p, c in zip(AI_PHRASES, detector.patterns) if c.search(text)]
+        if got != want or detector.matches(text) != all_want:
+            failures += 1
+            if failures <= 5:
+                print(f"  MISMATCH {text!r}: expected {want!r}, got {got!r}")
+        hits += want is not None
+    print(f"{n:,} random texts, {hits:,} flagged, {failures} mismatches")
+    for phrase, prefilter in zip(AI_PHRASES, detector.prefilters):
+        literals = sorted(prefilter[0]) if prefilter else "(always run)"
+        print(f"  {phrase:<62} {literals}")
+    return failures
+
+
+def bench(n, seed=0):
+    detector = AIPhraseDetector()
+    rng = random.Random(seed)
+    # Mostly clean, conversational text with the occasional phrase, like the corpus
+    texts = [" ".join(rng.choice(_FILLER) for _ in range(rng.randint(20, 150))) for _ in range(n)]
+    for i in rng.sample(range(n), n // 20):
+        texts[i] = rng.choice(_fragments(AI_PHRASES)) + " " + texts[i]
+    chars = sum(map(len, texts))
+
+    start = time.perf_counter()
+    reference = [_reference(detector.patterns, t) is not None for t in texts]
+    loop = time.perf_counter() - start
+
+    start = time.perf_counter()
+    got = [detector(t) for t in texts]
+    fast = time.perf_counter() - start
+
+    assert got == reference
+    print(f"{n:,} texts, {chars / 1e6:.1f}M chars, {sum(got):,} flagged")
+    print(f"  pattern loop:   {loop:.2f}s  ({n / loop:,.0f} texts/s)")
+    print(f"  AIPhraseDetector: {fast:.2f}s  ({n / fast:,.0f} texts/s, {loop / fast:.1f}x)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AI-phrase detector")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("check", help="Randomized equivalence test")
+    p.add_argument("-n", type=int, default=200_000)
+    p.add_argument("--seed", type=int, default=0)
+    p = sub.add_parser("bench", help="Benchmark against the pattern loop")
+    p.add_argument("-n", type=int, default=50_000)
+    sub.add_parser("score", help="Report AI phrases in text read from stdin")
+    args = parser.parse_args()
+
+    if args.command == "check":
+        sys.exit(1 if check(args.n, args.seed) else 0)
+    elif args.command == "bench":
+        bench(args.n)
+    else:
+        found = AIPhraseDetector().matches(sys.stdin.read())
+        print(json.dumps({"ai_phrases": found, "count": len(found)}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
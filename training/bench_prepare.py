@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Benchmark prepare_gptoss_data.py --workers on a synthetic corpus.
+
+  python bench_prepare.py                      # 1M cleaned examples, 1/2/4/8 workers
+  python bench_prepare.py -n 200000 --workers 1 4
+
+Writes the corpus to a temp directory, runs the prep step once per worker
+count, and prints wall time, speedup and whether the output matched the
+single-process run byte for byte.
+"""
+
+import argparse
+import contextlib
+import filecmp
+import io
+import json
+import os
+import random
+import tempfile
+import time
+
+import prepare_gptoss_data as prep
+
+WORDS = (
+    "hey there I think that is really a good point folks coffee ridgway army "
+    "truck dog honestly weird fun lol LOL certainly! as an AI it's worth noting "
+    "café 😀 let's dive into the details"
+).split(" ")
+
+
+def _text(rng, low, high):
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(low, high)))
+
+
+def _example(rng):
+    return {"instruction": _text(rng, 0, 8), "input": _text(rng, 0, 12), "output": _text(rng, 1, 60)}
+
+
+def make_corpus(data_dir, n, seed=0):
+    """Cleaned set of n examples plus personal/texts sets in roughly the real proportions."""
+    rng = random.Random(seed)
+    sizes = {
+        prep.CLEANED_DATA: n,
+        prep.PERSONAL_DATA: max(1, n // 500),
+        prep.PERSONAL_EXPANDED: max(1, n // 250),
+        prep.TEXT_MESSAGES: max(1, n // 25),
+    }
+    paths = {}
+    for name, count in sizes.items():
+        path = os.path.join(data_dir, os.path.basename(name))
+        with open(path, "w") as f:
+            f.write("[")
+            for i in range(count):
+                f.write(", " if i else "")
+                f.write(json.dumps(_example(rng), ensure_ascii=False))
+            f.write("]")
+        paths[name] = path
+    prep.CLEANED_DATA = paths[prep.CLEANED_DATA]
+    prep.PERSONAL_DATA = paths[prep.PERSONAL_DATA]
+    prep.PERSONAL_EXPANDED = paths[prep.PERSONAL_EXPANDED]
+    prep.TEXT_MESSAGES = paths[prep.TEXT_MESSAGES]
+
+
+def run(workers, output):
+    args = argparse.Namespace(jsonl=False, materialize=False, workers=workers, output=output,
+                              dedup=False, dedup_threshold=0.8,
+                              no_cache=True, force=False, cache_dir=None,
+                              report=False, report_tokenizer=None)  # time the processing itself
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        prep.main(args)
+    return time.perf_counter() - start
+
+
+def main(args):
+    print(f"CPUs available: {os.cpu_count()}")
+    with tempfile.TemporaryDirectory() as data_dir:
+        print(f"Writing {args.n:,}-example corpus...")
+        make_corpus(data_dir, args.n)
+
+        baseline = None
+        reference = None
+        for workers in args.workers:
+            output = os.path.join(data_dir, f"out_{workers}.json")
+            elapsed = run(workers, output)
+            if baseline is None:
+                baseline, reference = elapsed, output
+            same = filecmp.cmp(reference, output, shallow=False)
+            print(f"  workers={workers:<3} {elapsed:>7.1f}s  {baseline / elapsed:>5.2f}x  "
+                  f"{'identical' if same else 'DIFFERENT'} output")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", type=int, default=1_000_000, help="Cleaned examples in the corpus")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8],
+                        help="Worker counts to time (the first is the baseline)")
+    main(parser.parse_args())
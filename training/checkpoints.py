@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+Checkpoint discovery, validation and merge bookkeeping for the fine-tuning run.
+
+train_gptoss_alexandra.py resumes from the newest checkpoint-N in
+OUTPUT_DIR that passes validate_checkpoint():
+
+  - trainer_state.json parses and its global_step is N
+  - the adapter (adapter_config.json plus adapter_model.safetensors or
+    .bin) is there; a safetensors header must parse and the file must be
+    as long as the header says
+  - optimizer.pt, scheduler.pt and rng_state*.pth are complete torch zip
+    archives (a write cut short has no central directory)
+
+Broken checkpoints are renamed to invalid-checkpoint-N, out of the way of
+the Trainer's own checkpoint rotation, and the next newest is tried.
+
+Data order needs no extra state: the samplers derive each epoch's order
+from (seed, epoch), and the Trainer restores the epoch and skips the
+batches already seen. What can break it is training on different data or
+batching, so every checkpoint also gets a data_order.json (seed, batching,
+dataset fingerprint); resuming with a different one is refused.
+
+After training the final adapter's hash is recorded in the merged model
+directory (merge_info.json), so rerunning skips a merge that has already
+been done for the same adapter.
+
+Run: python checkpoints.py [OUTPUT_DIR]   # list checkpoints and whether they'd resume
+"""
+
+import hashlib
+import json
+import os
+import re
+import struct
+import sys
+import time
+import zipfile
+
+OUTPUT_DIR = "/home/alexandratitus767/ai-clone-training/gptoss-alexandra-lora"  # as in train_gptoss_alexandra.py
+
+CHECKPOINT_RE = re.compile(r"^checkpoint-(\d+)$")
+INVALID_PREFIX = "invalid-"
+DATA_ORDER_FILE = "data_order.json"
+MERGE_INFO_FILE = "merge_info.json"
+HASH_CHUNK = 1 << 20
+
+
+def list_checkpoints(output_dir):
+    """(step, path) for each checkpoint-N directory, newest first."""
+    if not os.path.isdir(output_dir):
+        return []
+    found = []
+    for name in os.listdir(output_dir):
+        match = CHECKPOINT_RE.match(name)
+        path = os.path.join(output_dir, name)
+        if match and os.path.isdir(path):
+            found.append((int(match.group(1)), path))
+    return sorted(found, reverse=True)
+
+
+def _check_safetensors(path):
+    """Problem with a safetensors file's header or length, or None."""
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        raw = f.read(8)
+        if len(raw) < 8:
+            return f"{os.path.basename(path)} is truncated"
+        (header_len,) = struct.unpack("<Q", raw)
+        if header_len > size - 8:
+            return f"{os.path.basename(path)} is truncated (header)"
+        try:
+            header = json.loads(f.read(header_len))
+        except ValueError:
+            return f"{os.path.basename(path)} has a corrupt header"
+    ends = [t["data_offsets"][1] for name, t in header.items() if name != "__metadata__"]
+    if 8 + header_len + max(ends, default=0) > size:
+        return f"{os.path.basename(path)} is truncated (data)"
+    return None
+
+
+def _check_torch_file(path):
+    """Problem with a torch.save() file, or None (checks the zip directory only)."""
+    try:
+        with zipfile.ZipFile(path) as archive:
+            if not archive.namelist():
+                return f"{os.path.basename(path)} is empty"
+    except (zipfile.BadZipFile, OSError) as e:
+        return f"{os.path.basename(path)} is unreadable ({e})"
+    return None
+
+
+def validate_checkpoint(path, step=None):
+    """Reasons `path` can't be resumed from (empty if it can)."""
+    problems = []
+    files = set(os.listdir(path))
+
+    if "trainer_state.json" not in files:
+        problems.append("trainer_state.json missing")
+    else:
+        try:
+            with open(os.path.join(path, "trainer_state.json")) as f:
+                state = json.load(f)
+            if step is not None and state.get("global_step") != step:
+                problems.append(f"trainer_state.json is at step {state.get('global_step')}, not {step}")
+        except ValueError:
+            problems.append("trainer_state.json is corrupt")
+
+    if "adapter_config.json" not in files:
+        problems.append("adapter_config.json missing")
+    if "adapter_model.safetensors" in files:
+        problem = _check_safetensors(os.path.join(path, "adapter_model.safetensors"))
+        if problem:
+            problems.append(problem)
+    elif "adapter_model.bin" in files:
+        problem = _check_torch_file(os.path.join(path, "adapter_model.bin"))
+        if problem:
+            problems.append(problem)
+    else:
+        problems.append("adapter weights missing")
+
+    rng_files = [name for name in files if name.startswith("rng_state") and name.endswith(".pth")]
+    if not rng_files:
+        problems.append("rng_state.pth missing")
+    for name in ["optimizer.pt", "scheduler.pt"] + sorted(rng_files):
+        if name not in files:
+            problems.append(f"{name} missing")
+            continue
+        problem = _check_torch_file(os.path.join(path, name))
+        if problem:
+            problems.append(problem)
+    return problems
+
+
+def find_resume_checkpoint(output_dir, quarantine=True):
+    """Newest valid checkpoint in output_dir (or None), and [(path, problems)] skipped.
+
+    Invalid checkpoints newer than the one returned are renamed to
+    invalid-checkpoint-N unless quarantine is False.
+    """
+    skipped = []
+    for step, path in list_checkpoints(output_dir):
+        problems = validate_checkpoint(path, step)
+        if not problems:
+            return path, skipped
+        if quarantine:
+            moved = os.path.join(output_dir, INVALID_PREFIX + os.path.basename(path))
+            if os.path.exists(moved):  # broken at the same step in an earlier run too
+                moved += f".{int(time.time())}"
+            os.replace(path, moved)
+            path = moved
+        skipped.append((path, problems))
+    return None, skipped
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def write_data_order(checkpoint, data_order):
+    with open(os.path.join(checkpoint, DATA_ORDER_FILE), "w") as f:
+        json.dump(data_order, f, indent=2)
+
+
+def data_order_mismatch(checkpoint, data_order):
+    """Keys whose value differs from what `checkpoint` was trained with.
+
+    None if the checkpoint predates data_order.json (nothing to compare).
+    """
+    try:
+        with open(os.path.join(checkpoint, DATA_ORDER_FILE)) as f:
+            saved = json.load(f)
+    except FileNotFoundError:
+        return None
+    return [key for key in sorted(set(saved) | set(data_order)) if saved.get(key) != data_order.get(key)]
+
+
+def adapter_hash(adapter_dir):
+    """SHA-256 over the adapter's config and weights."""
+    digest = hashlib.sha256()
+    for name in ("adapter_config.json", "adapter_model.safetensors", "adapter_model.bin"):
+        path = os.path.join(adapter_dir, name)
+        if os.path.exists(path):
+            digest.update(name.encode("utf-8"))
+            digest.update(file_sha256(path).encode("ascii"))
+    return digest.hexdigest()
+
+
+def merged_is_current(merged_dir, adapter_sha):
+    """True if merged_dir holds a completed merge of the adapter with this hash."""
+    try:
+        with open(os.path.join(merged_dir, MERGE_INFO_FILE)) as f:
+            info = json.load(f)
+    except (OSError, ValueError):
+        return False
+    return info.get("adapter_sha256") == adapter_sha and os.path.exists(os.path.join(merged_dir, "config.json"))
+
+
+def clear_merge_info(merged_dir):
+    """Forget a recorded merge before overwriting it."""
+    try:
+        os.remove(os.path.join(merged_dir, MERGE_INFO_FILE))
+    except FileNotFoundError:
+        pass
+
+
+def write_merge_info(merged_dir, adapter_dir, adapter_sha, save_method):
+    """Record a finished merge; written last, so it only exists if the merge completed."""
+    info = {
+        "adapter": os.path.abspath(adapter_dir),
+        "adapter_sha256": adapter_sha,
+        "save_method": save_method,
+        "merged_at": time.time(),
+    }
+    with open(os.path.join(merged_dir, MERGE_INFO_FILE), "w") as f:
+        json.dump(info, f, indent=2)
+
+
+def main():
+    output_dir = sys.argv[1] if len(sys.argv) > 1 else OUTPUT_DIR
+    checkpoints = list_checkpoints(output_dir)
+    if not checkpoints:
+        print(f"No checkpoints in {output_dir}")
+        return
+    resume = None
+    for step, path in checkpoints:
+        problems = validate_checkpoint(path, step)
+        status = "ok" if not problems else "; ".join(problems)
+        if not problems and resume is None:
+            resume = path
+            status += " (would resume here)"
+        print(f"  {os.path.basename(path):<20}{status}")
+
+
+if __name__ == "__main__":
+    main()
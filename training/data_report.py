@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""
+Dataset profile for sizing a fine-tuning run before it starts.
+
+ReportCollector sits at the end of the prep pipeline and records one small
+row per example written (source, characters of the user and assistant
+turns, weight and, given a tokenizer, chat-templated token count) in flat
+arrays. build_report() turns those into the profile with NumPy: one
+lexsort and a few bincounts, so it takes seconds even for millions of
+examples:
+
+  - character and token length percentiles and power-of-two histograms
+    per source
+  - the effective mixture after oversampling
+  - AI-phrase filter hits and rates (from the prep stats)
+  - duplicate rates, when --dedup ran
+  - projected examples, tokens and optimizer steps per epoch and for the
+    run, plus the packing.py modes when token counts are known (planned
+    on a PLAN_SAMPLE-example sample of the epoch and scaled up; packing
+    ratios don't depend on corpus size once it's this large)
+
+The result is written as JSON and printed as a summary.
+
+Run: python data_report.py gptoss_alexandra_training.json [--tokenizer byte] [-o report.json]
+"""
+
+import argparse
+import json
+import math
+import os
+import time
+from array import array
+
+import numpy as np
+
+from ai_phrases import AI_PHRASES
+from dedup import example_text
+from pretokenize import MAX_SEQ_LENGTH
+
+# Same as train_gptoss_alexandra.py
+BATCH_SIZE = 1
+GRAD_ACCUM = 16
+NUM_EPOCHS = 2
+
+REPORT_BATCH = 1000  # examples per tokenizer call
+PERCENTILES = (50, 90, 99)
+PLAN_SAMPLE = 200_000  # epoch examples the packing projection plans over
+SPARK = " ▁▂▃▄▅▆▇█"
+
+
+class ReportCollector:
+    """Per-example lengths and weights, gathered as (source, example, repeat) triples stream past."""
+
+    def __init__(self, tokenizer=None):
+        self.tokenizer = tokenizer
+        self.source_names = []
+        self.source_ids = array("H")
+        self.chars = array("q")
+        self.tokens = array("q")
+        self.weights = array("d")
+        self.duplicates = None  # dedup.summarize() output, if dedup ran
+
+    def _record(self, batch):
+        if self.tokenizer is not None:
+            texts = [self.tokenizer.apply_chat_template(example["messages"], tokenize=False,
+                                                        add_generation_prompt=False)
+                     for _, example, _ in batch]
+            self.tokens.extend(map(len, self.tokenizer(texts, add_special_tokens=False)["input_ids"]))
+        for source, example, repeat in batch:
+            if source not in self.source_names:
+                self.source_names.append(source)
+            self.source_ids.append(self.source_names.index(source))
+            self.chars.append(len(example_text(example)))
+            self.weights.append(repeat)
+
+    def wrap(self, triples):
+        """Pass triples through unchanged, recording each one."""
+        batch = []
+        for triple in triples:
+            batch.append(triple)
+            if len(batch) == REPORT_BATCH:
+                self._record(batch)
+                yield from batch
+                batch = []
+        if batch:
+            self._record(batch)
+            yield from batch
+
+
+def _pow2_edges(values):
+    top = int(values.max()) if len(values) else 1
+    return [0] + [1 << k for k in range(4, max(4, math.ceil(math.log2(max(top, 1) + 1))) + 1)]
+
+
+def length_profile(values, source_ids, names):
+    """Percentiles and a shared power-of-two histogram per source, vectorized."""
+    edges = _pow2_edges(values)
+    nbins = len(edges)
+    bins = np.searchsorted(edges, values, side="right") - 1
+    counts = np.bincount(source_ids * nbins + bins, minlength=len(names) * nbins).reshape(len(names), nbins)
+    sums = np.bincount(source_ids, weights=values, minlength=len(names))
+
+    # Sort once by (source, value); each source is then a contiguous sorted run
+    ordered = values[np.lexsort((values, source_ids))]
+    sizes = np.bincount(source_ids, minlength=len(names))
+    starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+
+    profile = {}
+    for s, name in enumerate(names):
+        n = int(sizes[s])
+        run = ordered[starts[s]:starts[s] + n]
+        profile[name] = {
+            "mean": float(sums[s] / n) if n else 0.0,
+            **{f"p{q}": int(run[(q * (n - 1)) // 100]) if n else 0 for q in PERCENTILES},
+            "max": int(run[-1]) if n else 0,
+            "histogram": {"edges": edges, "counts": counts[s].tolist()},
+        }
+    return profile
+
+
+def phrase_hits(stats):
+    """Cleaned examples dropped by each AI phrase (first match), and the rate."""
+    seen = stats.get("cleaned_seen", 0)
+    hits = {phrase: stats.get(f"ai_phrase:{phrase}", 0) for phrase in AI_PHRASES}
+    return {
+        "screened": seen,
+        "filtered": stats.get("filtered_ai_phrases", 0),
+        "rate": stats.get("filtered_ai_phrases", 0) / seen if seen else 0.0,
+        "phrases": {p: {"count": c, "rate": c / seen if seen else 0.0}
+                    for p, c in sorted(hits.items(), key=lambda kv: -kv[1])},
+    }
+
+
+def build_report(collector, stats=None, epochs=NUM_EPOCHS, batch_size=BATCH_SIZE,
+                 grad_accum=GRAD_ACCUM, max_seq_length=MAX_SEQ_LENGTH):
+    stats = dict(stats or {})
+    names = collector.source_names
+    source_ids = np.frombuffer(collector.source_ids, dtype=np.uint16).astype(np.int64)
+    chars = np.frombuffer(collector.chars, dtype=np.int64)
+    weights = np.frombuffer(collector.weights, dtype=np.float64)
+    has_tokens = len(collector.tokens) == len(chars) and collector.tokenizer is not None
+    tokens = np.frombuffer(collector.tokens, dtype=np.int64) if has_tokens else None
+
+    unique = np.bincount(source_ids, minlength=len(names))
+    effective = np.bincount(source_ids, weights=weights, minlength=len(names))
+    total_effective = effective.sum() or 1
+    mixture = {
+        name: {
+            "unique": int(unique[s]),
+            "weight": float(effective[s] / unique[s]) if unique[s] else 0.0,
+            "effective": int(round(effective[s])),
+            "share": float(effective[s] / total_effective),
+        }
+        for s, name in enumerate(names)
+    }
+
+    examples_per_epoch = int(round(weights.sum()))
+    per_step = batch_size * grad_accum
+    projection = {
+        "epochs": epochs,
+        "batch_size": batch_size,
+        "grad_accum": grad_accum,
+        "max_seq_length": max_seq_length,
+        "examples_per_epoch": examples_per_epoch,
+        "steps_per_epoch": math.ceil(examples_per_epoch / per_step),
+        "steps": math.ceil(examples_per_epoch / per_step) * epochs,
+    }
+    report = {
+        "examples": int(len(chars)),
+        "mixture": mixture,
+        "chars": length_profile(chars, source_ids, names),
+        "tokens": None,
+        "ai_phrases": phrase_hits(stats) if "cleaned_seen" in stats else None,
+        "duplicates": collector.duplicates,
+        "filters": {k: v for k, v in stats.items() if not k.startswith("ai_phrase:")},
+        "projection": projection,
+    }
+
+    if has_tokens:
+        report["tokens"] = length_profile(tokens, source_ids, names)
+        report["tokenizer"] = getattr(collector.tokenizer, "name_or_path", None)
+        fits = tokens <= max_seq_length
+        over = np.bincount(source_ids[~fits], minlength=len(names))
+        projection["over_max_length"] = {name: int(over[s]) for s, name in enumerate(names)}
+        # Projections cover what pretokenize.py would keep
+        kept_tokens, kept_weights = tokens[fits], weights[fits]
+        tokens_per_epoch = float(np.dot(kept_tokens, kept_weights))
+        projection["tokens_per_epoch"] = int(tokens_per_epoch)
+        projection["tokens"] = int(tokens_per_epoch * epochs)
+        projection["modes"] = project_modes(kept_tokens, kept_weights, epochs, batch_size,
+                                            grad_accum, max_seq_length)
+    return report
+
+
+def project_modes(tokens, weights, epochs, batch_size, grad_accum, max_seq_length, seed=3407):
+    """packing.compare_modes over a sample of one epoch, scaled to the whole run."""
+    from packing import compare_modes
+
+    epoch = np.repeat(tokens, np.rint(weights).astype(np.int64))
+    scale = 1.0
+    if len(epoch) > PLAN_SAMPLE:
+        scale = len(epoch) / PLAN_SAMPLE
+        epoch = np.random.default_rng(seed).choice(epoch, PLAN_SAMPLE, replace=False)
+    modes = compare_modes(epoch.tolist(), None, batch_size, max_seq_length, grad_accum, seed)
+    for result in modes.values():
+        result["micro_batches"] = round(result["micro_batches"] * scale)
+        result["tokens"] = round(result["tokens"] * scale)
+        result["steps"] = math.ceil(result["micro_batches"] / grad_accum) * epochs
+        result["tokens_per_step"] = result["tokens"] * epochs / result["steps"] if result["steps"] else 0.0
+        result["sampled"] = scale != 1.0
+    return modes
+
+
+def _sparkline(counts):
+    top = max(counts) or 1
+    return "".join(SPARK[math.ceil(c / top * (len(SPARK) - 1))] for c in counts)
+
+
+def print_report(report):
+    print(f"\n  {'Source':<20}{'Unique':>10}{'Weight':>8}{'Effective':>12}{'Share':>8}"
+          f"{'Chars p50/p90/max':>22}" + (f"{'Tokens p50/p90/max':>22}" if report["tokens"] else ""))
+    for name, m in report["mixture"].items():
+        c = report["chars"][name]
+        chars = f"{c['p50']:,}/{c['p90']:,}/{c['max']:,}"
+        line = f"  {name:<20}{m['unique']:>10,}{m['weight']:>8.1f}{m['effective']:>12,}{m['share']:>8.1%}{chars:>22}"
+        if report["tokens"]:
+            t = report["tokens"][name]
+            line += f"{t['p50']:,}/{t['p90']:,}/{t['max']:,}".rjust(22)
+        print(line)
+
+    for kind in ("chars", "tokens"):
+        profile = report[kind]
+        if not profile:
+            continue
+        edges = next(iter(profile.values()))["histogram"]["edges"]
+        print(f"\n  {kind.capitalize()} histogram (bins from {edges[0]}, doubling from {edges[1]} to {edges[-1]:,}):")
+        for name, p in profile.items():
+            print(f"    {name:<20}|{_sparkline(p['histogram']['counts'])}|")
+
+    phrases = report["ai_phrases"]
+    if phrases:
+        print(f"\n  AI phrases: {phrases['filtered']:,} of {phrases['screened']:,} cleaned examples "
+              f"filtered ({phrases['rate']:.2%})")
+        for phrase, hit in phrases["phrases"].items():
+            if hit["count"]:
+                print(f"    {hit['count']:>8,}  {hit['rate']:>7.3%}  {phrase}")
+
+    if report["duplicates"]:
+        dup = report["duplicates"]
+        print(f"\n  Duplicates: {dup['dropped']:,} of {dup['examples']:,} dropped")
+        for source, rate in dup["duplicate_rate_by_source"].items():
+            print(f"    {source:<20}{rate:>8.2%}")
+
+    proj = report["projection"]
+    print(f"\n  Projection ({proj['epochs']} epochs, batch {proj['batch_size']} x {proj['grad_accum']}):")
+    print(f"    Examples per epoch: {proj['examples_per_epoch']:,}")
+    print(f"    Steps: {proj['steps']:,} ({proj['steps_per_epoch']:,} per epoch, no packing)")
+    if "tokens" in proj:
+        over = sum(proj["over_max_length"].values())
+        print(f"    Tokens: {proj['tokens_per_epoch']:,} per epoch, {proj['tokens']:,} total")
+        print(f"    Over {proj['max_seq_length']:,} tokens (dropped by pretokenize.py): {over:,}")
+        from packing import print_comparison
+
+        print()
+        print_comparison(proj["modes"])
+    else:
+        print("    Tokens: not counted (pass a tokenizer for token lengths and packing projections)")
+
+
+def write_report(report, path):
+    report = {"generated_at": time.strftime("%Y-%m-%dT%H:%M:%S"), **report}
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(report, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def main(args):
+    from prepare_gptoss_data import iter_json
+
+    tokenizer = None
+    if args.tokenizer:
+        from pretokenize import load_tokenizer
+        tokenizer = load_tokenizer(args.tokenizer)
+    collector = ReportCollector(tokenizer)
+    start = time.perf_counter()
+    triples = ((row.get("source", "unknown"), row, row.get("weight", 1)) for row in iter_json(args.path))
+    for _ in collector.wrap(triples):
+        pass
+    report = build_report(collector)
+    print_report(report)
+    output = args.output or os.path.splitext(args.path)[0] + ".report.json"
+    write_report(report, output)
+    print(f"\n  Report: {output} ({time.perf_counter() - start:.1f}s)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Profile a prepared training file")
+    parser.add_argument("path", help="Prepared training data (JSON array or JSONL)")
+    parser.add_argument("--tokenizer", help="Tokenizer for token lengths (name or path, or 'byte')")
+    parser.add_argument("-o", "--output", help="Report JSON (default: next to the data, .report.json)")
+    main(parser.parse_args())
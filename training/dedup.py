@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+Near-duplicate detection with MinHash and LSH.
+
+Each example's text (user and assistant turns) is cut into word n-gram
+shingles and summarized as a MinHash signature: `num_perm` minimums of
+random hash functions, whose per-position agreement between two examples
+estimates the Jaccard similarity of their shingle sets. LSH splits the
+signature into bands; examples that agree on a whole band land in the
+same bucket and become candidates. Buckets are found by sorting band
+hashes, so there's no pairwise comparison. Each candidate is checked
+against the first member of its bucket with the full signature before it's
+linked.
+
+Linked examples form clusters (connected components). In each cluster the
+example from the highest-priority source is kept, earliest first on ties,
+and the rest are dropped.
+
+Everything after shingling is vectorized NumPy. Memory is 4 * num_perm
+bytes per example for signatures (256MB per million at the default 64).
+
+    dedup = Deduplicator(threshold=0.8)
+    dedup.add(texts, sources)             # in batches, in output order
+    result = dedup.resolve(["texts", "personal", "cleaned"])
+    result.keep                           # bool mask, same order as added
+    print_report(result)
+
+Run: python dedup.py data.json [--threshold 0.8]   # cluster stats for a prepared file
+"""
+
+import argparse
+import json
+import re
+import zlib
+from collections import Counter
+from dataclasses import dataclass, field
+
+import numpy as np
+
+_WORD = re.compile(r"\w+")
+
+DEFAULT_THRESHOLD = 0.8
+DEFAULT_NUM_PERM = 64
+DEFAULT_NGRAM = 3
+# Examples hashed per vectorized batch (bounds the num_perm x shingles matrix)
+SIGNATURE_BATCH = 1000
+
+
+def lsh_params(threshold, num_perm, fn_weight=0.9):
+    """(bands, rows) minimizing weighted false positives + false negatives.
+
+    The probability two examples with Jaccard similarity s share a bucket is
+    1 - (1 - s**rows)**bands; this picks the S-curve closest to a step at
+    `threshold`, as datasketch does. Misses weigh more than extra candidates
+    since every candidate is re-checked against the full signature anyway.
+    """
+    s = np.linspace(0.0, 1.0, 1001)
+    best, best_error = (1, num_perm), None
+    for bands in range(1, num_perm + 1):
+        rows = num_perm // bands
+        if rows == 0:
+            break
+        p = 1 - (1 - s ** rows) ** bands
+        false_pos = np.where(s < threshold, p, 0).sum()
+        false_neg = np.where(s >= threshold, 1 - p, 0).sum()
+        error = (1 - fn_weight) * false_pos + fn_weight * false_neg
+        if best_error is None or error < best_error:
+            best, best_error = (bands, rows), error
+    return best
+
+
+class MinHasher:
+    """Word n-gram MinHash signatures, deterministic across runs and processes.
+
+    Shingles are polynomial combinations of crc32 word hashes; the hash
+    family is multiply-shift ((a * x + b) mod 2**64) >> 32, which needs no
+    modulo and vectorizes over a whole batch at once.
+    """
+
+    def __init__(self, num_perm=DEFAULT_NUM_PERM, ngram=DEFAULT_NGRAM, seed=1):
+        rng = np.random.RandomState(seed)
+        self.num_perm = num_perm
+        self.ngram = ngram
+        self.a = rng.randint(0, 1 << 63, size=(num_perm, 1), dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+        self.b = rng.randint(0, 1 << 63, size=(num_perm, 1), dtype=np.uint64)
+        self._words = {}
+
+    def _word_hashes(self, text):
+        words = self._words
+        hashes = []
+        for w in _WORD.findall(text.lower()):
+            h = words.get(w)
+            if h is None:
+                h = words[w] = zlib.crc32(w.encode("utf-8"))
+            hashes.append(h)
+        # Texts shorter than one n-gram still get a single (padded) shingle
+        return hashes + [0] * (self.ngram - len(hashes)) if len(hashes) < self.ngram else hashes
+
+    def _batch_shingles(self, texts):
+        """Shingle hashes for a batch, flattened, and each text's start offset."""
+        per_text = [self._word_hashes(t) for t in texts]
+        lengths = np.array([len(w) for w in per_text])
+        words = np.fromiter((h for w in per_text for h in w), dtype=np.uint64, count=int(lengths.sum()))
+        n = self.ngram
+        count = len(words) - n + 1
+        shingles = np.zeros(count, dtype=np.uint64)
+        for i in range(n):  # polynomial combination of the n word hashes
+            shingles = shingles * np.uint64(1000003) + words[i:i + count]
+        # Keep n-grams that start and end inside the same text
+        word_starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+        starts = np.zeros(len(words), dtype=bool)
+        starts[word_starts] = True
+        owner = np.cumsum(starts) - 1
+        valid = owner[:count] == owner[n - 1:]
+        offsets = np.concatenate([[0], np.cumsum(lengths - n + 1)[:-1]])
+        return shingles[valid] & np.uint64(0xFFFFFFFF), offsets
+
+    def signatures(self, texts):
+        """(len(texts), num_perm) uint32 MinHash signatures."""
+        out = np.empty((len(texts), self.num_perm), dtype=np.uint32)
+        for start in range(0, len(texts), SIGNATURE_BATCH):
+            batch = texts[start:start + SIGNATURE_BATCH]
+            shingles, offsets = self._batch_shingles(batch)
+            hashed = (self.a * shingles[None, :] + self.b) >> np.uint64(32)
+            mins = np.minimum.reduceat(hashed, offsets, axis=1)
+            out[start:start + len(batch)] = mins.T
+        return out
+
+
+@dataclass
+class DedupResult:
+    keep: np.ndarray  # bool, one per example in the order added
+    cluster: np.ndarray  # cluster label per example (its own index if unique)
+    sources: list
+    threshold: float
+    bands: int
+    rows: int
+    stats: dict = field(default_factory=dict)
+
+
+def _connected_components(n, pairs_a, pairs_b):
+    """Component label (smallest member index) for each of n nodes."""
+    labels = np.arange(n)
+    while len(pairs_a):
+        # Hook each pair's roots onto the smaller one, then jump pointers to roots
+        la, lb = labels[pairs_a], labels[pairs_b]
+        low = np.minimum(la, lb)
+        if np.array_equal(la, lb):
+            break
+        np.minimum.at(labels, la, low)
+        np.minimum.at(labels, lb, low)
+        while True:
+            jumped = labels[labels]
+            if np.array_equal(jumped, labels):
+                break
+            labels = jumped
+    return labels
+
+
+class Deduplicator:
+    """Collects signatures batch by batch, then clusters them all at once."""
+
+    def __init__(self, threshold=DEFAULT_THRESHOLD, num_perm=DEFAULT_NUM_PERM, ngram=DEFAULT_NGRAM):
+        self.threshold = threshold
+        self.hasher = MinHasher(num_perm, ngram)
+        self.bands, self.rows = lsh_params(threshold, num_perm)
+        self._signatures = []
+        self.sources = []
+
+    def add(self, texts, sources):
+        self._signatures.append(self.hasher.signatures(texts))
+        self.sources.extend(sources)
+
+    def _candidate_pairs(self, sig):
+        """(representative, member) pairs sharing at least one LSH bucket."""
+        reps, members = [], []
+        for band in range(self.bands):
+            cols = sig[:, band * self.rows:(band + 1) * self.rows].astype(np.uint64)
+            key = np.zeros(len(sig), dtype=np.uint64)
+            for c in range(self.rows):
+                key = key * np.uint64(0x100000001B3) ^ cols[:, c]
+            order = np.argsort(key, kind="stable")
+            ordered = key[order]
+            starts = np.ones(len(order), dtype=bool)
+            starts[1:] = ordered[1:] != ordered[:-1]
+            run = np.cumsum(starts) - 1
+            rep = order[np.flatnonzero(starts)][run]
+            linked = rep != order
+            reps.append(rep[linked])
+            members.append(order[linked])
+        if not reps:
+            return np.array([], dtype=np.int64), np.array([], dtype=np.int64)
+        pairs = np.unique(np.stack([np.concatenate(reps), np.concatenate(members)]), axis=1)
+        return pairs[0], pairs[1]
+
+    def resolve(self, priority):
+        """Cluster everything added; keep one example per cluster by source priority."""
+        n = len(self.sources)
+        sig = np.concatenate(self._signatures) if self._signatures else np.empty((0, 1), np.uint32)
+        a, b = self._candidate_pairs(sig) if n else (np.array([], int), np.array([], int))
+
+        # Confirm candidates with the full signature (estimated Jaccard)
+        similar = np.ones(len(a), dtype=bool)
+        for start in range(0, len(a), 100_000):
+            chunk = slice(start, start + 100_000)
+            similar[chunk] = (sig[a[chunk]] == sig[b[chunk]]).mean(axis=1) >= self.threshold
+        cluster = _connected_components(n, a[similar], b[similar])
+
+        # Lowest (priority rank, index) wins each cluster
+        rank = {source: i for i, source in enumerate(priority)}
+        source_rank = np.array([rank.get(s, len(priority)) for s in self.sources], dtype=np.int64)
+        score = source_rank * max(n, 1) + np.arange(n)
+        best = np.full(n, np.iinfo(np.int64).max)
+        np.minimum.at(best, cluster, score)
+        keep = score == best[cluster]
+
+        stats = {"candidate_pairs": int(len(a)), "confirmed_pairs": int(similar.sum())}
+        return DedupResult(keep, cluster, self.sources, self.threshold, self.bands, self.rows, stats)
+
+
+def summarize(result):
+    """Cluster statistics as a plain dict (for reports)."""
+    n = len(result.keep)
+    sizes = np.bincount(result.cluster, minlength=n) if n else np.zeros(0, int)
+    dup_sizes = sizes[sizes > 1]
+    dropped = Counter(s for s, k in zip(result.sources, result.keep) if not k)
+    total = Counter(result.sources)
+    return {
+        "threshold": result.threshold,
+        "bands": result.bands,
+        "rows": result.rows,
+        "examples": n,
+        "kept": int(result.keep.sum()),
+        "dropped": int(n - result.keep.sum()),
+        "clusters": int(len(dup_sizes)),
+        "largest_cluster": int(dup_sizes.max()) if len(dup_sizes) else 0,
+        "cluster_sizes": {
+            "2": int((dup_sizes == 2).sum()),
+            "3-5": int(((dup_sizes >= 3) & (dup_sizes <= 5)).sum()),
+            "6-20": int(((dup_sizes >= 6) & (dup_sizes <= 20)).sum()),
+            "21+": int((dup_sizes > 20).sum()),
+        },
+        "dropped_by_source": {s: dropped[s] for s in total},
+        "duplicate_rate_by_source": {s: dropped[s] / total[s] for s in total},
+        **result.stats,
+    }
+
+
+def print_report(result):
+    summary = summarize(result)
+    print(f"  Near-duplicates (Jaccard >= {summary['threshold']}, LSH {summary['bands']} bands"
+          f" x {summary['rows']} rows):")
+    print(f"    {summary['dropped']:,} of {summary['examples']:,} dropped in "
+          f"{summary['clusters']:,} clusters (largest {summary['largest_cluster']:,})")
+    sizes = summary["cluster_sizes"]
+    print("    Cluster sizes: " + ", ".join(f"{k}: {v:,}" for k, v in sizes.items()))
+    for source, dropped in summary["dropped_by_source"].items():
+        rate = summary["duplicate_rate_by_source"][source]
+        print(f"    {source:<20}{dropped:>10,} dropped ({rate:.1%})")
+    return summary
+
+
+def example_text(example):
+    """The text compared for duplicates: user and assistant turns."""
+    return "\n".join(m["content"] for m in example["messages"] if m["role"] != "developer")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Near-duplicate report for a prepared training file")
+    parser.add_argument("path", help="Prepared training data (JSON array or JSONL)")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument("--num-perm", type=int, default=DEFAULT_NUM_PERM)
+    args = parser.parse_args()
+
+    with open(args.path) as f:
+        first = f.read(1)
+        f.seek(0)
+        rows = json.load(f) if first == "[" else [json.loads(line) for line in f if line.strip()]
+    dedup = Deduplicator(args.threshold, args.num_perm)
+    dedup.add([example_text(r) for r in rows], [r.get("source", "unknown") for r in rows])
+    print_report(dedup.resolve(["texts", "personal", "personal_expanded", "cleaned"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+Batch planning for the fine-tuning run: length grouping and sequence packing.
+
+With BATCH_SIZE = 1 every micro-batch is a single example, so a step of
+short text-message examples moves a small fraction of the tokens a
+MAX_SEQ_LENGTH step could. Given per-example token lengths (from
+pretokenize.py) this plans one epoch of micro-batches in one of three modes:
+
+  none   BATCH_SIZE examples per micro-batch in sampler order (today's run)
+  group  examples sorted by length within windows of the shuffled epoch and
+         batched up to BATCH_SIZE * MAX_SEQ_LENGTH padded tokens, so short
+         examples travel many to a batch with little padding
+  pack   best-fit-decreasing bin packing of whole examples into rows of
+         BATCH_SIZE * MAX_SEQ_LENGTH tokens; no padding at all
+
+Examples are never split. Packed rows keep their boundaries: the packed
+collator restarts position_ids at each example and masks the first label
+of each one, the padding-free layout that flash-attention's varlen path
+uses to keep attention inside each example. There is no attention mask, so
+any other kernel would let each example attend to the ones before it;
+packed_attention_problem() says whether the loaded model can take packed
+rows, and the trainer refuses "pack" if it can't.
+
+Micro-batch order is shuffled per epoch in every mode, and weighted epochs
+come from weighted_sampler.epoch_indices, so the mixture is unchanged.
+
+plan_stats() gives micro-batches, optimizer steps, real tokens per step,
+how full each micro-batch's token budget is and how much of the computed
+tokens is padding; print_comparison() puts the three modes side by side.
+
+Run: python packing.py                        # compare modes on the pretokenize.py output
+     python packing.py /tmp/tokens --grad-accum 16 --epochs 2
+"""
+
+import argparse
+import bisect
+import math
+import random
+
+import numpy as np
+
+from weighted_sampler import epoch_indices
+
+MODES = ("none", "group", "pack")
+# Attention implementations that split a packed row at position_ids resets
+VARLEN_ATTENTION = ("flash_attention_2", "flash_attention_3")
+# Examples sorted together by "group"; big enough to find similar lengths,
+# small enough that batches still mix the epoch
+GROUP_WINDOW = 4096
+
+
+def epoch_order(n, weights=None, seed=3407, epoch=0):
+    """Dataset indices for one epoch: weighted replay, or a plain shuffle."""
+    if weights is not None:
+        return epoch_indices(weights, seed, epoch)
+    order = list(range(n))
+    random.Random(f"{seed}:{epoch}").shuffle(order)
+    return order
+
+
+def _group(order, lengths, budget):
+    batches = []
+    for start in range(0, len(order), GROUP_WINDOW):
+        window = sorted(order[start:start + GROUP_WINDOW], key=lambda i: lengths[i], reverse=True)
+        batch, longest = [], 0
+        for i in window:
+            # Sorted longest first, so the first member sets the padded width
+            if batch and (len(batch) + 1) * longest > budget:
+                batches.append(batch)
+                batch = []
+            if not batch:
+                longest = lengths[i]
+            batch.append(i)
+        if batch:
+            batches.append(batch)
+    return batches
+
+
+def _pack(order, lengths, budget):
+    """Best-fit decreasing: each example goes in the fullest row it still fits."""
+    items = sorted(order, key=lambda i: lengths[i], reverse=True)
+    if not items:
+        return []
+    smallest = lengths[items[-1]]
+    bins = []
+    free = []  # sorted (space left, bin) for bins that can still take an example
+    for i in items:
+        size = lengths[i]
+        if size > budget:
+            raise ValueError(f"example {i} has {size} tokens, more than the {budget}-token row")
+        k = bisect.bisect_left(free, (size, -1))
+        if k < len(free):
+            space, b = free.pop(k)
+        else:
+            space, b = budget, len(bins)
+            bins.append([])
+        bins[b].append(i)
+        if space - size >= smallest:
+            bisect.insort(free, (space - size, b))
+    return bins
+
+
+def plan_batches(order, lengths, mode, batch_size, max_tokens, seed=3407, epoch=0):
+    """Micro-batches (lists of dataset indices) covering `order` once."""
+    budget = batch_size * max_tokens
+    if mode == "none":
+        return [order[i:i + batch_size] for i in range(0, len(order), batch_size)]
+    if mode == "group":
+        batches = _group(order, lengths, budget)
+    elif mode == "pack":
+        batches = _pack(order, lengths, budget)
+    else:
+        raise ValueError(f"unknown packing mode {mode!r} (expected one of {', '.join(MODES)})")
+    # Grouping and packing sort by length; don't train in that order
+    random.Random(f"{seed}:{epoch}:batches").shuffle(batches)
+    return batches
+
+
+def plan_stats(batches, lengths, mode, batch_size, max_tokens, grad_accum):
+    """Token accounting for one epoch's plan."""
+    budget = batch_size * max_tokens
+    real = computed = 0
+    for batch in batches:
+        sizes = [lengths[i] for i in batch]
+        real += sum(sizes)
+        # Packed rows are flattened with no padding; others pad to the longest member
+        computed += sum(sizes) if mode == "pack" else len(sizes) * max(sizes)
+    micro = len(batches)
+    steps = math.ceil(micro / grad_accum) if micro else 0
+    return {
+        "mode": mode,
+        "micro_batches": micro,
+        "steps": steps,
+        "tokens": real,
+        "tokens_per_step": real / steps if steps else 0.0,
+        "examples_per_micro_batch": sum(map(len, batches)) / micro if micro else 0.0,
+        "fill": real / (micro * budget) if micro else 0.0,
+        "padding": (computed - real) / computed if computed else 0.0,
+    }
+
+
+def compare_modes(lengths, weights, batch_size, max_tokens, grad_accum, seed=3407):
+    """plan_stats for every mode over the same epoch."""
+    order = epoch_order(len(lengths), weights, seed)
+    return {mode: plan_stats(plan_batches(order, lengths, mode, batch_size, max_tokens, seed),
+                             lengths, mode, batch_size, max_tokens, grad_accum)
+            for mode in MODES}
+
+
+def print_comparison(results, selected=None, epochs=1):
+    base = results["none"]["tokens_per_step"] or 1
+    print(f"  {'Mode':<8}{'Micro-batches':>15}{'Steps':>10}{'Tokens/step':>13}{'vs none':>9}"
+          f"{'Ex/batch':>10}{'Fill':>8}{'Padding':>9}")
+    for mode, s in results.items():
+        mark = " <" if mode == selected else ""
+        print(f"  {mode:<8}{s['micro_batches']:>15,}{s['steps'] * epochs:>10,}{s['tokens_per_step']:>13,.0f}"
+              f"{s['tokens_per_step'] / base:>8.1f}x{s['examples_per_micro_batch']:>10.1f}"
+              f"{s['fill']:>8.1%}{s['padding']:>9.1%}{mark}")
+
+
+class PlannedBatchSampler:
+    """Batch sampler yielding a fresh grouped or packed plan every epoch.
+
+    len() is the first epoch's plan; with integer weights every epoch has
+    the same multiset of lengths, so the count doesn't change.
+    """
+
+    def __init__(self, lengths, weights, mode, batch_size, max_tokens, seed=3407):
+        self.lengths = [int(x) for x in lengths]
+        self.weights = weights
+        self.mode = mode
+        self.batch_size = batch_size
+        self.max_tokens = max_tokens
+        self.seed = seed
+        self.epoch = 0
+        self._length = len(self.plan(0))
+
+    def plan(self, epoch):
+        order = epoch_order(len(self.lengths), self.weights, self.seed, epoch)
+        return plan_batches(order, self.lengths, self.mode, self.batch_size, self.max_tokens, self.seed, epoch)
+
+    def set_epoch(self, epoch):
+        self.epoch = epoch
+
+    def __iter__(self):
+        batches = self.plan(self.epoch)
+        self.epoch += 1  # a new plan next time even if set_epoch() isn't called
+        return iter(batches)
+
+    def __len__(self):
+        return self._length
+
+
+def packed_attention_problem(model):
+    """Why `model` can't train on packed rows, or None if its attention keeps examples apart."""
+    config = getattr(model, "config", None)
+    implementation = getattr(config, "_attn_implementation", None)
+    if implementation in VARLEN_ATTENTION:
+        return None
+    return (f"attention implementation is {implementation!r}, which ignores position_ids resets; "
+            f"packed examples would attend to each other (needs one of {', '.join(VARLEN_ATTENTION)})")
+
+
+def make_packed_collator():
+    """Flatten a packed micro-batch into one row with per-example positions.
+
+    position_ids restart at 0 for each example and each example's first
+    label is -100, so no token is trained to follow the previous example.
+    """
+    import torch
+
+    def collate(batch):
+        ids = [torch.as_tensor(b["input_ids"], dtype=torch.long) for b in batch]
+        input_ids = torch.cat(ids)
+        position_ids = torch.cat([torch.arange(len(x)) for x in ids])
+        labels = input_ids.clone()
+        labels[position_ids == 0] = -100
+        return {"input_ids": input_ids[None], "position_ids": position_ids[None], "labels": labels[None]}
+
+    return collate
+
+
+def main(args):
+    from pretokenize import TOKENIZED_DIR, PretokenizedDataset
+
+    dataset = PretokenizedDataset(args.path or TOKENIZED_DIR)
+    lengths = dataset.lengths.tolist()
+    weights = dataset.weights.tolist() if dataset.weighted else None
+    print(f"{dataset.path}: {len(dataset):,} examples, {dataset.meta['tokens']:,} tokens")
+    print(f"  Batch {args.batch_size} x {args.grad_accum}, {args.max_tokens:,} tokens per row, "
+          f"{args.epochs} epoch(s)\n")
+    print_comparison(compare_modes(lengths, weights, args.batch_size, args.max_tokens, args.grad_accum),
+                     epochs=args.epochs)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare batch planning modes")
+    parser.add_argument("path", nargs="?", help="pretokenize.py output directory")
+    parser.add_argument("--max-tokens", type=int, default=4096, help="Tokens per row (MAX_SEQ_LENGTH)")
+    parser.add_argument("--batch-size", type=int, default=1)
+    parser.add_argument("--grad-accum", type=int, default=16)
+    parser.add_argument("--epochs", type=int, default=1)
+    main(parser.parse_args())
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Per-input cache for prepare_gptoss_data.py.
+
+Each source's filtered, converted examples are kept as JSONL in the cache
+directory, keyed by the SHA-256 of the input file and of the processing
+config that source depends on (phrase list, emoji pattern, system prompt,
+code version). manifest.json records both hashes, the cached file, its
+example count and the filter stats, so a rerun replays unchanged sources
+from disk and only reprocesses the ones whose input or config changed.
+Input hashes are memoized by (size, mtime), so an untouched file isn't
+even re-read.
+
+Oversampling factors are applied when sources are merged, not cached, so
+changing them doesn't invalidate anything.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+MANIFEST = "manifest.json"
+HASH_CHUNK = 1 << 20
+
+
+def config_hash(config):
+    """Stable hash of a JSON-serializable config dict."""
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def _write_json(path, data):
+    """Atomically replace a JSON file."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+class PrepCache:
+    """Manifest plus one cached JSONL file per source."""
+
+    def __init__(self, cache_dir, force=False):
+        self.cache_dir = cache_dir
+        self.force = force
+        os.makedirs(cache_dir, exist_ok=True)
+        self.manifest_path = os.path.join(cache_dir, MANIFEST)
+        try:
+            with open(self.manifest_path) as f:
+                self.manifest = json.load(f)
+        except (OSError, ValueError):
+            self.manifest = {}
+        self.results = {}  # source -> "hit" or "miss (reason)"
+
+    def _input_hash(self, source, path):
+        """SHA-256 of the input, reusing the manifest's if size and mtime match."""
+        st = os.stat(path)
+        entry = self.manifest.get(source, {})
+        if (entry.get("input") == os.path.abspath(path) and entry.get("input_size") == st.st_size
+                and entry.get("input_mtime_ns") == st.st_mtime_ns):
+            return entry["input_sha256"], st
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+                digest.update(chunk)
+        return digest.hexdigest(), st
+
+    def _miss_reason(self, source, input_sha, cfg_sha):
+        entry = self.manifest.get(source)
+        if self.force:
+            return "forced"
+        if not entry:
+            return "new"
+        if entry["input_sha256"] != input_sha:
+            return "input changed"
+        if entry["config_sha256"] != cfg_sha:
+            return "config changed"
+        if not os.path.exists(os.path.join(self.cache_dir, entry["cache_file"])):
+            return "cache file missing"
+        return None
+
+    def examples(self, source, path, config, produce, stats):
+        """Yield the source's processed examples, from cache or from produce().
+
+        produce() returns a generator of processed examples and fills
+        `stats`; on a miss its output is written to the cache as it's
+        consumed and committed to the manifest once it's exhausted. On a hit
+        `stats` gets the counts recorded when the cache was made.
+        """
+        input_sha, st = self._input_hash(source, path)
+        cfg_sha = config_hash(config)
+        reason = self._miss_reason(source, input_sha, cfg_sha)
+
+        if reason is None:
+            entry = self.manifest[source]
+            self.results[source] = "hit"
+            print(f"  {os.path.basename(path)}: cached ({entry['count']:,} examples)")
+            stats.update(entry["stats"])
+            with open(os.path.join(self.cache_dir, entry["cache_file"])) as f:
+                for line in f:
+                    yield json.loads(line)
+            return
+
+        self.results[source] = f"miss ({reason})"
+        cache_file = f"{source}-{input_sha[:12]}-{cfg_sha[:12]}.jsonl"
+        cache_path = os.path.join(self.cache_dir, cache_file)
+        tmp_path = cache_path + ".tmp"
+        count = 0
+        with open(tmp_path, "w") as f:
+            for example in produce():
+                f.write(json.dumps(example, ensure_ascii=False) + "\n")
+                count += 1
+                yield example
+        os.replace(tmp_path, cache_path)
+
+        old = self.manifest.get(source, {}).get("cache_file")
+        self.manifest[source] = {
+            "input": os.path.abspath(path),
+            "input_sha256": input_sha,
+            "input_size": st.st_size,
+            "input_mtime_ns": st.st_mtime_ns,
+            "config_sha256": cfg_sha,
+            "config": config,
+            "cache_file": cache_file,
+            "count": count,
+            "stats": dict(stats),
+            "created_at": time.time(),
+        }
+        _write_json(self.manifest_path, self.manifest)
+        if old and old != cache_file:
+            try:
+                os.remove(os.path.join(self.cache_dir, old))
+            except FileNotFoundError:
+                pass
+
+    def print_summary(self):
+        hits = sum(r == "hit" for r in self.results.values())
+        print(f"\n  Cache ({self.cache_dir}): {hits} hit, {len(self.results) - hits} miss")
+        for source, result in self.results.items():
+            print(f"    {source:<20}{result}")
@@ -5,15 +5,55 @@ Converts Alpaca-format data to GPT-OSS messages format,
 filters AI-sounding phrases, and oversamples identity examples.
 
 Input:  alexandra_training_cleaned.json, alexandra_personal.json, alexandra_personal_expanded.json
+        (JSON arrays or JSONL)
 Output: gptoss_alexandra_training.json (messages format)
 
+Inputs are read incrementally and examples flow through the filters as a
+generator pipeline straight into the output file, so memory stays flat no
+matter how big the corpus is. --jsonl writes one example per line instead
+of a JSON array (load_dataset("json") in the trainer reads either).
+
+Oversampling isn't materialized: each unique example is written once with
+a "source" tag and a "weight" (the number of copies it stands for), and
+the trainer's WeightedEpochSampler (weighted_sampler.py) replays that
+mixture. --materialize writes the old layout instead, with the copies
+inline; that output is byte-identical to what json.dump() of the whole
+list produced.
+
+--dedup drops near-duplicates (MinHash/LSH over word 3-grams, see
+dedup.py) across all sources, keeping texts over personal over expanded
+over cleaned, and reports the duplicate clusters.
+
+Each source's processed examples are cached per input file (see
+prep_cache.py), so a rerun only reprocesses inputs whose content or
+processing config changed; --force reprocesses everything.
+
+--report profiles what was written (length histograms per source, the
+effective mixture, AI-phrase hit rates, duplicate rates, projected steps
+and tokens; see data_report.py) into a .report.json next to the output
+and prints a summary. Token counts need --report-tokenizer.
+
+--workers N spreads filtering and conversion over N processes. Chunks are
+merged back in input order, so the output doesn't depend on N.
+
 Run: python prepare_gptoss_data.py
+     python prepare_gptoss_data.py --jsonl
+     python prepare_gptoss_data.py --materialize
+     python prepare_gptoss_data.py --workers 8
+     python prepare_gptoss_data.py --dedup --dedup-threshold 0.7
+     python prepare_gptoss_data.py --force
+     python prepare_gptoss_data.py --report --report-tokenizer unsloth/gpt-oss-120b-bnb-4bit
 """
 
+import argparse
 import json
 import re
 import os
-from collections import Counter
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+
+from ai_phrases import AI_PHRASES, AIPhraseDetector
+from prep_cache import PrepCache
 
 DATA_DIR = "/home/alexandratitus767/ai-clone-training/data"
 OUTPUT_FILE = os.path.join(DATA_DIR, "gptoss_alexandra_training.json")
@@ -33,30 +73,8 @@ ALEXANDRA_SYSTEM = (
     "Be real, be yourself."
 )
 
-# Phrases that make text sound AI-generated - filter these out
-AI_PHRASES = [
-    r"(?i)as an ai\b",
-    r"(?i)as a language model\b",
-    r"(?i)i don'?t have (personal )?(feelings|emotions|experiences)\b",
-    r"(?i)i'?m (just )?an? (ai|artificial|language model|chatbot)\b",
-    r"(?i)certainly!",
-    r"(?i)^of course!",
-    r"(?i)^great question!",
-    r"(?i)^that'?s a great question",
-    r"(?i)^absolutely!",
-    r"(?i)^i'?d be happy to help",
-    r"(?i)in today'?s (fast[- ]paced|digital|modern) world",
-    r"(?i)let'?s dive (in|into)",
-    r"(?i)(?:it'?s )?important to note that",
-    r"(?i)it'?s worth (noting|mentioning)",
-    r"(?i)I hope (this|that) helps",
-    r"(?i)feel free to ask",
-    r"(?i)don'?t hesitate to",
-    r"(?i)I cannot and will not",
-    r"(?i)as a helpful assistant",
-]
-
-AI_PATTERNS = [re.compile(p) for p in AI_PHRASES]
+# AI-sounding phrases (ai_phrases.AI_PHRASES) are filtered out
+AI_DETECTOR = AIPhraseDetector(AI_PHRASES)
 
 # Regex to match emojis
 EMOJI_PATTERN = re.compile(
@@ -79,23 +97,80 @@ EMOJI_PATTERN = re.compile(
 PERSONAL_OVERSAMPLE = 8
 # Text messages are pure Alexandra voice - oversample heavily
 TEXT_MSG_OVERSAMPLE = 6
+# With --dedup, which copy of a near-duplicate survives: earlier sources win
+DEDUP_PRIORITY = ["texts", "personal", "personal_expanded", "cleaned"]
+# Examples hashed per batch while spooling for dedup
+DEDUP_BATCH = 10000
+# Per-source cache of processed examples; bump CACHE_VERSION when the
+# filtering or conversion code changes so stale caches are rebuilt
+CACHE_DIR = os.path.join(DATA_DIR, ".prep_cache")
+CACHE_VERSION = 2
+
+
+# Examples per task handed to a worker process with --workers
+WORKER_CHUNK = 2000
+MAX_IN_FLIGHT = 32
+
+# Characters read per chunk when streaming a JSON array
+READ_CHUNK = 1 << 20
+
+_decoder = json.JSONDecoder()
+
+
+def _iter_json_array(f, buf):
+    """Yield the elements of a JSON array one at a time from an open file."""
+    pos = 1  # past the '['
+    eof = False
+    while True:
+        # Skip whitespace and separators, reading more if the buffer runs out
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n,":
+                pos += 1
+            if pos < len(buf) or eof:
+                break
+            buf, pos = f.read(READ_CHUNK), 0
+            eof = not buf
+        if pos >= len(buf):
+            raise ValueError("Unterminated JSON array")
+        if buf[pos] == "]":
+            return
+        try:
+            obj, end = _decoder.raw_decode(buf, pos)
+            # A value running up to the end of the buffer may be cut short
+            complete = end < len(buf) or eof
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            complete = False
+        if not complete:
+            more = f.read(READ_CHUNK)
+            eof = not more
+            buf, pos = buf[pos:] + more, 0
+            continue
+        yield obj
+        pos = end
 
 
-def load_json(filepath):
-    """Load a JSON file (array of objects)."""
+def iter_json(filepath):
+    """Yield examples from a JSON array or JSONL file without loading it whole."""
     print(f"  Loading {os.path.basename(filepath)}...")
+    count = 0
     with open(filepath, "r") as f:
-        data = json.load(f)
-    print(f"    {len(data):,} examples")
-    return data
+        buf = f.read(READ_CHUNK)
+        if buf.lstrip().startswith("["):
+            examples = _iter_json_array(f, buf.lstrip())
+        else:
+            f.seek(0)
+            examples = (json.loads(line) for line in f if line.strip())
+        for example in examples:
+            count += 1
+            yield example
+    print(f"    {count:,} examples")
 
 
 def has_ai_phrases(text):
     """Check if text contains AI-sounding phrases."""
-    for pattern in AI_PATTERNS:
-        if pattern.search(text):
-            return True
-    return False
+    return AI_DETECTOR(text)
 
 
 def strip_lol_and_emojis(text):
@@ -156,124 +231,341 @@ def convert_personal_to_messages(example):
     return {"messages": messages}
 
 
-def main():
-    print("=" * 60)
-    print("PREPARING GPT-OSS TRAINING DATA")
-    print("=" * 60)
+def clean_example(example, stats):
+    """Bulk personality/empathy data: drop AI-sounding and very short outputs."""
+    output = example.get("output", "")
+    stats["cleaned_seen"] += 1
 
-    # Load all datasets
-    print("\nLoading datasets...")
-    cleaned = load_json(CLEANED_DATA)
-    personal = load_json(PERSONAL_DATA)
+    # Skip if output contains AI-sounding phrases
+    phrase = AI_DETECTOR.search(output)
+    if phrase:
+        stats["filtered_ai_phrases"] += 1
+        stats[f"ai_phrase:{phrase}"] += 1
+        return None
 
-    personal_expanded = []
-    if os.path.exists(PERSONAL_EXPANDED):
-        personal_expanded = load_json(PERSONAL_EXPANDED)
+    # Skip very short outputs (likely noise)
+    if len(output.strip()) < 10:
+        stats["filtered_too_short"] += 1
+        return None
 
-    # Convert and filter
-    print("\nConverting to messages format...")
-    all_messages = []
-    stats = Counter()
+    converted = convert_to_messages(example)
+    if converted:
+        stats["cleaned_kept"] += 1
+    return converted
 
-    # Process cleaned data (bulk personality/empathy data)
-    for example in cleaned:
-        output = example.get("output", "")
 
-        # Skip if output contains AI-sounding phrases
-        if has_ai_phrases(output):
-            stats["filtered_ai_phrases"] += 1
-            continue
+def personal_example(example, stats):
+    return convert_personal_to_messages(example)
 
-        # Skip very short outputs (likely noise)
-        if len(output.strip()) < 10:
-            stats["filtered_too_short"] += 1
-            continue
 
-        converted = convert_to_messages(example)
-        if converted:
-            all_messages.append(converted)
-            stats["cleaned_kept"] += 1
-
-    print(f"  Cleaned data: {stats['cleaned_kept']:,} kept, "
-          f"{stats['filtered_ai_phrases']:,} filtered (AI phrases), "
-          f"{stats['filtered_too_short']:,} filtered (too short)")
-
-    # Process personal identity data with oversampling
-    personal_count = 0
-    for example in personal:
-        converted = convert_personal_to_messages(example)
-        if converted:
-            # Oversample to anchor personality
-            for _ in range(PERSONAL_OVERSAMPLE):
-                all_messages.append(converted)
-            personal_count += 1
-
-    print(f"  Personal identity: {personal_count} examples x {PERSONAL_OVERSAMPLE} = "
-          f"{personal_count * PERSONAL_OVERSAMPLE:,} (oversampled)")
-
-    # Process expanded personal data
-    expanded_count = 0
-    for example in personal_expanded:
-        converted = convert_personal_to_messages(example)
-        if converted:
-            for _ in range(PERSONAL_OVERSAMPLE // 2):
-                all_messages.append(converted)
-            expanded_count += 1
-
-    print(f"  Personal expanded: {expanded_count} examples x {PERSONAL_OVERSAMPLE // 2} = "
-          f"{expanded_count * (PERSONAL_OVERSAMPLE // 2):,} (oversampled)")
-
-    # Process text messages (real Alexandra voice - highest value data)
-    text_count = 0
-    if os.path.exists(TEXT_MESSAGES):
-        texts = load_json(TEXT_MESSAGES)
-        for example in texts:
-            output = strip_lol_and_emojis(example.get("output", "").strip())
-            user_input = strip_lol_and_emojis(example.get("input", "").strip())
-
-            if not output or len(output) < 5:
-                stats["texts_filtered_short"] += 1
-                continue
-
-            messages = [
-                {"role": "developer", "content": ALEXANDRA_SYSTEM},
-                {"role": "user", "content": user_input},
-                {"role": "assistant", "content": output},
-            ]
-            converted = {"messages": messages}
-
-            for _ in range(TEXT_MSG_OVERSAMPLE):
-                all_messages.append(converted)
-            text_count += 1
-
-        print(f"  Text messages: {text_count} examples x {TEXT_MSG_OVERSAMPLE} = "
-              f"{text_count * TEXT_MSG_OVERSAMPLE:,} (oversampled)")
+def text_message_example(example, stats):
+    """Text messages (real Alexandra voice - highest value data)."""
+    output = strip_lol_and_emojis(example.get("output", "").strip())
+    user_input = strip_lol_and_emojis(example.get("input", "").strip())
+
+    if not output or len(output) < 5:
+        stats["texts_filtered_short"] += 1
+        return None
+
+    messages = [
+        {"role": "developer", "content": ALEXANDRA_SYSTEM},
+        {"role": "user", "content": user_input},
+        {"role": "assistant", "content": output},
+    ]
+    stats["texts_kept"] += 1
+    return {"messages": messages}
+
+
+def _process_chunk(process, examples):
+    """Worker side of map_examples: converted examples (None if dropped) and stats."""
+    stats = Counter()
+    return [process(example, stats) for example in examples], stats
+
+
+def _chunks(examples, size):
+    chunk = []
+    for example in examples:
+        chunk.append(example)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def map_examples(process, examples, stats, pool=None):
+    """Yield process(example, stats) for each example that isn't dropped, in order.
+
+    With a process pool, examples go out in chunks of WORKER_CHUNK and come
+    back in submission order, with at most MAX_IN_FLIGHT chunks outstanding
+    so memory stays bounded. Each chunk's stats are added into `stats`.
+    """
+    if pool is None:
+        for example in examples:
+            converted = process(example, stats)
+            if converted:
+                yield converted
+        return
+
+    pending = deque()
+
+    def finished():
+        converted, chunk_stats = pending.popleft().result()
+        stats.update(chunk_stats)
+        return [c for c in converted if c]
+
+    for chunk in _chunks(examples, WORKER_CHUNK):
+        pending.append(pool.submit(_process_chunk, process, chunk))
+        if len(pending) >= MAX_IN_FLIGHT:
+            yield from finished()
+    while pending:
+        yield from finished()
+
+
+def print_source_summary(source, count, stats, repeat):
+    if source == "cleaned":
+        print(f"  Cleaned data: {stats['cleaned_kept']:,} kept, "
+              f"{stats['filtered_ai_phrases']:,} filtered (AI phrases), "
+              f"{stats['filtered_too_short']:,} filtered (too short)")
+        for phrase in AI_PHRASES:
+            if stats[f"ai_phrase:{phrase}"]:
+                print(f"    {stats[f'ai_phrase:{phrase}']:>8,}  {phrase}")
+    elif source == "texts":
+        print(f"  Text messages: {count} examples x {repeat} = "
+              f"{count * repeat:,} (oversampled)")
         if stats["texts_filtered_short"]:
             print(f"    Filtered (too short): {stats['texts_filtered_short']:,}")
     else:
-        print(f"  Text messages: NOT FOUND at {TEXT_MESSAGES}")
+        label = "Personal identity" if source == "personal" else "Personal expanded"
+        print(f"  {label}: {count} examples x {repeat} = "
+              f"{count * repeat:,} (oversampled)")
+
+
+def sources():
+    """(source, input file, per-example step, copies per example), in output order."""
+    return [
+        ("cleaned", CLEANED_DATA, clean_example, 1),
+        ("personal", PERSONAL_DATA, personal_example, PERSONAL_OVERSAMPLE),
+        ("personal_expanded", PERSONAL_EXPANDED, personal_example, PERSONAL_OVERSAMPLE // 2),
+        ("texts", TEXT_MESSAGES, text_message_example, TEXT_MSG_OVERSAMPLE),
+    ]
 
-    print(f"\n  Total examples: {len(all_messages):,}")
 
-    # Save
-    print(f"\nSaving to {OUTPUT_FILE}...")
-    with open(OUTPUT_FILE, "w") as f:
-        json.dump(all_messages, f, indent=None, ensure_ascii=False)
+def source_config(source):
+    """Everything a source's cached output depends on besides its input file."""
+    config = {"version": CACHE_VERSION, "emoji": EMOJI_PATTERN.pattern}
+    if source == "cleaned":
+        config["ai_phrases"] = AI_PHRASES
+    else:
+        config["system"] = ALEXANDRA_SYSTEM
+    return config
+
+
+def training_examples(stats, pool=None, cache=None):
+    """Every (source, example, repeat) triple, in output order."""
+    for source, path, process, repeat in sources():
+        if source in ("personal_expanded", "texts") and not os.path.exists(path):
+            if source == "texts":
+                print(f"  Text messages: NOT FOUND at {TEXT_MESSAGES}")
+            else:
+                print_source_summary(source, 0, Counter(), repeat)
+            continue
+
+        source_stats = Counter()
+
+        def produce(path=path, process=process):
+            return map_examples(process, iter_json(path), source_stats, pool)
+
+        if cache:
+            examples = cache.examples(source, path, source_config(source), produce, source_stats)
+        else:
+            examples = produce()
+        count = 0
+        for example in examples:
+            yield source, example, repeat
+            count += 1
+        stats.update(source_stats)
+        print_source_summary(source, count, source_stats, repeat)
+
+
+def deduplicate(triples, output_file, threshold, report=None):
+    """Drop near-duplicates (MinHash/LSH, see dedup.py) across all sources.
+
+    Needs the whole corpus before deciding, so the first pass spools the
+    triples to a temp file next to the output while hashing them; the
+    second reads the spool back and yields the survivors in order. The
+    cluster summary goes to `report` (a ReportCollector) if given.
+    """
+    from dedup import Deduplicator, example_text, print_report
+
+    print(f"\nDeduplicating (Jaccard >= {threshold})...")
+    dedup = Deduplicator(threshold)
+    spool_path = output_file + ".dedup.tmp"
+    try:
+        with open(spool_path, "w") as spool:
+            texts, sources = [], []
+            for source, example, repeat in triples:
+                spool.write(json.dumps([source, repeat, example], ensure_ascii=False) + "\n")
+                texts.append(example_text(example))
+                sources.append(source)
+                if len(texts) == DEDUP_BATCH:
+                    dedup.add(texts, sources)
+                    texts, sources = [], []
+            if texts:
+                dedup.add(texts, sources)
+
+        result = dedup.resolve(DEDUP_PRIORITY)
+        summary = print_report(result)
+        if report is not None:
+            report.duplicates = summary
+
+        with open(spool_path) as spool:
+            for keep, line in zip(result.keep, spool):
+                if keep:
+                    source, repeat, example = json.loads(line)
+                    yield source, example, repeat
+    finally:
+        os.remove(spool_path)
+
+
+def write_examples(triples, output_file, mixture, jsonl=False, materialize=False):
+    """Stream (source, example, repeat) triples to output_file.
+
+    Each example is written once with its source and weight, or, with
+    materialize, `repeat` times as before; that array form matches
+    json.dump(list, ensure_ascii=False) byte for byte. mixture[source]
+    collects [unique, effective] counts. Returns (rows written, first
+    example). Written to a temp file and renamed, so a crash never leaves
+    a truncated training file behind.
+    """
+    count = 0
+    first = None
+    tmp_path = output_file + ".tmp"
+    with open(tmp_path, "w") as f:
+        if not jsonl:
+            f.write("[")
+        for source, example, repeat in triples:
+            counts = mixture.setdefault(source, [0, 0])
+            counts[0] += 1
+            counts[1] += repeat
+            if first is None:
+                first = example
+            if not materialize:
+                example = {**example, "source": source, "weight": repeat}
+                repeat = 1
+            encoded = json.dumps(example, ensure_ascii=False)
+            for _ in range(repeat):
+                if jsonl:
+                    f.write(encoded + "\n")
+                else:
+                    f.write(", " + encoded if count else encoded)
+                count += 1
+        if not jsonl:
+            f.write("]")
+    os.replace(tmp_path, output_file)
+    return count, first
+
+
+def print_mixture(mixture):
+    """Unique vs effective (after oversampling) examples per source."""
+    total = sum(effective for _, effective in mixture.values()) or 1
+    print(f"\n  {'Source':<20}{'Unique':>10}{'Weight':>8}{'Effective':>12}{'Share':>9}")
+    for source, (unique, effective) in mixture.items():
+        weight = effective / unique if unique else 0
+        print(f"  {source:<20}{unique:>10,}{weight:>8.0f}{effective:>12,}{effective / total:>9.2%}")
+
+
+def main(args):
+    print("=" * 60)
+    print("PREPARING GPT-OSS TRAINING DATA")
+    print("=" * 60)
 
-    file_size = os.path.getsize(OUTPUT_FILE)
+    output_file = args.output or (
+        os.path.splitext(OUTPUT_FILE)[0] + ".jsonl" if args.jsonl else OUTPUT_FILE
+    )
+
+    # Load, convert and filter as one pass, writing as we go
+    print("\nConverting to messages format...")
+    print(f"  Writing to {output_file}")
+    stats = Counter()
+    mixture = {}
+    cache = None if args.no_cache else PrepCache(args.cache_dir or CACHE_DIR, force=args.force)
+    report = None
+    if args.report:
+        from data_report import ReportCollector
+
+        tokenizer = None
+        if args.report_tokenizer:
+            from pretokenize import load_tokenizer
+            tokenizer = load_tokenizer(args.report_tokenizer)
+        report = ReportCollector(tokenizer)
+    pool = ProcessPoolExecutor(args.workers) if args.workers > 1 else None
+    if pool:
+        print(f"  Using {args.workers} worker processes")
+    try:
+        triples = training_examples(stats, pool, cache)
+        if args.dedup:
+            triples = deduplicate(triples, output_file, args.dedup_threshold, report)
+        if report:
+            triples = report.wrap(triples)
+        total, sample = write_examples(triples, output_file, mixture,
+                                       jsonl=args.jsonl, materialize=args.materialize)
+    finally:
+        if pool:
+            pool.shutdown()
+    effective = sum(e for _, e in mixture.values())
+
+    if cache:
+        cache.print_summary()
+    print_mixture(mixture)
+    print(f"\n  Total examples: {effective:,}")
+    if not args.materialize:
+        print(f"  Rows written: {total:,} (oversampling applied by the trainer's weighted sampler)")
+
+    file_size = os.path.getsize(output_file)
     print(f"  File size: {file_size / 1024 / 1024:.1f} MB")
 
+    if report:
+        from data_report import build_report, print_report, write_report
+
+        print("\nDataset report:")
+        summary = build_report(report, stats)
+        print_report(summary)
+        report_file = os.path.splitext(output_file)[0] + ".report.json"
+        write_report(summary, report_file)
+        print(f"\n  Report: {report_file}")
+
     # Sample output for verification
-    print("\n--- Sample converted example ---")
-    sample = all_messages[0]
-    print(json.dumps(sample, indent=2)[:500])
+    if sample is not None:
+        print("\n--- Sample converted example ---")
+        print(json.dumps(sample, indent=2)[:500])
 
     print("\n" + "=" * 60)
     print("DATA PREPARATION COMPLETE!")
-    print(f"Output: {OUTPUT_FILE}")
-    print(f"Examples: {len(all_messages):,}")
+    print(f"Output: {output_file}")
+    print(f"Examples: {effective:,}")
     print("=" * 60)
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Prepare GPT-OSS training data")
+    parser.add_argument("--jsonl", action="store_true",
+                        help="Write JSON Lines (one example per line) instead of a JSON array")
+    parser.add_argument("--materialize", action="store_true",
+                        help="Write oversampled copies inline instead of per-example weights")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Processes for filtering and conversion (output is identical for any N)")
+    parser.add_argument("--dedup", action="store_true",
+                        help="Drop near-duplicate examples, keeping the highest-priority source")
+    parser.add_argument("--dedup-threshold", type=float, default=0.8,
+                        help="Estimated Jaccard similarity (word 3-grams) that counts as a duplicate")
+    parser.add_argument("--force", action="store_true",
+                        help="Reprocess every input even if its cached output is current")
+    parser.add_argument("--no-cache", action="store_true", help="Don't read or write the prep cache")
+    parser.add_argument("--cache-dir", help=f"Prep cache directory (default: {CACHE_DIR})")
+    parser.add_argument("--report", action="store_true",
+                        help="Write a dataset profile (.report.json next to the output) and print a summary")
+    parser.add_argument("--report-tokenizer",
+                        help="Tokenizer for token lengths in the report (name or path, or 'byte')")
+    parser.add_argument("-o", "--output", help=f"Output file (default: {OUTPUT_FILE}, .jsonl with --jsonl)")
+    main(parser.parse_args())
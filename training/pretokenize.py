@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+"""
+Pre-tokenize the prepared training data into a memory-mapped artifact.
+
+Applies the GPT-OSS chat template and tokenizes every example once, so
+train_gptoss_alexandra.py starts from an mmap open instead of a template
+and tokenization pass on every run. Examples longer than MAX_SEQ_LENGTH
+tokens are dropped and reported (per source, with the longest lengths) rather
+than silently truncated, and the trainer's short-text filter is applied
+here too.
+
+Output directory:
+  tokens.bin      all token ids back to back (uint32, little-endian)
+  offsets.npy     int64, examples + 1; example i is tokens[offsets[i]:offsets[i + 1]]
+  weights.npy     float32 sample weight per example (1.0 if the data has none)
+  source_ids.npy  uint16 index into meta["sources"] per example
+  meta.json       tokenizer, chat template hash, max length, source file
+                  size/mtime, counts and length stats
+
+The trainer refuses an artifact built with a different chat template,
+vocabulary or a longer max length, or from an older training file.
+
+`--tokenizer byte` uses a small built-in byte-level tokenizer with a
+harmony-style template instead of loading the model's, so the whole path
+can be checked on a CPU without transformers.
+
+Run: python pretokenize.py
+     python pretokenize.py --tokenizer byte -i data.json -o /tmp/tokens
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import time
+from collections import Counter
+
+import numpy as np
+
+from prepare_gptoss_data import OUTPUT_FILE, iter_json
+
+MODEL_NAME = "unsloth/gpt-oss-120b-bnb-4bit"  # same as train_gptoss_alexandra.py
+MAX_SEQ_LENGTH = 4096
+MIN_TEXT_CHARS = 50  # the trainer drops rendered texts this short or shorter
+TOKENIZED_DIR = os.path.splitext(OUTPUT_FILE)[0] + "_tokens"
+
+FORMAT_VERSION = 1
+TOKEN_DTYPE = np.uint32
+SOURCE_DTYPE = np.uint16  # as data_report.py; room for 65,536 sources
+TOKENIZE_BATCH = 1000
+
+
+class ByteTokenizer:
+    """UTF-8 bytes plus harmony-style special tokens, for CPU checks."""
+
+    SPECIALS = ["<|start|>", "<|message|>", "<|end|>", "<|return|>", "<|pad|>"]
+    chat_template = "byte:" + "{role}<|message|>{content}<|end|>"
+    name_or_path = "byte"
+
+    def __init__(self):
+        self.special_ids = {tok: 256 + i for i, tok in enumerate(self.SPECIALS)}
+        self.pad_token_id = self.special_ids["<|pad|>"]
+
+    def __len__(self):
+        return 256 + len(self.SPECIALS)
+
+    def apply_chat_template(self, messages, tokenize=False, add_generation_prompt=False):
+        text = "".join(f"<|start|>{m['role']}<|message|>{m['content']}<|end|>" for m in messages)
+        if add_generation_prompt:
+            text += "<|start|>assistant"
+        return self._encode(text) if tokenize else text
+
+    def _encode(self, text):
+        ids = []
+        pos = 0
+        while pos < len(text):
+            nxt = text.find("<|", pos)
+            if nxt == -1:
+                nxt = len(text)
+            ids.extend(text[pos:nxt].encode("utf-8"))
+            if nxt == len(text):
+                break
+            end = text.find("|>", nxt)
+            special = text[nxt:end + 2] if end != -1 else None
+            if special in self.special_ids:
+                ids.append(self.special_ids[special])
+                pos = end + 2
+            else:
+                ids.extend(b"<|")
+                pos = nxt + 2
+        return ids
+
+    def __call__(self, texts, add_special_tokens=False):
+        return {"input_ids": [self._encode(t) for t in texts]}
+
+
+def load_tokenizer(name):
+    """The tokenizer with the chat template the trainer uses."""
+    if name == "byte":
+        return ByteTokenizer()
+    from transformers import AutoTokenizer
+
+    tokenizer = AutoTokenizer.from_pretrained(name)
+    try:
+        from unsloth.chat_templates import get_chat_template
+        tokenizer = get_chat_template(tokenizer, chat_template="gpt-oss")
+    except Exception as e:  # unsloth won't import without a GPU
+        print(f"  unsloth unavailable ({e}); using the tokenizer's own chat template")
+    return tokenizer
+
+
+def template_hash(tokenizer):
+    return hashlib.sha256((tokenizer.chat_template or "").encode("utf-8")).hexdigest()
+
+
+def _render_batches(rows, tokenizer, stats):
+    """(source, weight, text) batches of rendered examples that pass the text filter."""
+    batch = []
+    for row in rows:
+        source = row.get("source", "unknown")
+        text = tokenizer.apply_chat_template(row["messages"], tokenize=False, add_generation_prompt=False)
+        if len(text) <= MIN_TEXT_CHARS:
+            stats[f"too_short:{source}"] += 1
+            continue
+        batch.append((source, float(row.get("weight", 1)), text))
+        if len(batch) == TOKENIZE_BATCH:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def pretokenize(input_file, output_dir, tokenizer, max_seq_length=MAX_SEQ_LENGTH):
+    """Write the artifact for input_file to output_dir; returns its meta dict.
+
+    Built in a sibling temp directory and swapped in at the end, so an
+    interrupted run leaves the previous artifact alone.
+    """
+    tmp_dir = output_dir.rstrip("/") + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    stats = Counter()
+    source_names = []
+    offsets = [0]
+    weights = []
+    source_ids = []
+    too_long = []  # (length, source)
+    lengths = []
+    with open(os.path.join(tmp_dir, "tokens.bin"), "wb") as f:
+        for batch in _render_batches(iter_json(input_file), tokenizer, stats):
+            # The template already renders the special tokens
+            encoded = tokenizer([text for _, _, text in batch], add_special_tokens=False)["input_ids"]
+            for (source, weight, _), ids in zip(batch, encoded):
+                if len(ids) > max_seq_length:
+                    too_long.append((len(ids), source))
+                    stats[f"too_long:{source}"] += 1
+                    continue
+                if source not in source_names:
+                    if len(source_names) > np.iinfo(SOURCE_DTYPE).max:
+                        raise ValueError(f"more than {len(source_names):,} distinct sources in {input_file}")
+                    source_names.append(source)
+                f.write(np.asarray(ids, dtype=TOKEN_DTYPE).tobytes())
+                offsets.append(offsets[-1] + len(ids))
+                weights.append(weight)
+                source_ids.append(source_names.index(source))
+                lengths.append(len(ids))
+                stats[f"kept:{source}"] += 1
+
+    np.save(os.path.join(tmp_dir, "offsets.npy"), np.array(offsets, dtype=np.int64))
+    np.save(os.path.join(tmp_dir, "weights.npy"), np.array(weights, dtype=np.float32))
+    np.save(os.path.join(tmp_dir, "source_ids.npy"), np.array(source_ids, dtype=SOURCE_DTYPE))
+
+    lengths = np.array(lengths)
+    st = os.stat(input_file)
+    meta = {
+        "format_version": FORMAT_VERSION,
+        "tokenizer": getattr(tokenizer, "name_or_path", None),
+        "chat_template_sha256": template_hash(tokenizer),
+        "vocab_size": len(tokenizer),
+        "dtype": np.dtype(TOKEN_DTYPE).name,
+        "max_seq_length": max_seq_length,
+        "min_text_chars": MIN_TEXT_CHARS,
+        "source_file": os.path.abspath(input_file),
+        "source_size": st.st_size,
+        "source_mtime_ns": st.st_mtime_ns,
+        "examples": len(weights),
+        "tokens": int(offsets[-1]),
+        "weighted_tokens": float(np.dot(lengths, weights)) if len(lengths) else 0.0,
+        "sources": source_names,
+        "stats": dict(stats),
+        "longest_dropped": sorted(too_long, reverse=True)[:10],
+        "lengths": {
+            "mean": float(lengths.mean()) if len(lengths) else 0.0,
+            **{f"p{q}": int(np.percentile(lengths, q)) if len(lengths) else 0 for q in (50, 90, 99)},
+            "max": int(lengths.max()) if len(lengths) else 0,
+        },
+        "created_at": time.time(),
+    }
+    with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+
+    old_dir = output_dir.rstrip("/") + ".old"
+    shutil.rmtree(old_dir, ignore_errors=True)
+    if os.path.exists(output_dir):
+        os.replace(output_dir, old_dir)
+    os.replace(tmp_dir, output_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+    return meta
+
+
+class PretokenizedDataset:
+    """Read-only view of a pretokenize.py artifact; token ids stay on disk."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        self.offsets = np.load(os.path.join(path, "offsets.npy"))
+        self.weights = np.load(os.path.join(path, "weights.npy"))
+        self.source_ids = np.load(os.path.join(path, "source_ids.npy"))
+        tokens_path = os.path.join(path, "tokens.bin")
+        dtype = np.dtype(self.meta["dtype"])
+        # np.memmap can't map an empty file
+        self.tokens = (np.memmap(tokens_path, dtype=dtype, mode="r")
+                       if os.path.getsize(tokens_path) else np.zeros(0, dtype=dtype))
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return {"input_ids": np.asarray(self.tokens[self.offsets[i]:self.offsets[i + 1]], dtype=np.int64)}
+
+    @property
+    def lengths(self):
+        return np.diff(self.offsets)
+
+    @property
+    def sources(self):
+        names = self.meta["sources"]
+        return [names[i] for i in self.source_ids]
+
+    @property
+    def weighted(self):
+        return bool(len(self.weights)) and not np.all(self.weights == 1)
+
+    def check(self, tokenizer, max_seq_length, data_file=None):
+        """Reasons the artifact doesn't fit this run (empty if it does)."""
+        meta = self.meta
+        problems = []
+        if meta.get("format_version") != FORMAT_VERSION:
+            problems.append(f"format version {meta.get('format_version')} != {FORMAT_VERSION}")
+        if meta["chat_template_sha256"] != template_hash(tokenizer):
+            problems.append("chat template differs from the loaded tokenizer's")
+        if meta["vocab_size"] != len(tokenizer):
+            problems.append(f"vocab size {meta['vocab_size']:,} != {len(tokenizer):,}")
+        if meta["max_seq_length"] > max_seq_length:
+            problems.append(f"built for max length {meta['max_seq_length']} > {max_seq_length}")
+        if data_file and os.path.exists(data_file):
+            st = os.stat(data_file)
+            if (os.path.abspath(data_file) != meta["source_file"] or st.st_size != meta["source_size"]
+                    or st.st_mtime_ns != meta["source_mtime_ns"]):
+                problems.append(f"{data_file} changed since the artifact was built")
+        if len(self.tokens) != self.offsets[-1]:
+            problems.append(f"tokens.bin has {len(self.tokens):,} tokens, index expects {self.offsets[-1]:,}")
+        return problems
+
+
+def make_collator(pad_token_id):
+    """Pad a batch of {"input_ids"} to its longest; pads are masked out of the loss."""
+    import torch
+
+    def collate(batch):
+        width = max(len(b["input_ids"]) for b in batch)
+        input_ids = torch.full((len(batch), width), pad_token_id, dtype=torch.long)
+        attention_mask = torch.zeros((len(batch), width), dtype=torch.long)
+        for row, b in enumerate(batch):
+            ids = torch.as_tensor(b["input_ids"], dtype=torch.long)
+            input_ids[row, :len(ids)] = ids
+            attention_mask[row, :len(ids)] = 1
+        labels = input_ids.masked_fill(attention_mask == 0, -100)
+        return {"input_ids": input_ids, "attention_mask": attention_mask, "labels": labels}
+
+    return collate
+
+
+def print_summary(meta):
+    stats = meta["stats"]
+    sources = sorted({key.split(":", 1)[1] for key in stats})
+    print(f"\n  {'Source':<20}{'Kept':>10}{'Too long':>10}{'Too short':>11}")
+    for source in sources:
+        print(f"  {source:<20}{stats.get(f'kept:{source}', 0):>10,}"
+              f"{stats.get(f'too_long:{source}', 0):>10,}{stats.get(f'too_short:{source}', 0):>11,}")
+    lengths = meta["lengths"]
+    print(f"\n  Tokens: {meta['tokens']:,} in {meta['examples']:,} examples "
+          f"({meta['weighted_tokens']:,.0f} per epoch with weights)")
+    print(f"  Length: mean {lengths['mean']:,.0f}, p50 {lengths['p50']:,}, p90 {lengths['p90']:,}, "
+          f"p99 {lengths['p99']:,}, max {lengths['max']:,} (limit {meta['max_seq_length']:,})")
+    if meta["longest_dropped"]:
+        longest = ", ".join(f"{n:,} ({source})" for n, source in meta["longest_dropped"])
+        print(f"  Longest dropped: {longest}")
+
+
+def main(args):
+    print("=" * 60)
+    print("PRE-TOKENIZING TRAINING DATA")
+    print("=" * 60)
+    output_dir = args.output or TOKENIZED_DIR
+    print(f"\nLoading tokenizer {args.tokenizer}...")
+    tokenizer = load_tokenizer(args.tokenizer)
+
+    print(f"\nTokenizing {args.input} (max {args.max_seq_length:,} tokens)...")
+    start = time.perf_counter()
+    meta = pretokenize(args.input, output_dir, tokenizer, args.max_seq_length)
+    elapsed = time.perf_counter() - start
+    print_summary(meta)
+
+    size = sum(os.path.getsize(os.path.join(output_dir, name)) for name in os.listdir(output_dir))
+    print("\n" + "=" * 60)
+    print(f"PRE-TOKENIZED in {elapsed:.1f}s")
+    print(f"Output: {output_dir} ({size / 1024 / 1024:.1f} MB)")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pre-tokenize GPT-OSS training data")
+    parser.add_argument("-i", "--input", default=OUTPUT_FILE, help="Prepared training data (JSON array or JSONL)")
+    parser.add_argument("-o", "--output", help=f"Output directory (default: {TOKENIZED_DIR})")
+    parser.add_argument("--tokenizer", default=MODEL_NAME,
+                        help="Tokenizer name or path, or 'byte' for the built-in CPU test tokenizer")
+    parser.add_argument("--max-seq-length", type=int, default=MAX_SEQ_LENGTH,
+                        help="Drop examples longer than this many tokens")
+    main(parser.parse_args())
@@ -5,27 +5,64 @@ Designed for NVIDIA DGX Spark (128GB unified memory).
 
 Memory: ~65GB QLoRA on 128GB unified = comfortable fit.
 
+Oversampling comes from the "weight" column prepare_gptoss_data.py writes:
+each unique example is tokenized once and WeightedEpochSampler repeats it
+per epoch. Files without weights (--materialize) train as before.
+
+If pretokenize.py has been run, training starts from its memory-mapped
+token ids instead of templating and tokenizing the JSON again. The
+artifact is checked against the loaded tokenizer's chat template and
+vocabulary, MAX_SEQ_LENGTH and the training file; a mismatch stops the run.
+
+PACKING_MODE picks how micro-batches are built from pre-tokenized data
+(packing.py): "none" is BATCH_SIZE examples at a time, "group" batches
+similar lengths up to BATCH_SIZE * MAX_SEQ_LENGTH padded tokens, "pack"
+bin-packs whole examples into rows of that many tokens with per-example
+position_ids. The three are compared (tokens per step, fill, padding,
+steps) before the model loads. "pack" also needs a flash-attention kernel
+(the model's attention implementation is checked once it loads), since
+packed rows have no attention mask.
+
+A rerun resumes from the newest valid checkpoint in OUTPUT_DIR (adapter,
+optimizer, scheduler, RNG state, step and data position; see
+checkpoints.py), provided the data and batching match what the checkpoint
+recorded. The merge is skipped if the merged model directory already holds
+a merge of the same final adapter.
+
 Prerequisites:
   1. Run download_gptoss.py to download the model
   2. Run prepare_gptoss_data.py to prepare training data
+     (optionally pretokenize.py after it)
   3. Run inside Unsloth Docker container (see dgx-spark-playbooks/nvidia/unsloth/)
 
 Run: python train_gptoss_alexandra.py
 """
 
+import math
 import os
 import torch
+from torch.utils.data import DataLoader
 from unsloth import FastLanguageModel
 from unsloth.chat_templates import get_chat_template, standardize_sharegpt
 from datasets import load_dataset
+from transformers import TrainerCallback
 from trl import SFTTrainer, SFTConfig
 
+from checkpoints import (adapter_hash, clear_merge_info, data_order_mismatch, file_sha256,
+                         find_resume_checkpoint, merged_is_current, write_data_order, write_merge_info)
+
+from packing import (PlannedBatchSampler, compare_modes, make_packed_collator, packed_attention_problem,
+                     print_comparison)
+from pretokenize import PretokenizedDataset, make_collator
+from weighted_sampler import WeightedEpochSampler, epoch_indices, mixture_report
+
 # === Paths ===
 MODEL_NAME = "unsloth/gpt-oss-120b-bnb-4bit"
 # If downloaded locally, use:
 # MODEL_NAME = "/home/alexandratitus767/models/gpt-oss-120b"
 
 TRAINING_DATA = "/home/alexandratitus767/ai-clone-training/data/gptoss_alexandra_training.json"
+TOKENIZED_DIR = "/home/alexandratitus767/ai-clone-training/data/gptoss_alexandra_training_tokens"
 OUTPUT_DIR = "/home/alexandratitus767/ai-clone-training/gptoss-alexandra-lora"
 
 # === Hyperparameters ===
@@ -38,16 +75,35 @@ LEARNING_RATE = 1e-4
 NUM_EPOCHS = 2
 WARMUP_STEPS = 100
 SAVE_STEPS = 500
+# "none", "group" (length-grouped batches) or "pack" (bin-packed rows); the
+# last two need pretokenize.py output
+PACKING_MODE = "none"
+# Pick up from the newest valid checkpoint in OUTPUT_DIR
+AUTO_RESUME = True
 
 print("=" * 60)
 print("GPT-OSS 120B PERSONALITY FINE-TUNING")
 print("=" * 60)
 
 # Check training data exists
-if not os.path.exists(TRAINING_DATA):
+pretokenized = os.path.isdir(TOKENIZED_DIR)
+if not pretokenized and not os.path.exists(TRAINING_DATA):
     print(f"ERROR: Training data not found at {TRAINING_DATA}")
     print("Run prepare_gptoss_data.py first!")
     exit(1)
+if PACKING_MODE != "none" and not pretokenized:
+    print(f"ERROR: PACKING_MODE={PACKING_MODE!r} needs token lengths; run pretokenize.py first")
+    exit(1)
+
+# Batch plan, from token lengths alone, before spending minutes on the model
+if pretokenized:
+    dataset = PretokenizedDataset(TOKENIZED_DIR)
+    weighted = dataset.weighted
+    weights = dataset.weights.tolist() if weighted else None
+    print(f"\nBatch plan for {len(dataset):,} pre-tokenized examples "
+          f"({BATCH_SIZE} x {GRAD_ACCUM}, {MAX_SEQ_LENGTH:,} tokens per row, one epoch):")
+    print_comparison(compare_modes(dataset.lengths.tolist(), weights, BATCH_SIZE, MAX_SEQ_LENGTH, GRAD_ACCUM),
+                     selected=PACKING_MODE)
 
 # Flush memory caches (DGX Spark unified memory optimization)
 print("\nFlushing memory caches...")
@@ -73,6 +129,14 @@ tokenizer = get_chat_template(tokenizer, chat_template="gpt-oss")
 print(f"  Model loaded successfully")
 print(f"  Max sequence length: {MAX_SEQ_LENGTH}")
 
+# Packed rows carry no attention mask; only a varlen kernel keeps examples apart
+if PACKING_MODE == "pack":
+    problem = packed_attention_problem(model)
+    if problem:
+        print(f"ERROR: PACKING_MODE='pack' can't be used: {problem}")
+        print("  Use PACKING_MODE = \"group\" (padded batches), or load the model with flash-attention")
+        exit(1)
+
 # === Add LoRA Adapters ===
 print(f"\nAdding LoRA adapters (rank={LORA_RANK}, alpha={LORA_ALPHA})...")
 
@@ -95,53 +159,176 @@ model = FastLanguageModel.get_peft_model(
 model.print_trainable_parameters()
 
 # === Load Dataset ===
-print(f"\nLoading training data from {TRAINING_DATA}...")
+if pretokenized:
+    print(f"\nChecking pre-tokenized data at {TOKENIZED_DIR}...")
+    problems = dataset.check(tokenizer, MAX_SEQ_LENGTH, TRAINING_DATA)
+    if problems:
+        for problem in problems:
+            print(f"ERROR: {problem}")
+        print("Rerun pretokenize.py (or remove the directory to tokenize on the fly)")
+        exit(1)
+    print(f"  {len(dataset):,} examples, {dataset.meta['tokens']:,} tokens "
+          f"(longest {dataset.meta['lengths']['max']:,})")
+    sources = dataset.sources if weighted else None
+else:
+    print(f"\nLoading training data from {TRAINING_DATA}...")
+
+    dataset = load_dataset("json", data_files=TRAINING_DATA, split="train")
+    print(f"  Loaded {len(dataset):,} examples")
+
+    # Standardize to ShareGPT format for Unsloth
+    dataset = standardize_sharegpt(dataset)
+
+    # Apply chat template to format conversations
+    def formatting_func(examples):
+        convos = examples["messages"]
+        texts = [
+            tokenizer.apply_chat_template(
+                convo, tokenize=False, add_generation_prompt=False
+            )
+            for convo in convos
+        ]
+        return {"text": texts}
+
+    dataset = dataset.map(formatting_func, batched=True)
+    dataset = dataset.shuffle(seed=42)
+
+    # Filter very short examples
+    dataset = dataset.filter(lambda x: len(x["text"]) > 50)
+    print(f"  After filtering: {len(dataset):,} examples")
+
+    # Per-example weights replace the copies the prep step used to write
+    weighted = "weight" in dataset.column_names
+    weights = dataset["weight"] if weighted else None
+    sources = dataset["source"] if weighted else None
 
-dataset = load_dataset("json", data_files=TRAINING_DATA, split="train")
-print(f"  Loaded {len(dataset):,} examples")
+if weighted:
+    examples_per_epoch = round(sum(weights))
+    print(f"  Weighted: {len(dataset):,} unique -> {examples_per_epoch:,} per epoch")
+    print("\n  Mixture (one epoch):")
+    mixture_report(sources, weights, epoch_indices(weights, seed=3407))
+else:
+    examples_per_epoch = len(dataset)
 
-# Standardize to ShareGPT format for Unsloth
-dataset = standardize_sharegpt(dataset)
+batch_sampler = None
+if PACKING_MODE != "none":
+    batch_sampler = PlannedBatchSampler(dataset.lengths, weights, PACKING_MODE, BATCH_SIZE, MAX_SEQ_LENGTH, seed=3407)
 
-# Apply chat template to format conversations
-def formatting_func(examples):
-    convos = examples["messages"]
-    texts = [
-        tokenizer.apply_chat_template(
-            convo, tokenize=False, add_generation_prompt=False
+# Everything the order of training batches depends on; recorded with each
+# checkpoint so a resume can't silently skip the wrong batches
+data_order = {
+    "data_sha256": file_sha256(TRAINING_DATA) if os.path.exists(TRAINING_DATA) else None,
+    "pretokenized": pretokenized,
+    "examples": len(dataset),
+    "examples_per_epoch": examples_per_epoch,
+    "weighted": weighted,
+    "packing_mode": PACKING_MODE,
+    "micro_batches_per_epoch": len(batch_sampler) if batch_sampler is not None else None,
+    "batch_size": BATCH_SIZE,
+    "grad_accum": GRAD_ACCUM,
+    "seed": 3407,
+}
+
+
+class PlannedDataLoader(DataLoader):
+    """DataLoader that passes the Trainer's set_epoch() on to its batch sampler.
+
+    Left unprepared by accelerate (whose wrapper only forwards set_epoch to
+    a plain sampler); the Trainer moves each batch to the device itself.
+    """
+
+    def set_epoch(self, epoch):
+        self.batch_sampler.set_epoch(epoch)
+
+
+class DataOrderCallback(TrainerCallback):
+    """Writes data_order.json into each checkpoint as it's saved."""
+
+    def on_save(self, args, state, control, **kwargs):
+        checkpoint = os.path.join(args.output_dir, f"checkpoint-{state.global_step}")
+        if os.path.isdir(checkpoint):
+            write_data_order(checkpoint, data_order)
+
+
+class WeightedSFTTrainer(SFTTrainer):
+    """SFTTrainer whose epochs follow per-example sample weights, if given.
+
+    The weights are taken before the trainer tokenizes the dataset, which
+    drops the extra columns but keeps the row order. A batch_sampler (a
+    packing.PlannedBatchSampler, which applies the weights itself) replaces
+    the sampler and batch size altogether.
+    """
+
+    def __init__(self, *args, sample_weights=None, batch_sampler=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.sample_weights = sample_weights
+        self.batch_sampler = batch_sampler
+
+    def get_train_dataloader(self):
+        if self.batch_sampler is None:
+            return super().get_train_dataloader()
+        return PlannedDataLoader(
+            self.train_dataset,
+            batch_sampler=self.batch_sampler,
+            collate_fn=self.data_collator,
+            num_workers=self.args.dataloader_num_workers,
+            pin_memory=self.args.dataloader_pin_memory,
         )
-        for convo in convos
-    ]
-    return {"text": texts}
 
-dataset = dataset.map(formatting_func, batched=True)
-dataset = dataset.shuffle(seed=42)
+    def _get_train_sampler(self, *args, **kwargs):
+        if self.sample_weights is None:
+            return super()._get_train_sampler(*args, **kwargs)
+        return WeightedEpochSampler(self.sample_weights, seed=self.args.seed)
 
-# Filter very short examples
-dataset = dataset.filter(lambda x: len(x["text"]) > 50)
-print(f"  After filtering: {len(dataset):,} examples")
 
 # === Training ===
 effective_batch = BATCH_SIZE * GRAD_ACCUM
-total_steps = (len(dataset) * NUM_EPOCHS) // effective_batch
+total_steps = (examples_per_epoch * NUM_EPOCHS) // effective_batch
+if batch_sampler is not None:
+    total_steps = math.ceil(len(batch_sampler) / GRAD_ACCUM) * NUM_EPOCHS
 
 print(f"\n{'=' * 60}")
 print("TRAINING CONFIGURATION")
 print(f"  Model: GPT-OSS 120B (QLoRA 4-bit)")
 print(f"  LoRA: rank={LORA_RANK}, alpha={LORA_ALPHA}")
-print(f"  Examples: {len(dataset):,}")
+print(f"  Examples: {examples_per_epoch:,} per epoch" + (f" ({len(dataset):,} unique)" if weighted else ""))
 print(f"  Epochs: {NUM_EPOCHS}")
 print(f"  Batch: {BATCH_SIZE} x {GRAD_ACCUM} = {effective_batch}")
+if batch_sampler is not None:
+    print(f"  Packing: {PACKING_MODE} ({len(batch_sampler):,} micro-batches per epoch)")
 print(f"  Learning rate: {LEARNING_RATE}")
 print(f"  Estimated steps: ~{total_steps:,}")
 print(f"  Checkpoints every: {SAVE_STEPS} steps")
 print(f"  Output: {OUTPUT_DIR}")
 print(f"{'=' * 60}\n")
 
-trainer = SFTTrainer(
+# === Resume ===
+resume_from = None
+if AUTO_RESUME:
+    resume_from, skipped = find_resume_checkpoint(OUTPUT_DIR)
+    for path, problems in skipped:
+        print(f"WARNING: skipping broken checkpoint (moved to {path}): {'; '.join(problems)}")
+    if resume_from:
+        mismatch = data_order_mismatch(resume_from, data_order)
+        if mismatch:
+            print(f"ERROR: {resume_from} was trained with different data or batching "
+                  f"({', '.join(mismatch)})")
+            print("Restore the original setup, or move the checkpoints aside to start over")
+            exit(1)
+        if mismatch is None:
+            print(f"WARNING: {resume_from} predates data_order.json; assuming the same data and batching")
+        print(f"Resuming from {resume_from}\n")
+
+trainer = WeightedSFTTrainer(
     model=model,
+    sample_weights=weights,
+    batch_sampler=batch_sampler,
     tokenizer=tokenizer,
     train_dataset=dataset,
+    # Pre-tokenized rows go straight to the collator
+    data_collator=(make_packed_collator() if PACKING_MODE == "pack"
+                   else make_collator(tokenizer.pad_token_id) if pretokenized else None),
+    callbacks=[DataOrderCallback()],
     args=SFTConfig(
         output_dir=OUTPUT_DIR,
         per_device_train_batch_size=BATCH_SIZE,
@@ -154,6 +341,7 @@ trainer = SFTTrainer(
         save_total_limit=3,
         max_seq_length=MAX_SEQ_LENGTH,
         dataset_text_field="text",
+        dataset_kwargs={"skip_prepare_dataset": True} if pretokenized else None,
         optim="adamw_8bit",
         weight_decay=0.01,
         lr_scheduler_type="cosine",
@@ -165,7 +353,7 @@ trainer = SFTTrainer(
 )
 
 print("Starting training...")
-trainer.train()
+trainer.train(resume_from_checkpoint=resume_from)
 
 # === Save Final ===
 final_path = OUTPUT_DIR + "-final"
@@ -175,15 +363,21 @@ tokenizer.save_pretrained(final_path)
 
 # Also save merged model for vLLM serving
 merged_path = "/home/alexandratitus767/models/gptoss-alexandra-merged"
-print(f"\nMerging LoRA and saving full model to {merged_path}...")
-print("  (This creates a standalone model for vLLM inference)")
+final_hash = adapter_hash(final_path)
 try:
-    model.save_pretrained_merged(
-        merged_path,
-        tokenizer,
-        save_method="merged_16bit",
-    )
-    print(f"  Merged model saved to: {merged_path}")
+    if merged_is_current(merged_path, final_hash):
+        print(f"\nMerged model at {merged_path} is already from this adapter ({final_hash[:12]}); skipping merge")
+    else:
+        print(f"\nMerging LoRA and saving full model to {merged_path}...")
+        print("  (This creates a standalone model for vLLM inference)")
+        clear_merge_info(merged_path)
+        model.save_pretrained_merged(
+            merged_path,
+            tokenizer,
+            save_method="merged_16bit",
+        )
+        write_merge_info(merged_path, final_path, final_hash, "merged_16bit")
+        print(f"  Merged model saved to: {merged_path}")
 except Exception as e:
     print(f"  Merge failed (can be done later): {e}")
     print(f"  LoRA adapter saved to: {final_path}")
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Weighted sampling for the fine-tuning run.
+
+prepare_gptoss_data.py writes each unique example once, with a "weight"
+(how many times it used to be copied into the file) and a "source" tag.
+WeightedEpochSampler turns that back into the same mixture at training
+time: every epoch visits each example floor(weight) times, plus once more
+with probability equal to the fractional part, in a fresh random order.
+With the integer weights the prep step writes, an epoch is exactly the
+old oversampled file, shuffled, without storing or tokenizing the copies.
+
+Run: python weighted_sampler.py gptoss_alexandra_training.json
+     (prints the expected vs sampled mixture for one epoch)
+"""
+
+import json
+import math
+import random
+import sys
+from collections import Counter
+
+try:
+    from torch.utils.data import Sampler
+except ImportError:  # planning and reports work without torch
+    Sampler = object
+
+
+def epoch_indices(weights, seed=3407, epoch=0):
+    """Dataset indices for one epoch, each repeated by its weight, shuffled."""
+    rng = random.Random(f"{seed}:{epoch}")
+    indices = []
+    for i, weight in enumerate(weights):
+        whole = math.floor(weight)
+        copies = whole + (rng.random() < weight - whole)
+        indices.extend([i] * copies)
+    rng.shuffle(indices)
+    return indices
+
+
+class WeightedEpochSampler(Sampler):
+    """Sampler over dataset rows that reproduces the oversampled mixture."""
+
+    def __init__(self, weights, seed=3407):
+        self.weights = [float(w) for w in weights]
+        self.seed = seed
+        self.epoch = 0
+        self._length = round(sum(self.weights))
+
+    def set_epoch(self, epoch):
+        self.epoch = epoch
+
+    def __iter__(self):
+        indices = epoch_indices(self.weights, self.seed, self.epoch)
+        self.epoch += 1  # a new order next time even if set_epoch() isn't called
+        return iter(indices)
+
+    def __len__(self):
+        return self._length
+
+
+def mixture_report(sources, weights, indices):
+    """Expected vs sampled share of each source; returns {source: (expected, sampled)}."""
+    expected = Counter()
+    for source, weight in zip(sources, weights):
+        expected[source] += weight
+    sampled = Counter(sources[i] for i in indices)
+
+    total_expected = sum(expected.values()) or 1
+    total_sampled = sum(sampled.values()) or 1
+    report = {}
+    print(f"  {'source':<20}{'unique':>10}{'expected':>12}{'sampled':>12}{'share':>9}{'sampled':>9}")
+    unique = Counter(sources)
+    for source in sorted(expected, key=expected.get, reverse=True):
+        share = expected[source] / total_expected
+        sampled_share = sampled[source] / total_sampled
+        report[source] = (share, sampled_share)
+        print(f"  {source:<20}{unique[source]:>10,}{expected[source]:>12,.0f}{sampled[source]:>12,}"
+              f"{share:>9.2%}{sampled_share:>9.2%}")
+    return report
+
+
+def main():
+    if len(sys.argv) != 2:
+        print(__doc__)
+        sys.exit(1)
+    path = sys.argv[1]
+    with open(path) as f:
+        if f.read(1) == "[":
+            f.seek(0)
+            rows = json.load(f)
+        else:
+            f.seek(0)
+            rows = [json.loads(line) for line in f if line.strip()]
+    sources = [row.get("source", "unknown") for row in rows]
+    weights = [row.get("weight", 1) for row in rows]
+    print(f"{path}: {len(rows):,} unique examples, {sum(weights):,.0f} per epoch")
+    mixture_report(sources, weights, epoch_indices(weights))
+
+
+if __name__ == "__main__":
+    main()